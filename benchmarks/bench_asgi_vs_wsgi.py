@@ -0,0 +1,131 @@
+"""
+Compare /api/chat throughput and tail latency between the native ASGI entry point
+(Hypercorn serving index:asgi_app) and the WSGI shim (gunicorn threads serving index:app).
+
+Both modes talk to the local fake OpenAI server, so the numbers reflect how many
+concurrent upstream calls a single worker can hold rather than real API latency.
+
+Usage:
+    python benchmarks/bench_asgi_vs_wsgi.py --requests 400 --concurrency 100 --latency 0.5
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def wait_for_port(url, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not start")
+
+
+def start_server(mode, port, upstream_url, threads):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env["OPENAI_BASE_URL"] = upstream_url
+    env["OPENAI_MAX_RETRIES"] = "0"
+    # Answers stored by an earlier run would turn upstream requests into store hits
+    env.setdefault("ANSWER_STORE_PATH", "")
+
+    if mode == "asgi":
+        command = [sys.executable, "-m", "hypercorn", "index:asgi_app", "--bind", f"127.0.0.1:{port}",
+                   "--workers", "1", "--log-level", "WARNING"]
+    else:
+        command = [sys.executable, "-m", "gunicorn", "index:app", "--bind", f"127.0.0.1:{port}",
+                   "--workers", "1", "--threads", str(threads), "--log-level", "warning"]
+
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(f"http://127.0.0.1:{port}/")
+    return process
+
+
+async def drive(base_url, total, concurrency):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/api/chat", json={"query": f"Where is building {i} on campus?"})
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_second": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake upstream latency in seconds")
+    parser.add_argument("--threads", type=int, default=32, help="gunicorn threads for the WSGI mode")
+    parser.add_argument("--upstream-port", type=int, default=8765)
+    parser.add_argument("--app-port", type=int, default=5055)
+    args = parser.parse_args()
+
+    upstream = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "fake_openai.py"),
+         "--port", str(args.upstream_port), "--latency", str(args.latency)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    upstream_url = f"http://127.0.0.1:{args.upstream_port}/v1"
+    results = {}
+    try:
+        wait_for_port(upstream_url)
+        for mode in ("wsgi", "asgi"):
+            server = start_server(mode, args.app_port, upstream_url, args.threads)
+            try:
+                results[mode] = asyncio.run(drive(f"http://127.0.0.1:{args.app_port}", args.requests, args.concurrency))
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Cold start: time from a fresh interpreter to the first predefined answer.
+
+Each run starts a new Python process that imports index and serves one FAQ request
+through the WSGI app (as on Vercel) or the ASGI app, and reports how long the import
+and the first response took and whether the LLM-only dependencies got loaded. With
+--profile it also lists the slowest imports from python -X importtime.
+
+Usage:
+    python benchmarks/bench_cold_start.py --runs 10
+    python benchmarks/bench_cold_start.py --server asgi --profile 15
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process; prints one JSON line
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import index
+imported = time.perf_counter()
+if sys.argv[1] == "asgi":
+    import asyncio
+    body = json.dumps({"query": "What are the tuition fees?"}).encode()
+    messages = []
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+    async def send(message):
+        messages.append(message)
+    scope = {"type": "http", "method": "POST", "path": "/api/chat", "headers": []}
+    asyncio.run(index.asgi_app(scope, receive, send))
+    status = messages[0]["status"]
+else:
+    response = index.app.test_client().post("/api/chat", json={"query": "What are the tuition fees?"})
+    status = response.status_code
+answered = time.perf_counter()
+print(json.dumps({
+    "status": status,
+    "import_ms": (imported - started) * 1000,
+    "first_response_ms": (answered - imported) * 1000,
+    "loaded": {name: name in sys.modules for name in ("openai", "httpx", "numpy", "asgiref")}
+}))
+"""
+
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    # The FAQ path never reads the answer store; keep runs from sharing one
+    env.setdefault("ANSWER_STORE_PATH", "")
+    return env
+
+
+def run_once(server):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", PROBE, server], cwd=ROOT, env=child_env(),
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def import_profile(top):
+    """
+    Slowest modules by cumulative import time when importing index.
+    """
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import index"], cwd=ROOT, env=child_env(),
+                            capture_output=True, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match:
+            rows.append({"module": match.group(4), "depth": len(match.group(3)) // 2,
+                         "self_ms": int(match.group(1)) / 1000, "cumulative_ms": int(match.group(2)) / 1000})
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--server", choices=("wsgi", "asgi"), default="wsgi")
+    parser.add_argument("--profile", type=int, default=0, metavar="N", help="also list the N slowest imports")
+    args = parser.parse_args()
+
+    # One untimed run so every timed run finds the compiled bytecode
+    run_once(args.server)
+    runs = [run_once(args.server) for _ in range(args.runs)]
+
+    result = {
+        "server": args.server,
+        "runs": args.runs,
+        "statuses": sorted({run["status"] for run in runs}),
+        "import_ms_median": round(median([run["import_ms"] for run in runs]), 1),
+        "first_response_ms_median": round(median([run["first_response_ms"] for run in runs]), 2),
+        "process_ms_median": round(median([run["process_ms"] for run in runs]), 1),
+        "loaded": runs[-1]["loaded"]
+    }
+    if args.profile:
+        result["slowest_imports"] = import_profile(args.profile)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+FAQ-path throughput: predefined answers served from the precomputed responses versus
+the previous per-request path (clean_response_format + JSON serialization).
+
+Requests are driven straight through the ASGI callable, so the numbers measure the
+app's own work per request without socket or server overhead.
+
+Usage:
+    python benchmarks/bench_faq_path.py --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import index  # noqa: E402
+
+
+def issued_follow_up_id(question):
+    # A live id from the follow-up store, as the app issues with the first answer
+    return index.follow_up_store.create(index.get_predefined_answer(question))
+
+
+# Follow-ups carry both the issued id (current path) and the original question (legacy path)
+QUERIES = [
+    {"query": "What are the tuition fees?"},
+    {"query": "How do I apply?"},
+    {"query": "I forgot my password"},
+    {"query": "yes", "follow_up_to": issued_follow_up_id("tuition fees"), "original_question": "tuition fees"},
+    {"query": "graduate", "follow_up_to": issued_follow_up_id("how do i apply"), "original_question": "how do i apply"},
+]
+
+
+async def legacy_asgi_chat(scope, receive, send):
+    # The FAQ path as it worked before answers were precomputed
+    data = json.loads(await index.read_asgi_body(receive))
+    query = data["query"]
+    if data.get("follow_up_to") and data.get("original_question"):
+        predefined = index.get_predefined_answer(data["original_question"])
+        answer = index.process_follow_up_response(predefined["follow_up"], query)
+        response_data = {"answer": index.clean_response_format(answer), "sources": predefined["sources"]}
+    else:
+        predefined = index.get_predefined_answer(query)
+        response_data = {"answer": index.clean_response_format(predefined["answer"]), "sources": predefined["sources"]}
+        if "follow_up" in predefined:
+            response_data["follow_up"] = predefined["follow_up"]["question"]
+            response_data["follow_up_id"] = f"followup_{int(time.time())}"
+            response_data["original_question"] = query
+    await index.send_asgi_json(send, response_data)
+
+
+async def run(app, total, accept_encoding):
+    bodies = [json.dumps(payload).encode("utf-8") for payload in QUERIES]
+    headers = [(b"content-type", b"application/json"), (b"accept-encoding", accept_encoding)]
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for i in range(total):
+        body = bodies[i % len(bodies)]
+
+        async def receive(body=body):
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        scope = {"type": "http", "method": "POST", "path": "/api/chat", "headers": headers}
+        await app(scope, receive, send)
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    # Measure request handling, not log output
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {
+        "before_rps": round(asyncio.run(run(legacy_asgi_chat, args.requests, b"")), 1),
+        "after_rps": round(asyncio.run(run(index.asgi_chat, args.requests, b"")), 1),
+        "after_gzip_rps": round(asyncio.run(run(index.asgi_chat, args.requests, b"gzip")), 1)
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
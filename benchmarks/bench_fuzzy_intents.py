@@ -0,0 +1,122 @@
+"""
+Microbenchmark for fuzzy intent scoring: one vector-matrix product over the
+FuzzyIntentScorer matrix versus scoring each phrasing in a Python loop, at growing
+FAQ table sizes up to 10k phrasings. Also reports the matrix size, how many of
+the misspelled or reworded queries reach the threshold, and which questions from a
+set that share a word with an FAQ but ask something else wrongly get its answer.
+
+Usage:
+    python benchmarks/bench_fuzzy_intents.py --sizes 30 1000 10000 --queries 500
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import index  # noqa: E402
+
+WORDS = ("tuition housing parking deadline transcript scholarship library advisor semester credit "
+         "refund dorm meal visa orientation exam grade schedule faculty campus").split()
+
+# Campus questions that share a word with an FAQ phrasing but must not get its answer
+NEGATIVE_QUERIES = [
+    "who is the dean of admissions",
+    "can i change my major",
+    "application fee",
+    "admission office phone number",
+    "is the portal down",
+    "tuition payment plan deadline",
+    "who teaches the course on databases",
+    "how do i apply for housing",
+    "where is the registration office",
+    "password for the campus wifi",
+    "what credit card does the bookstore take",
+    "degree audit"
+]
+
+
+def synthetic_table(size, rng):
+    table = {key: list(patterns) for key, patterns in index.faq_bundle.exact_matches.items()}
+    count = sum(len(patterns) for patterns in table.values())
+    while count < size:
+        key = f"synthetic intent {len(table)}"
+        table[key] = [" ".join(rng.sample(WORDS, rng.randint(2, 4))) + f" {len(table)}" for _ in range(5)]
+        count += 5
+    return table
+
+
+def misspell(text, rng):
+    # Drop one letter from a word longer than four letters, like "tution"
+    words = text.split()
+    candidates = [i for i, word in enumerate(words) if len(word) > 4]
+    if not candidates:
+        return text
+    i = rng.choice(candidates)
+    cut = rng.randrange(1, len(words[i]) - 1)
+    words[i] = words[i][:cut] + words[i][cut + 1:]
+    return " ".join(words)
+
+
+def loop_best(scorer, rows, query):
+    # The same scores, one phrasing at a time
+    features = scorer._features(query)
+    best = (0.0, None)
+    for row, row_features in enumerate(rows):
+        score = sum(weight * row_features.get(column, 0.0) for column, weight in features.items())
+        if score > best[0]:
+            best = (score, row)
+    return best
+
+
+def time_per_query(func, queries):
+    started = time.perf_counter()
+    for query in queries:
+        func(query)
+    return (time.perf_counter() - started) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 1000, 10000])
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    hits = [pattern for patterns in index.faq_bundle.exact_matches.values() for pattern in patterns]
+    queries = []
+    for i in range(args.queries):
+        if i % 2:
+            queries.append(misspell(rng.choice(hits), rng))
+        else:
+            queries.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12))) + "?")
+
+    results = []
+    for size in args.sizes:
+        table = synthetic_table(size, rng)
+        started = time.perf_counter()
+        scorer = index.build_fuzzy_intent_scorer(table)
+        build_ms = (time.perf_counter() - started) * 1000
+        rows = [scorer._features(pattern) for pattern in scorer.patterns]
+
+        results.append({
+            "phrasings": scorer.size,
+            "build_ms": round(build_ms, 2),
+            "matrix_mb": round(scorer.matrix.nbytes / 1e6, 2),
+            "loop_us_per_query": round(time_per_query(lambda q: loop_best(scorer, rows, q), queries), 2),
+            "vectorized_us_per_query": round(time_per_query(scorer.best, queries), 2),
+            "misspelled_matched": sum(1 for query in queries[1::2] if scorer.best(query)),
+            "misspelled_total": len(queries[1::2]),
+            "negatives_matched": {query: match[2] for query in NEGATIVE_QUERIES if (match := scorer.best(query))},
+            "negatives_total": len(NEGATIVE_QUERIES)
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
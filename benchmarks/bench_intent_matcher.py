@@ -0,0 +1,87 @@
+"""
+Microbenchmark for predefined-answer matching: the compiled IntentMatcher versus the
+previous nested scan over the FAQ phrasings, at growing FAQ table sizes.
+
+Usage:
+    python benchmarks/bench_intent_matcher.py --sizes 30 1000 5000 --queries 2000
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import index  # noqa: E402
+
+WORDS = ("tuition housing parking deadline transcript scholarship library advisor semester credit "
+         "refund dorm meal visa orientation exam grade schedule faculty campus").split()
+
+
+def legacy_match(exact_matches, query):
+    # The linear scan get_predefined_answer used before the compiled matcher
+    clean_query = re.sub(r'[^\w\s]', '', query.lower().strip())
+    for key, patterns in exact_matches.items():
+        for pattern in patterns:
+            if clean_query == pattern or pattern in clean_query:
+                return key
+    if any(word in clean_query for word in index.faq_bundle.password_keywords):
+        return index.faq_bundle.password_answer
+    return None
+
+
+def synthetic_table(size, rng):
+    table = {key: list(patterns) for key, patterns in index.faq_bundle.exact_matches.items()}
+    count = sum(len(patterns) for patterns in table.values())
+    while count < size:
+        key = f"synthetic intent {len(table)}"
+        table[key] = [" ".join(rng.sample(WORDS, rng.randint(2, 4))) + f" {len(table)}" for _ in range(5)]
+        count += 5
+    return table
+
+
+def time_per_query(func, queries):
+    started = time.perf_counter()
+    for query in queries:
+        func(query)
+    return (time.perf_counter() - started) / len(queries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[30, 1000, 5000])
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    hits = [pattern for patterns in index.faq_bundle.exact_matches.values() for pattern in patterns]
+    queries = []
+    for i in range(args.queries):
+        if i % 2:
+            queries.append(f"Hi, {rng.choice(hits)} for the fall semester?")
+        else:
+            queries.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12))) + "?")
+
+    results = []
+    for size in args.sizes:
+        table = synthetic_table(size, rng)
+        started = time.perf_counter()
+        matcher = index.build_intent_matcher(table, index.faq_bundle.password_keywords, index.faq_bundle.password_answer)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        results.append({
+            "phrasings": matcher.size,
+            "build_ms": round(build_ms, 2),
+            "legacy_us_per_query": round(time_per_query(lambda q: legacy_match(table, q), queries), 2),
+            "compiled_us_per_query": round(time_per_query(matcher.find_all, queries), 2)
+        })
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Logging overhead on the FAQ path: microseconds per request added by the queued,
+sampled JSON pipeline at different sample rates, next to the previous setup of a
+synchronous StreamHandler writing every per-request line as text.
+
+Requests are driven straight through the ASGI callable and records are written to
+os.devnull. "request_us" is the request loop alone; "total_us" also waits for the
+writer thread to drain the queue, so it includes the formatting moved off the
+request path.
+
+Usage:
+    python benchmarks/bench_logging.py --requests 20000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+os.environ.setdefault("ANSWER_STORE_PATH", "")
+
+import index  # noqa: E402
+
+QUERIES = ["What are the tuition fees?", "How do I apply?", "I forgot my password", "How do I select courses?"]
+
+
+async def drive(total):
+    bodies = [json.dumps({"query": query}).encode("utf-8") for query in QUERIES]
+    scope = {"type": "http", "method": "POST", "path": "/api/chat", "headers": [(b"content-type", b"application/json")]}
+
+    async def send(message):
+        pass
+
+    for i in range(total):
+        body = bodies[i % len(bodies)]
+
+        async def receive(body=body):
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await index.asgi_app(scope, receive, send)
+
+
+def run(total, repeats=3):
+    """
+    Median (request_us, total_us) per request over the repeats.
+    """
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        asyncio.run(drive(total))
+        request_done = time.perf_counter()
+        while not index.log_handler.queue.empty():
+            time.sleep(0.0005)
+        drained = time.perf_counter()
+        timings.append(((request_done - started) / total * 1e6, (drained - started) / total * 1e6))
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    root = logging.getLogger()
+    devnull = open(os.devnull, "w")
+    index.log_output.setStream(devnull)
+    pipeline_handlers = list(root.handlers)
+
+    # Warm up caches and lazy state before timing anything
+    root.setLevel(logging.CRITICAL)
+    run(1000, repeats=1)
+
+    results = {}
+    baseline, _ = run(args.requests)
+    results["logging_off"] = {"request_us": round(baseline, 2)}
+
+    root.setLevel(logging.INFO)
+    for rate in (0.0, 0.1, 1.0):
+        index.LOG_SAMPLE_RATE = rate
+        request_us, total_us = run(args.requests)
+        results[f"queued_json_sample_{rate}"] = {
+            "request_us": round(request_us, 2),
+            "total_us": round(total_us, 2),
+            "overhead_us": round(total_us - baseline, 2)
+        }
+
+    # The previous setup: every per-request line, formatted and written on the request path
+    legacy = logging.StreamHandler(devnull)
+    legacy.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    root.handlers = [legacy]
+    root.setLevel(logging.DEBUG)
+    request_us, _ = run(args.requests)
+    results["sync_stream_handler_all_lines"] = {"request_us": round(request_us, 2), "overhead_us": round(request_us - baseline, 2)}
+    root.handlers = pipeline_handlers
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
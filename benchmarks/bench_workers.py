@@ -0,0 +1,161 @@
+"""
+Throughput of the production server (serve.py) as the worker count grows from one
+to N, for two workloads:
+
+- local: predefined FAQ answers, which are CPU-bound in the worker and should scale
+  with the number of cores until the load generator runs out of CPU
+- llm: free-form queries answered through the local fake OpenAI server, where each
+  worker is mostly waiting on the upstream
+
+The load comes from --clients separate processes so the generator isn't capped at
+one core. It shares the machine with the server, so leave cores for it: on a box
+with C cores, worker counts above roughly C - clients mostly measure contention.
+Prints requests per second, p50/p99 latency and the speedup over one worker.
+
+Usage:
+    python benchmarks/bench_workers.py --workers 1 2 4 8 --clients 2 --requests 4000
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench_asgi_vs_wsgi import ROOT, percentile, wait_for_port
+
+PREDEFINED_QUERIES = [
+    "What are the tuition fees?",
+    "How do I apply?",
+    "How do I select courses?",
+    "How do I access the student portal?"
+]
+
+
+def start_server(workers, port, upstream_url):
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    env.update({
+        "OPENAI_BASE_URL": upstream_url,
+        "OPENAI_MAX_RETRIES": "0",
+        "WEB_CONCURRENCY": str(workers),
+        "HOST": "127.0.0.1",
+        "PORT": str(port),
+        "RATE_LIMIT_PER_MINUTE": "0",
+        "ANSWER_STORE_PATH": "",
+        "LOG_LEVEL": "WARNING",
+        "GRACEFUL_TIMEOUT": "5"
+    })
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "serve.py")], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_for_port(f"http://127.0.0.1:{port}/")
+    return process
+
+
+def query_for(workload, i):
+    if workload == "local":
+        return PREDEFINED_QUERIES[i % len(PREDEFINED_QUERIES)]
+    # Unique per request so every one reaches the upstream instead of the answer cache
+    return f"What clubs meet in building {i} on campus?"
+
+
+async def drive(base_url, workload, offset, total, concurrency):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def one(i):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/api/chat", json={"query": query_for(workload, i)})
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(one(i) for i in range(offset, offset + total)))
+    return latencies, errors
+
+
+def drive_client(base_url, workload, offset, total, concurrency):
+    return asyncio.run(drive(base_url, workload, offset, total, concurrency))
+
+
+def measure(pool, clients, base_url, workload, total, concurrency, offset=0):
+    share = total // clients
+    started = time.perf_counter()
+    futures = [pool.submit(drive_client, base_url, workload, offset + i * share, share, max(1, concurrency // clients))
+               for i in range(clients)]
+    results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - started
+
+    latencies = [latency for client_latencies, errors in results for latency in client_latencies]
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors for client_latencies, errors in results),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="worker counts (default 1, 2, 4 ... CPUs)")
+    parser.add_argument("--workloads", nargs="+", default=["local", "llm"], choices=["local", "llm"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=1, help="load generator processes")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake upstream latency in seconds")
+    parser.add_argument("--upstream-port", type=int, default=8765)
+    parser.add_argument("--app-port", type=int, default=5056)
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    worker_counts = args.workers or sorted({1, *(2 ** i for i in range(1, cpus.bit_length()) if 2 ** i <= cpus), cpus})
+
+    upstream = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "fake_openai.py"),
+         "--port", str(args.upstream_port), "--latency", str(args.latency)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    upstream_url = f"http://127.0.0.1:{args.upstream_port}/v1"
+    base_url = f"http://127.0.0.1:{args.app_port}"
+    results = {"cpus": cpus, "clients": args.clients, "runs": []}
+    try:
+        wait_for_port(upstream_url)
+        with concurrent.futures.ProcessPoolExecutor(args.clients) as pool:
+            for workers in worker_counts:
+                server = start_server(workers, args.app_port, upstream_url)
+                try:
+                    for workload in args.workloads:
+                        # Warm every worker's connection pools and caches before timing
+                        measure(pool, args.clients, base_url, workload, args.concurrency * 2, args.concurrency,
+                                offset=args.requests)
+                        run = measure(pool, args.clients, base_url, workload, args.requests, args.concurrency)
+                        results["runs"].append({"workers": workers, "workload": workload, **run})
+                finally:
+                    server.terminate()
+                    server.wait()
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+    single = {run["workload"]: run["requests_per_second"] for run in results["runs"] if run["workers"] == worker_counts[0]}
+    for run in results["runs"]:
+        run["speedup"] = round(run["requests_per_second"] / single[run["workload"]], 2) if single.get(run["workload"]) else None
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
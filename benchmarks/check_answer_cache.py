@@ -0,0 +1,46 @@
+"""
+Regression check for AnswerCache near-duplicate matching: rephrasings of one question
+must share a cached answer, and questions asking something different (another
+interrogative, another subject) must not. Exits 1 on any wrong decision.
+
+Usage:
+    python benchmarks/check_answer_cache.py
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import index  # noqa: E402
+
+# (cached question, asked question, whether the cached answer should be returned)
+PAIRS = [
+    ("when is fall deadline", "fall application deadline?", True),
+    ("fall application deadline?", "when is fall deadline", True),
+    ("when is fall deadline", "fall deadline", True),
+    ("fall deadline", "when is the fall deadline?", True),
+    ("What are the tuition fees?", "what are tuition fees", True),
+    ("when is fall deadline", "where is fall deadline", False),
+    ("where is the library", "when is the library open", False),
+    ("how much is housing", "how much is parking", False)
+]
+
+
+def main():
+    failures = []
+    for cached, asked, expected in PAIRS:
+        cache = index.AnswerCache()
+        cache.set(cached, {"answer": cached, "sources": []})
+        matched = cache.get(asked) is not None
+        if matched != expected:
+            failures.append({"cached": cached, "asked": asked, "expected_match": expected})
+
+    print(json.dumps({"pairs": len(PAIRS), "failures": failures}, indent=2))
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
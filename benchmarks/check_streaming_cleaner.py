@@ -0,0 +1,62 @@
+"""
+Equivalence check for StreamingCleaner: random model-like text with markdown, emoji
+and website mentions is split into random chunks, and the streamed output must equal
+clean_response_format of the whole text.
+
+The differences StreamingCleaner documents in its docstring don't come up with these
+pieces; the run exits 1 if any mismatch does, printing the first few.
+
+Usage:
+    python benchmarks/check_streaming_cleaner.py --cases 20000 --seed 0
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import index  # noqa: E402
+
+PIECES = [
+    "a", "word", "tuition", " ", "  ", "\n", "\n\n", " \n", "\t", "-", "$1,125", "#", "## ", "### ", "*", "**",
+    "[", "]", "(", ")", "](", "[Admissions](https://www.na.edu/admissions/)", "http://x", "@nau",
+    "🎓", "👨‍🎓", "✓", "(na.edu)", "( www.na.edu )", "(www.", "na.edu"
+]
+
+
+def random_case(rng):
+    text = "".join(rng.choice(PIECES) for _ in range(rng.randint(1, 30)))
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 30)))) if len(text) > 1 else []
+    return text, [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+def streamed(chunks):
+    cleaner = index.StreamingCleaner()
+    return "".join(cleaner.feed(chunk) for chunk in chunks) + cleaner.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cases", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mismatches = []
+    for _ in range(args.cases):
+        text, chunks = random_case(rng)
+        expected = index.clean_response_format(text)
+        actual = streamed(chunks)
+        if actual != expected:
+            mismatches.append({"chunks": chunks, "streamed": actual, "expected": expected})
+
+    print(json.dumps({"cases": args.cases, "mismatches": len(mismatches), "examples": mismatches[:5]}, indent=2, ensure_ascii=False))
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Offline evaluation of the local query router against a labeled query set.
+
+Each line of the labeled set is {"query": ..., "route": ...} with route one of
+small_talk, off_topic, knowledge_base or web_search. Queries that already have a
+predefined answer never reach the router in production, so they are reported
+separately instead of being scored. Prints accuracy, per-route precision and recall,
+the confusion matrix, every misrouted query and the routing time per query.
+
+The knowledge_base labels assume the knowledge base in KB_DATA_DIR; relabel them
+after changing the corpus.
+
+Usage:
+    python benchmarks/eval_router.py
+    python benchmarks/eval_router.py --labels my_queries.jsonl --min-accuracy 0.9
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+import index  # noqa: E402
+
+ROUTES = ("small_talk", "off_topic", "knowledge_base", "web_search")
+
+
+def load_labels(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(labeled):
+    confusion = {expected: {actual: 0 for actual in ROUTES} for expected in ROUTES}
+    misrouted = []
+    predefined = []
+    elapsed = 0.0
+    for row in labeled:
+        if index.get_predefined_answer(row["query"]):
+            predefined.append(row["query"])
+            continue
+        started = time.perf_counter()
+        route = index.route_query(row["query"])
+        elapsed += time.perf_counter() - started
+        confusion[row["route"]][route.kind] += 1
+        if route.kind != row["route"]:
+            misrouted.append({"query": row["query"], "expected": row["route"], "actual": route.kind, "reason": route.reason})
+
+    scored = sum(sum(row.values()) for row in confusion.values())
+    correct = sum(confusion[route][route] for route in ROUTES)
+    per_route = {}
+    for route in ROUTES:
+        predicted = sum(confusion[expected][route] for expected in ROUTES)
+        actual = sum(confusion[route].values())
+        per_route[route] = {
+            "precision": round(confusion[route][route] / predicted, 3) if predicted else None,
+            "recall": round(confusion[route][route] / actual, 3) if actual else None,
+            "support": actual
+        }
+
+    return {
+        "scored": scored,
+        "accuracy": round(correct / scored, 3) if scored else 0.0,
+        "per_route": per_route,
+        "confusion": confusion,
+        "misrouted": misrouted,
+        "predefined_hits": predefined,
+        "us_per_query": round(elapsed / scored * 1e6, 1) if scored else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--labels", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "router_queries.jsonl"))
+    parser.add_argument("--min-accuracy", type=float, default=None, help="exit 1 when accuracy is below this")
+    args = parser.parse_args()
+
+    # Warm the knowledge index so its build isn't counted as routing time
+    index.get_knowledge_index()
+    result = evaluate(load_labels(args.labels))
+    print(json.dumps(result, indent=2))
+    if args.min_accuracy is not None and result["accuracy"] < args.min_accuracy:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
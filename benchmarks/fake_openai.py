@@ -0,0 +1,191 @@
+"""
+Local stand-in for the OpenAI chat completions API, used by the benchmarks.
+
+Serves POST /v1/chat/completions (regular and "stream": true) with an artificial
+latency so the app can be load tested without network access or API spend. Latency
+can be jittered, a fraction of requests can fail with a 500, and search models can
+attach url_citation annotations like the real web search models do.
+
+Usage:
+    python benchmarks/fake_openai.py --port 8765 --latency 0.5 --jitter 0.2 --error-rate 0.05 --citations 2
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+CITATION_PAGES = [
+    "https://www.na.edu/admissions/",
+    "https://www.na.edu/admissions/tuition-and-fees/",
+    "https://www.na.edu/campus-life/housing/",
+    "https://www.na.edu/academics/",
+    "https://www.na.edu/student-services/"
+]
+
+
+def build_annotations(content, count):
+    annotations = []
+    for i in range(count):
+        url = CITATION_PAGES[i % len(CITATION_PAGES)]
+        annotations.append({
+            "type": "url_citation",
+            "url_citation": {
+                "start_index": 0,
+                "end_index": len(content),
+                "title": f"North American University {i + 1}",
+                "url": f"{url}?utm_source=openai"
+            }
+        })
+    return annotations
+
+
+def build_error(status):
+    return {
+        "error": {
+            "message": f"Simulated upstream failure ({status})",
+            "type": "server_error",
+            "param": None,
+            "code": None
+        }
+    }
+
+
+def build_completion(body, content, annotations=None):
+    message = {"role": "assistant", "content": content}
+    if annotations:
+        message["annotations"] = annotations
+    return {
+        "id": f"chatcmpl-fake-{int(time.time() * 1000)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o"),
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": message
+            }
+        ],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150}
+    }
+
+
+def build_chunk(body, content, finish_reason=None, annotations=None):
+    delta = {"content": content} if content is not None else {}
+    if annotations:
+        delta["annotations"] = annotations
+    return {
+        "id": "chatcmpl-fake-stream",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o"),
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+
+
+async def send_stream(send, body, content, latency, annotations=None):
+    """
+    Send content as chat.completion.chunk events, spreading the latency
+    between the first token and the rest of the answer. Annotations ride
+    on the last content chunk.
+    """
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream")]})
+    words = content.split(" ")
+    for i, word in enumerate(words):
+        piece = word if i == 0 else " " + word
+        chunk = build_chunk(body, piece, annotations=annotations if i == len(words) - 1 else None)
+        event = b"data: " + json.dumps(chunk).encode("utf-8") + b"\n\n"
+        await send({"type": "http.response.body", "body": event, "more_body": True})
+        await asyncio.sleep(latency / len(words))
+    final = b"data: " + json.dumps(build_chunk(body, None, "stop")).encode("utf-8") + b"\n\n"
+    await send({"type": "http.response.body", "body": final + b"data: [DONE]\n\n"})
+
+
+def make_app(latency, jitter=0.0, error_rate=0.0, citations=0, seed=None):
+    """
+    latency is the mean response time in seconds; each request draws from
+    latency +/- jitter. error_rate is the fraction of requests answered with a 500,
+    and search models attach `citations` url_citation annotations.
+    """
+    rng = random.Random(seed)
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        if scope["method"] != "POST" or not scope["path"].endswith("/chat/completions"):
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        request_data = json.loads(body)
+        question = request_data["messages"][-1]["content"]
+        content = f"I can help with that. {question}"
+        delay = max(0.0, latency + rng.uniform(-jitter, jitter))
+        annotations = build_annotations(content, citations) if "search" in request_data.get("model", "") else None
+
+        if rng.random() < error_rate:
+            await asyncio.sleep(delay)
+            await send_json(send, 500, build_error(500))
+            return
+
+        if request_data.get("stream"):
+            await asyncio.sleep(delay / 5)
+            await send_stream(send, request_data, content, delay, annotations)
+            return
+
+        await asyncio.sleep(delay)
+        await send_json(send, 200, build_completion(request_data, content, annotations))
+
+    return app
+
+
+async def send_json(send, status, data):
+    payload = json.dumps(data).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode("ascii"))]
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def serve(host, port, latency, shutdown_trigger=None, jitter=0.0, error_rate=0.0, citations=0, seed=None):
+    import hypercorn.asyncio
+    import hypercorn.config
+
+    config = hypercorn.config.Config()
+    config.bind = [f"{host}:{port}"]
+    config.accesslog = None
+    config.errorlog = None
+    config.keep_alive_timeout = 75
+    app = make_app(latency, jitter=jitter, error_rate=error_rate, citations=citations, seed=seed)
+    await hypercorn.asyncio.serve(app, config, shutdown_trigger=shutdown_trigger)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds to wait before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latency varies uniformly by up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--citations", type=int, default=0, help="url_citation annotations per search model answer")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible jitter and errors")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      citations=args.citations, seed=args.seed))
@@ -0,0 +1,259 @@
+"""
+Load test for /api/chat against the local fake OpenAI server.
+
+Starts benchmarks/fake_openai.py and the app (Hypercorn serving index:asgi_app, or
+gunicorn serving index:app), then drives /api/chat with a seeded mix of predefined,
+follow-up, free-form and streaming queries at a fixed concurrency. Prints one JSON
+document with requests per second, p50/p95/p99 latency and error rates, overall and
+per query kind, plus the answer sources the app reported on /metrics.
+
+Free-form queries are unique per request so they reach the upstream instead of the
+answer cache. Pass --baseline with an earlier result to print the deltas; with
+--max-regression the run exits non-zero when throughput drops or p99 grows by more
+than that fraction.
+
+Usage:
+    python benchmarks/load_test.py --requests 500 --concurrency 50 --latency 0.5 --jitter 0.2 \\
+        --error-rate 0.02 --output results.json
+    python benchmarks/load_test.py --baseline results.json --max-regression 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import string
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench_asgi_vs_wsgi import ROOT, percentile, start_server, wait_for_port
+
+PREDEFINED_QUERIES = [
+    "What are the tuition fees?",
+    "How do I apply?",
+    "I forgot my password",
+    "How do I select courses?",
+    "How do I access the student portal?"
+]
+
+FOLLOW_UPS = [
+    {"query": "yes", "original_question": "What are the tuition fees?"},
+    {"query": "graduate", "original_question": "How do I apply?"},
+    {"query": "undergraduate", "original_question": "How do I apply?"}
+]
+
+TOPICS = ("parking housing library transcript scholarship advisor refund visa orientation "
+          "internship tutoring printing shuttle gym clubs chapel counseling textbooks laptop wifi").split()
+
+
+def build_requests(total, mix, rng):
+    """
+    Returns (kind, payload) pairs drawn from the mix weights.
+    """
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    requests = []
+    for i in range(total):
+        kind = rng.choices(kinds, weights)[0]
+        if kind == "predefined":
+            payload = {"query": rng.choice(PREDEFINED_QUERIES)}
+        elif kind == "follow_up":
+            payload = dict(rng.choice(FOLLOW_UPS), follow_up_to=f"followup_{i}")
+        else:
+            # Made-up words keep near-duplicate detection in the answer cache from matching
+            first, second = rng.sample(TOPICS, 2)
+            tag = " ".join("".join(rng.choices(string.ascii_lowercase, k=6)) for _ in range(2))
+            payload = {"query": f"What about {first} and {second} for {tag}?"}
+            if kind == "stream":
+                payload["stream"] = True
+        requests.append((kind, payload))
+    return requests
+
+
+def summarize(latencies, statuses, elapsed=None):
+    errors = sum(1 for status in statuses if status != 200)
+    summary = {
+        "requests": len(statuses),
+        "errors": errors,
+        "error_rate": round(errors / len(statuses), 4) if statuses else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1)
+    }
+    if elapsed is not None:
+        summary["elapsed_s"] = round(elapsed, 3)
+        summary["requests_per_second"] = round(len(statuses) / elapsed, 2)
+    return summary
+
+
+async def drive(base_url, requests, concurrency):
+    results = []
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def one(kind, payload):
+            async with semaphore:
+                started = time.perf_counter()
+                first_byte = None
+                try:
+                    async with client.stream("POST", "/api/chat", json=payload) as response:
+                        async for _ in response.aiter_bytes():
+                            if first_byte is None:
+                                first_byte = time.perf_counter() - started
+                        status = response.status_code
+                except httpx.HTTPError:
+                    status = 0
+                results.append((kind, status, time.perf_counter() - started, first_byte))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(kind, payload) for kind, payload in requests))
+        elapsed = time.perf_counter() - started
+
+        try:
+            metrics_text = (await client.get("/metrics")).text
+        except httpx.HTTPError:
+            metrics_text = ""
+
+    return results, elapsed, metrics_text
+
+
+def answer_sources(metrics_text):
+    sources = {}
+    for name, value in re.findall(r'^nau_answers_total\{source="([^"]+)"\} (\S+)$', metrics_text, re.M):
+        sources[name] = int(float(value))
+    return sources
+
+
+def report(results, elapsed, metrics_text):
+    summary = summarize([latency for _, _, latency, _ in results], [status for _, status, _, _ in results], elapsed)
+    by_kind = {}
+    for kind in sorted({kind for kind, _, _, _ in results}):
+        rows = [row for row in results if row[0] == kind]
+        by_kind[kind] = summarize([latency for _, _, latency, _ in rows], [status for _, status, _, _ in rows])
+        if kind == "stream":
+            first_bytes = [first_byte for _, _, _, first_byte in rows if first_byte is not None]
+            by_kind[kind]["first_byte_p50_ms"] = round(percentile(first_bytes, 50) * 1000, 1)
+            by_kind[kind]["first_byte_p99_ms"] = round(percentile(first_bytes, 99) * 1000, 1)
+
+    statuses = {}
+    for _, status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    summary["statuses"] = statuses
+    summary["by_kind"] = by_kind
+    summary["answer_sources"] = answer_sources(metrics_text)
+    return summary
+
+
+def compare(result, baseline, max_regression):
+    """
+    Relative change of throughput and p99 against the baseline, and whether
+    either regressed by more than max_regression.
+    """
+    before, after = baseline["summary"], result["summary"]
+    rps_change = after["requests_per_second"] / before["requests_per_second"] - 1 if before["requests_per_second"] else 0.0
+    p99_change = after["p99_ms"] / before["p99_ms"] - 1 if before["p99_ms"] else 0.0
+    regressed = max_regression is not None and (rps_change < -max_regression or p99_change > max_regression)
+    return {
+        "requests_per_second_change": round(rps_change, 4),
+        "p99_change": round(p99_change, 4),
+        "error_rate_change": round(after["error_rate"] - before["error_rate"], 4),
+        "regressed": regressed
+    }
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in ("predefined", "follow_up", "free_form", "stream"):
+            raise argparse.ArgumentTypeError(f"unknown query kind: {kind}")
+        mix[kind] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("predefined=0.4,follow_up=0.1,free_form=0.4,stream=0.1"),
+                        help="query kind weights, e.g. predefined=0.4,follow_up=0.1,free_form=0.4,stream=0.1")
+    parser.add_argument("--server", choices=("asgi", "wsgi"), default="asgi")
+    parser.add_argument("--threads", type=int, default=32, help="gunicorn threads for --server wsgi")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake upstream mean latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="fake upstream latency jitter in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls that fail")
+    parser.add_argument("--citations", type=int, default=2, help="url_citation annotations per search answer")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--upstream-port", type=int, default=8765)
+    parser.add_argument("--app-port", type=int, default=5055)
+    parser.add_argument("--output", help="also write the result JSON to this file")
+    parser.add_argument("--baseline", help="earlier result JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="exit 1 when throughput drops or p99 grows by more than this fraction of the baseline")
+    args = parser.parse_args()
+
+    requests = build_requests(args.requests, args.mix, random.Random(args.seed))
+
+    upstream = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "fake_openai.py"),
+         "--port", str(args.upstream_port), "--latency", str(args.latency), "--jitter", str(args.jitter),
+         "--error-rate", str(args.error_rate), "--citations", str(args.citations), "--seed", str(args.seed)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    upstream_url = f"http://127.0.0.1:{args.upstream_port}/v1"
+
+    # The load generator is a single client, so per-client rate limiting is switched off
+    os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "0")
+    # Each run starts with no persisted answers, so the mix reaches the upstream as specified
+    os.environ.setdefault("ANSWER_STORE_PATH", "")
+    try:
+        wait_for_port(upstream_url)
+        if upstream.poll() is not None:
+            raise RuntimeError(f"Fake upstream exited early; is port {args.upstream_port} already in use?")
+        server = start_server(args.server, args.app_port, upstream_url, args.threads)
+        try:
+            results, elapsed, metrics_text = asyncio.run(drive(f"http://127.0.0.1:{args.app_port}", requests, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+    finally:
+        upstream.terminate()
+        upstream.wait()
+
+    result = {
+        "config": {
+            "server": args.server,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "citations": args.citations,
+            "seed": args.seed
+        },
+        "summary": report(results, elapsed, metrics_text)
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            result["comparison"] = compare(result, json.load(f), args.max_regression)
+        exit_code = 1 if result["comparison"]["regressed"] else 0
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
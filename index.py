@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 import os
 import json
@@ -6,51 +6,256 @@ import time
 import re
 import asyncio
 import functools
+import threading
 import urllib.parse
+import gzip
+import hashlib
+import zlib
+import contextlib
+import bisect
+import heapq
+import random
+import secrets
+import sqlite3
+import tempfile
+import mimetypes
+from collections import OrderedDict, deque
 from dotenv import load_dotenv
-from openai import OpenAI
-# Async support for Flask
-from asgiref.sync import async_to_sync
 
 # Set up logging
 import logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
+import logging.handlers
+import queue
+import atexit
+import contextvars
+
+# Log level; "json" (one object per line) or "text" records; share of successful chat
+# requests whose records are kept; requests slower than this (seconds) are always logged;
+# records buffered for the writer thread before new ones are dropped
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "5"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# The chat request being handled, for request ids, sampling and stage timings in the logs
+current_request = contextvars.ContextVar("current_request", default=None)
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record, with the request id and any structured fields
+    passed as extra={"fields": {...}}.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        if getattr(record, "request_id", None):
+            text += f" [{record.request_id}]"
+        fields = getattr(record, "fields", None)
+        return f"{text} {json.dumps(fields, default=str)}" if fields else text
+
+class SampledQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread without blocking. Below WARNING, records from
+    chat requests that weren't sampled are dropped here, before any formatting; once
+    LOG_QUEUE_SIZE records are waiting, new ones are dropped and counted rather than
+    stalling the request.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def filter(self, record):
+        request_log = current_request.get()
+        if request_log is not None:
+            if record.levelno < logging.WARNING and not request_log.sampled:
+                return False
+            record.request_id = request_log.request_id
+        return super().filter(record)
+
+    def prepare(self, record):
+        # The queue stays in this process, so only the message needs resolving now;
+        # formatting happens on the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= LOG_QUEUE_SIZE:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+# Records don't carry thread or process details, so skip collecting them for each one
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+
+log_output = logging.StreamHandler()
+log_output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter('%(asctime)s - %(levelname)s - %(message)s'))
+log_handler = SampledQueueHandler(queue.SimpleQueue())
+logging.basicConfig(level=LOG_LEVEL, handlers=[log_handler])
 logger = logging.getLogger(__name__)
 
+log_listener = None
 
-def make_async_compatible(app):
+def start_log_listener():
     """
-    Wraps Flask routes with async support using asgiref.
-    This allows async functions to be used in Flask routes.
+    Start the thread that formats and writes queued records. Forked workers
+    call this again, since the parent's thread doesn't survive the fork.
     """
-    original_route = app.route
-    
-    def async_route(rule, **options):
-        def decorator(func):
-            if not asyncio.iscoroutinefunction(func):
-                return original_route(rule, **options)(func)
-                
-            @original_route(rule, **options)
-            @functools.wraps(func)
-            def sync_func(*args, **kwargs):
-                return async_to_sync(func)(*args, **kwargs)
-                
-            return sync_func
-            
-        return decorator
-        
-    app.route = async_route
-    
-    return app
+    global log_listener
+    log_handler.queue = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_handler.queue, log_output, respect_handler_level=True)
+    log_listener.start()
+
+start_log_listener()
+os.register_at_fork(after_in_child=start_log_listener)
+# Flush what is still queued when the process exits
+atexit.register(lambda: log_listener.stop())
+
+class RequestLog:
+    """
+    Per-request log state: id, sampling decision, stage timings and answer sources.
+    finish() writes one summary record, always for errors and slow requests and
+    otherwise only when the request was sampled.
+    """
+
+    def __init__(self, route, request_id=None):
+        self.route = route
+        # Not a secret, so skip the urandom syscall secrets would make on every request
+        self.request_id = request_id or f"{random.getrandbits(64):016x}"
+        self.sampled = LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.sources = []
+        self.fields = {}
+
+    def finish(self, status):
+        duration = time.perf_counter() - self.started
+        slow = duration >= SLOW_REQUEST_SECONDS
+        failed = status >= 500 or "error" in self.sources
+        if not (self.sampled or slow or failed):
+            return
+        level = logging.ERROR if failed else logging.WARNING if slow else logging.INFO
+        fields = {
+            "route": self.route,
+            "status": status,
+            "duration_ms": round(duration * 1000, 2),
+            "sources": self.sources,
+            "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()}
+        }
+        fields.update(self.fields)
+        logger.log(level, "Slow chat request" if slow else "Chat request",
+                   extra={"request_id": self.request_id, "fields": fields})
+
+def annotate_request(**fields):
+    # Extra fields for the current request's summary record
+    request_log = current_request.get()
+    if request_log is not None:
+        request_log.fields.update(fields)
+
+def incoming_request_id(value):
+    # Reuse an id set by a proxy or client so records can be joined across services
+    value = (value or "").strip()
+    return value[:64] if re.fullmatch(r"[\w.:-]+", value) else None
+
+
+# Process-wide event loop used to run coroutines from Flask's sync workers
+_event_loop = None
+_event_loop_pid = None
+_event_loop_lock = threading.Lock()
+
+def get_event_loop():
+    """
+    Return the shared background event loop, starting it on first use.
+    All coroutines started from WSGI views run on this one loop, so async resources
+    such as the pooled OpenAI client can be reused across requests.
+    """
+    global _event_loop, _event_loop_pid
+    if _event_loop is not None and _event_loop_pid == os.getpid():
+        return _event_loop
+
+    with _event_loop_lock:
+        # A forked worker inherits the parent's loop object but not its thread
+        if _event_loop is None or _event_loop_pid != os.getpid():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="async-views", daemon=True)
+            thread.start()
+            _event_loop = loop
+            _event_loop_pid = os.getpid()
+    return _event_loop
+
+async def in_request(coro, request_log):
+    # Tasks copy the context of the thread that creates them, so set the request explicitly
+    current_request.set(request_log)
+    return await coro
+
+def run_async(coro):
+    """
+    Run a coroutine on the shared event loop and block until it finishes.
+    Used by the WSGI routes; under the ASGI entry point coroutines run on the server loop.
+    The calling thread's current request carries over to the coroutine.
+    """
+    request_log = current_request.get()
+    if request_log is not None:
+        coro = in_request(coro, request_log)
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+def iterate_async(agen):
+    """
+    Drive an async generator from sync code (e.g. a streamed WSGI response),
+    running each step on the shared event loop.
+    """
+    try:
+        while True:
+            try:
+                yield run_async(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    except GeneratorExit:
+        # The server closes the body early when the client went away mid-stream
+        CANCELLED_REQUESTS_TOTAL.inc("disconnect")
+        raise
+    finally:
+        run_async(agen.aclose())
+
+# Fire-and-forget tasks, referenced here so they aren't garbage collected mid-flight
+_background_tasks = set()
+
+def spawn_background(coro):
+    """
+    Start a coroutine without waiting for it: on the running loop under ASGI,
+    on the shared background loop when called from a WSGI thread.
+    The task is detached from the request that started it, so it isn't logged as part of it.
+    """
+    coro = in_request(coro, None)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    task = loop.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
 
 app = Flask(__name__)
-app = make_async_compatible(app)
 CORS(app)
 
 # Configure OpenAI client
@@ -61,285 +266,205 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise ValueError("Missing OPENAI_API_KEY environment variable. Please set it in your .env file.")
 
-# Predefined answers for frequently asked questions (including exact match keys and follow-ups)
-predefined_answers = {
-    "what are the tuition fees": {
-        "answer": """Okay, here are the full tuition and fee details for international and resident students at North American University:
-International Undergraduate:
-- Tuition per credit (1-11 credits): $1,125
-- Tuition per semester (12-16 credits): $13,500
-- Each additional credit over 16 credits: $1,125
-- Summer Tuition per class: $873
-Mandatory Fees per Semester:
-- Departmental Fees: $55
-- Computer & Internet Fees: $100
-- Library Fee: $100
-- Student Service Fee: $95
-- Course with Lab Fee: $75
-- Athletics Fee (Football, Basketball, Soccer): $1,050
-- Athletics Fee (all other sports): $800
-- Parking Fee (Covered/Uncovered): $80/$40
-Estimated Total for International Undergraduate per Semester: $16,826
-Resident Undergraduate:
-- Tuition per credit (1-11 credits): $614
-- Tuition per semester (12-16 credits): $7,368
-- Each additional credit over 16 credits: $614
-- Summer Tuition per class: $873
-Mandatory Fees per Semester: 
-- Departmental Fees: $55
-- Computer & Internet Fees: $100
-- Library Fee: $100
-- Student Service Fee: $95
-- Course with Lab Fee: $75
-- Athletics Fee (Football, Basketball, Soccer): $1,050
-- Athletics Fee (all other sports): $800
-- Parking Fee (Covered/Uncovered): $80/$40
-Estimated Total for Resident Undergraduate per Semester: $10,133
-International Graduate:
-- Tuition per credit: 
-  - MBA: $658
-  - MS Computer Science: $732
-  - M.Ed. Programs: $511
-- Total Tuition (30 credits):
-  - MBA: $19,740
-  - MS Computer Science: $21,960
-  - M.Ed. Programs: $15,330
-Resident Graduate:
-- Tuition per credit:
-  - MBA: $402
-  - MS Computer Science: $402
-  - M.Ed. Programs: $326
-- Total Tuition (30 credits): 
-  - MBA: $12,060
-  - MS Computer Science: $12,060
-  - M.Ed. Programs: $9,780
-Let me know if you need any clarification or have additional questions!""",
-        "sources": ["https://www.na.edu/admissions/tuition-and-fees/"],
-        "follow_up": {
-            "question": "Are you planning to use on-campus housing as well?",
-            "yes_response": """Great! Here's the housing and meal plan information:
-
-Housing Options:
-- Housing On Campus 2 Bed-Room only for men: $2,500.00 per semester
-- Housing On Campus 3 Bed-Room only for men: $2,100.00 per semester
-- Housing On Campus 4 Bed-Room only for men: $1,900.00 per semester
-- Housing on Hotel 2 Bed-Room: $3,600.00 per semester
-- Housing on Hotel 3 Bedroom: $3,000.00 per semester
-- Housing on Apartment 2 Bedroom: $3,200.00 per semester
-- Summer Housing: $1,250.00
-
-Additional Housing Fees:
-- Housing Deposit Fee: $150.00
-- Housing Application Fee: $50.00
-
-Meal Service Options:
-- 19-Meal per Week: $2,500.00 per semester
-- 14-Meal per Week: $1,900.00 per semester
-- 10-Meal per Week: $1,300.00 per semester
-
-Note: Housing is first-come, first-served.
-
-This brings your total estimated costs to:
-- Tuition: $13,500 per semester (12-16 credits)
-- Housing (varies by option): $1,900 - $3,600 per semester
-- Meal Plan (varies by option): $1,300 - $2,500 per semester
-- Mandatory Fees: Approximately $450
-
-Would you like more specific information about any housing options?""",
-            "no_response": """No problem! If you ever need information about housing or other campus services in the future, feel free to ask.
-
-Is there anything else you'd like to know about North American University?"""
-        }
-    },
-    "how do i apply for admission": {
-        "answer": """Okay, here are the steps to apply to North American University as an international student:
-STEP 1: Create and submit application
-- Create your NAU Account at https://apply.na.edu/admission and submit a completed application online.
-STEP 2: Pay application fee* ($75 USD)
-- Please select to make the payment online via Credit Card or an International Wire Transfer by accessing NAU's wire transfer banking information.
-STEP 3: Send Required Documents
-In order to obtain admission to NAU, an international student must submit the following documents by the application deadlines. All application documents should be properly scanned and emailed in PDF format to intadmissions@na.edu:
-1. Copy of Passport: Only the photograph and visa (when received) page are necessary.
-2. Official Academic Credentials & Test Scores: 
-- Official Copy of the High School Diploma Evaluation (The transcript has to be evaluated at one of the agencies listed on the website)
-- Official SAT/ACT, official TOEFL or official IELTS scores.
-3. Certificate of Finances (COF): This form demonstrates that you have sufficient funds to cover the cost of tuition, fees, and living expenses for at least the first year of study.
-4. Affidavit of Support (if applicable): If you will be sponsored by family or another individual, they will need to complete this form.
-Let me know if you have any other questions about the application process!""",
-        "sources": ["https://www.na.edu/admissions/"],
-        "follow_up": {
-            "question": "Are you applying as an undergraduate or graduate student?",
-            "undergraduate_response": """Great! For undergraduate admission, you'll also need to provide:
-
-1. High school transcripts (evaluated by a credential evaluation service)
-2. English proficiency test scores (TOEFL: minimum 61, IELTS: minimum 5.5)
-3. SAT/ACT scores (optional but recommended for scholarship consideration)
-
-The application deadlines are:
-- Fall semester: August 1
-- Spring semester: December 15
-- Summer semester: May 1
-
-Would you like more specific information about any of the undergraduate programs?""",
-            "graduate_response": """Excellent! For graduate admission, you'll need these additional documents:
-
-1. Bachelor's degree transcripts (evaluated by a credential evaluation service)
-2. English proficiency test scores (TOEFL: minimum 79, IELTS: minimum 6.5)
-3. Statement of Purpose
-4. Two letters of recommendation
-5. Resume/CV
-6. GRE/GMAT scores (required for some programs)
-
-The application deadlines are:
-- Fall semester: July 15
-- Spring semester: December 1
-- Summer semester: April 15
-
-Is there a specific graduate program you're interested in learning more about?"""
-        }
-    },
-    "what programs does nau offer": {
-        "answer": """North American University offers the following undergraduate and graduate degree programs:
-Undergraduate Programs:
-- Bachelor of Business Administration (BBA)
-- Bachelor of Science in Computer Science (BS)
-- Bachelor of Science in Criminal Justice (BS)
-- Bachelor of Science in Education (BS)
-Graduate Programs:
-- Master of Business Administration (MBA)
-- Master of Science in Computer Science (MS)
-- Master of Education (M.Ed.) in Curriculum and Instruction
-- Master of Education (M.Ed.) in Educational Leadership
-In addition, NAU also offers the following programs:
-Language Programs:
-- Intensive English Program (IEP)
-- English as a Second Language (ESL)
-Educator Certification Programs:
-- Teacher Certification
-- Principal Certification
-- Superintendent Certification
-Continuing Education Programs:
-- Professional Development Courses
-- Certificate Programs
-The university is committed to providing a well-rounded education that prepares students for successful careers. The degree programs are designed to develop critical thinking, problem-solving, and leadership skills.
-Let me know if you'd like more information about any specific program!""",
-        "sources": ["https://www.na.edu/academics/"],
-        "follow_up": {
-            "question": "Which program are you most interested in learning more about?",
-            "custom_response": True
-        }
-    },
-    "how to reset my password": {
-        "answer": """Okay, here are the steps to reset your password for your North American University account:
-1. Go to the password reset page at https://passwordreset.microsoftonline.com/
-2. Enter your NAU username (usually the first initial of your first name followed by your last name, e.g. jsmith@na.edu)
-3. Enter the characters shown in the image to verify you are not a robot.
-4. Select "Email" as the contact method for verification.
-5. Check your email for a verification code and enter it on the next page.
-6. Create a new password, confirm it, and click "Finish".
-7. Once your password has been successfully reset, you can sign in to your NAU account with the new password.
-A few important things to note:
-- You need to complete the reset process within 60 minutes of initiating it.
-- Make sure to update the new password on any devices or email programs you use to access your NAU account.
-- If you have any trouble with the reset process, you can contact the IT Helpdesk at support@na.edu or 832-230-5541 for assistance.
-Let me know if you have any other questions!""",
-        "sources": ["https://www.na.edu/it-services/"]
-    },
-    "how do i select the courses": {
-        "answer": """Okay, here are the steps to select and register for courses at North American University:
-1. Meet with your Academic Advisor
-- Schedule an appointment with your assigned academic advisor to discuss your degree plan and course options.
-- Your advisor can help you select the appropriate courses based on your major, prerequisites, and academic progress.
-2. Review the Course Catalog
-- Familiarize yourself with the course descriptions, prerequisites, and schedules in the university's course catalog.
-- Make a list of the courses you need to take and any electives you're interested in.
-3. Register for Courses
-- Log into your MyNAU student portal at https://portal.na.edu
-- Navigate to the "Registration" section and select "Course Search"
-- Use the filters to find available sections of the courses you need
-- Add the courses to your shopping cart and complete the registration process
-4. Finalize Your Schedule
-- Review your schedule to ensure you've registered for the correct courses and credit hours.
-- Make any necessary adjustments by adding or dropping courses during the add/drop period.
-- Confirm your final schedule and tuition charges on your student account.
-5. Attend Courses
-- Attend all scheduled class sessions and actively participate.
-- Complete all assignments, projects, and exams as required for each course.
-Let me know if you have any other questions about the course selection and registration process!""",
-        "sources": ["https://www.na.edu/academics/registration/"],
-        "follow_up": {
-            "question": "Do you need help with checking course availability for the upcoming semester?",
-            "yes_response": """To check course availability:
-
-1. Log into your MyNAU portal at https://portal.na.edu
-2. Go to the "Student" tab
-3. Click on "Course Search"
-4. Select the upcoming term from the dropdown menu
-5. You can search by:
-   - Course Number (e.g., CS 1301)
-   - Subject (e.g., Computer Science)
-   - Meeting Time (if you have specific scheduling needs)
-   - Instructor (if you prefer a specific professor)
-
-The results will show you:
-- Course name and section
-- Meeting days and times
-- Available seats
-- Instructor name
-- Room location
-
-Remember that some courses fill up quickly, so I recommend registering as soon as your registration period opens. Would you like advice on specific courses?""",
-            "no_response": """Alright! If you ever need help with course selection or have questions about specific courses, feel free to ask. 
-
-Is there anything else I can help you with regarding your studies at North American University?"""
-        }
-    },
-    "how do i access my nau portal": {
-        "answer": """Here are the steps to access the North American University (NAU) student portal:
-1. Open the school website : https://www.na.edu/
-2. Click on the NAU Portal on the top menu
-3. Enter your username and password
-Let me know if you have any other questions about accessing your NAU student portal!""",
-        "sources": ["https://www.na.edu/it-services/"],
-        "follow_up": {
-            "question": "Are you having trouble logging in to your portal?",
-            "yes_response": """If you're having trouble logging in, here are some troubleshooting steps:
-
-1. Make sure you're using the correct username format (usually firstname.lastname or first initial followed by lastname)
-2. Check that Caps Lock is not enabled when typing your password
-3. Clear your browser cache and cookies, then try again
-4. Try using a different browser (Chrome, Firefox, Edge)
-5. If you've forgotten your password, follow the "Forgot Password" link on the login page
-
-If none of these steps work, you can contact the IT Help Desk:
-- Email: support@na.edu
-- Phone: 832-230-5541
-- Hours: Monday-Friday, 8:00 AM - 5:00 PM
-
-Would you like me to explain any of these steps in more detail?""",
-            "no_response": """Great! If you ever encounter any issues with the portal, don't hesitate to ask for help. 
-
-The portal is where you'll find important information like:
-- Course registration
-- Grades and academic records
-- Financial information
-- Campus announcements
-- Access to university email
-
-Is there anything specific you're looking to do in the portal?"""
-        }
-    }
-}
+# Connection pool and timeout settings for the shared OpenAI client
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv("OPENAI_KEEPALIVE_EXPIRY", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
 
-# Exact match patterns for the predefined questions
-EXACT_MATCHES = {
-    "what are the tuition fees": ["what are the tuition fees", "tuition fees", "what are the tuition and fees", "how much is tuition"],
-    "how do i apply for admission": ["how do i apply for admission", "how do i apply", "application process", "how to apply"],
-    "what programs does nau offer": ["what programs does nau offer", "programs offered", "available degrees", "majors", "degree programs"],
-    "how to reset my password": ["how to reset my password", "reset password", "forgot password", "change password"],
-    "how do i select the courses": ["how do i select the courses", "select courses", "register for classes", "course registration"],
-    "how do i access my nau portal": ["how do i access my nau portal", "access portal", "login to portal", "student portal"]
-}
+# Per-call timeouts (seconds) for each kind of upstream request
+SEARCH_TIMEOUT = float(os.getenv("OPENAI_SEARCH_TIMEOUT", "30"))
+BACKUP_SEARCH_TIMEOUT = float(os.getenv("OPENAI_BACKUP_SEARCH_TIMEOUT", "20"))
+FALLBACK_TIMEOUT = float(os.getenv("OPENAI_FALLBACK_TIMEOUT", "15"))
+
+# Models behind the answer tiers; the primary and backup searches share the search model
+SEARCH_MODEL = "gpt-4o-search-preview"
+FALLBACK_MODEL = "gpt-4o"
+
+# Total time (seconds) an LLM-answered request may take across all fallback tiers, and how
+# long the primary search may run before the knowledge-base fallback is started alongside it
+CHAT_LATENCY_BUDGET = float(os.getenv("CHAT_LATENCY_BUDGET", "25"))
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "8"))
+
+_openai_client = None
+_openai_client_pid = None
+_openai_client_lock = threading.Lock()
+
+def get_openai_client():
+    """
+    Return the process-wide AsyncOpenAI client, creating it on first use.
+    The client keeps a pool of keep-alive connections so concurrent requests
+    share TLS sessions instead of opening a new connection per call.
+    """
+    global _openai_client, _openai_client_pid
+    if _openai_client is not None and _openai_client_pid == os.getpid():
+        return _openai_client
+
+    with _openai_client_lock:
+        if _openai_client is None or _openai_client_pid != os.getpid():
+            # Imported on first LLM use: the SDK is most of the import time on a cold start,
+            # and predefined answers never need it
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+            http_client = DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(SEARCH_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+            )
+            _openai_client = AsyncOpenAI(
+                api_key=OPENAI_API_KEY,
+                http_client=http_client,
+                max_retries=OPENAI_MAX_RETRIES
+            )
+            _openai_client_pid = os.getpid()
+            logger.info(f"Created shared OpenAI client (max_connections={OPENAI_MAX_CONNECTIONS})")
+    return _openai_client
+
+# Histogram buckets (seconds) wide enough for both local lookups and upstream calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 20, 30, 60)
+
+# Metrics exposed on /metrics, in registration order
+metrics_registry = []
+
+# Label values are quoted strings in the text format, so these characters are escaped
+LABEL_VALUE_ESCAPES = str.maketrans({"\\": "\\\\", '"': '\\"', "\n": "\\n"})
+
+def format_labels(labelnames, labels):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{str(value).translate(LABEL_VALUE_ESCAPES)}"' for name, value in zip(labelnames, labels))
+    return "{" + pairs + "}"
+
+class Counter:
+    """
+    Monotonic counter per label combination, in the Prometheus text format.
+    """
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        metrics_registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [(self.name, labels, value) for labels, value in values]
+
+class Gauge(Counter):
+    """
+    Value that goes up and down, e.g. requests in flight.
+    """
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+class Histogram:
+    """
+    Cumulative-bucket histogram per label combination. observe() is one bisect and
+    a few additions under an uncontended lock, cheap enough for the FAQ path.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+        metrics_registry.append(self)
+
+    def observe(self, value, *labels):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[slot] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(counts)) for labels, counts in self._values.items()]
+        samples = []
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", labels + (bound,), cumulative))
+            samples.append((f"{self.name}_count", labels, cumulative))
+            samples.append((f"{self.name}_sum", labels, counts[-1]))
+        return samples
+
+class CallbackMetric:
+    """
+    Metric read from existing state at scrape time; func returns (labels, value) pairs.
+    """
+
+    def __init__(self, name, help_text, kind, func, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.func = func
+        self.labelnames = labelnames
+        metrics_registry.append(self)
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self.func()]
+
+def render_metrics():
+    lines = []
+    for metric in metrics_registry:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            labelnames = metric.labelnames + ("le",) if name.endswith("_bucket") else metric.labelnames
+            lines.append(f"{name}{format_labels(labelnames, labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+STAGE_SECONDS = Histogram("nau_stage_seconds", "Time spent in each stage of answering a chat request", ("stage",))
+ANSWERS_TOTAL = Counter("nau_answers_total", "Chat answers served, by where the answer came from", ("source",))
+ROUTES_TOTAL = Counter("nau_query_routes_total", "Queries without a predefined answer, by the route the local router picked", ("route",))
+UPSTREAM_TOKENS_TOTAL = Counter("nau_upstream_tokens_total", "Tokens used by upstream LLM calls", ("model", "type"))
+UPSTREAM_IN_FLIGHT = Gauge("nau_upstream_in_flight", "Upstream LLM calls in flight", ("model",))
+CHAT_IN_FLIGHT = Gauge("nau_chat_in_flight", "Chat requests waiting on or running the LLM path", ("mode",))
+CANCELLED_REQUESTS_TOTAL = Counter("nau_cancelled_requests_total", "Chat requests whose unfinished LLM work was cancelled, by why", ("reason",))
+UPSTREAM_CANCELLED_TOTAL = Counter("nau_upstream_cancelled_total", "Upstream LLM calls cancelled before they returned", ("model",))
+UPSTREAM_SECONDS_SAVED = Counter("nau_upstream_seconds_saved_total",
+                                 "Estimated upstream seconds not spent on cancelled calls: the model's median latency minus the time already spent",
+                                 ("model",))
+
+def observe_stage(seconds, stage):
+    STAGE_SECONDS.observe(seconds, stage)
+    request_log = current_request.get()
+    if request_log is not None:
+        request_log.stages[stage] = request_log.stages.get(stage, 0.0) + seconds
+
+def count_answer(source):
+    ANSWERS_TOTAL.inc(source)
+    request_log = current_request.get()
+    if request_log is not None:
+        request_log.sources.append(source)
+
+def record_usage(model, usage):
+    if usage is None:
+        return
+    UPSTREAM_TOKENS_TOTAL.inc(model, "prompt", amount=usage.prompt_tokens or 0)
+    UPSTREAM_TOKENS_TOTAL.inc(model, "completion", amount=usage.completion_tokens or 0)
 
 # Create a minimal knowledge base as fallback
 def create_minimal_knowledge_base():
@@ -377,24 +502,44 @@ def create_minimal_knowledge_base():
     ]
     return knowledge
 
-def clean_response_format(text):
+# Emoji characters stripped from model output
+RESPONSE_EMOJIS = ['🎓', '👨‍🎓', '👩‍🎓', '📚', '📝', '🏫', '🎉', '🎊', '🎯', '✅', '✓', '☑', '✔']
+
+# Every spelling of the website mention removed from answers
+SITE_MENTIONS = [
+    f"({lead}{www}na.edu{trail})"
+    for lead in ("", " ") for www in ("", "www.") for trail in ("", " ")
+]
+
+# Markdown link [text](url); both parts may span lines
+LINK_PATTERN = re.compile(r'\[([^\]]+)\]\([^\)]+\)')
+
+def strip_markup(text):
     """
-    Clean up response text to remove markdown formatting, special characters, and unwanted website mentions.
+    Remove markdown formatting, emoji and website mentions, leaving whitespace as is.
     """
     # Remove bold/italic formatting
     cleaned_text = re.sub(r'\*\*|\*', '', text)
     
     # Replace markdown links [text](url) with just the text
-    cleaned_text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', cleaned_text)
+    cleaned_text = LINK_PATTERN.sub(r'\1', cleaned_text)
     
     # Remove markdown headers
     cleaned_text = re.sub(r'#{1,6}\s+', '', cleaned_text)
     
     # Replace emoji characters
-    cleaned_text = re.sub(r'🎓|👨‍🎓|👩‍🎓|📚|📝|🏫|🎉|🎊|🎯|✅|✓|☑|✔', '', cleaned_text)
+    cleaned_text = re.sub('|'.join(RESPONSE_EMOJIS), '', cleaned_text)
 
     # Remove unwanted mentions of (na.edu) or (www.na.edu)
     cleaned_text = re.sub(r'\( ?(www\.)?na\.edu ?\)', '', cleaned_text, flags=re.IGNORECASE)
+
+    return cleaned_text
+
+def clean_response_format(text):
+    """
+    Clean up response text to remove markdown formatting, special characters, and unwanted website mentions.
+    """
+    cleaned_text = strip_markup(text)
     
     # Remove any leftover extra spaces caused by removals
     cleaned_text = re.sub(r' +', ' ', cleaned_text)
@@ -403,102 +548,1673 @@ def clean_response_format(text):
     
     return cleaned_text
 
-# Function to find a predefined answer for a query - now using exact matches
-def get_predefined_answer(query):
-    # Clean and normalize the query
-    clean_query = re.sub(r'[^\w\s]', '', query.lower().strip())
-    
-    # Check for exact matches against our predefined patterns
-    for key, patterns in EXACT_MATCHES.items():
+# Partial markdown link at the end of a buffer: "[text", "[text]" or "[text](url"
+PARTIAL_LINK_PATTERN = re.compile(r'\[(?:[^\]]*|[^\]]+\](?:\([^\)]*)?)\Z')
+
+class StreamingCleaner:
+    """
+    Incremental version of clean_response_format for streamed model output.
+    Text that could still turn into a link, header, emoji sequence or website
+    mention is held back until the next chunk decides it, and trailing whitespace
+    waits for the text after it, so the cleaned stream matches cleaning the whole
+    answer at once. Known differences, which only affect the streamed text (the
+    final "done" answer is always cleaned in one pass): a markdown link longer than
+    MAX_LINK_HOLD or a website mention padded with markup past MAX_MENTION_HOLD is
+    sent before it closes, and so is a mention that only forms once a link or emoji
+    next to it is removed.
+    """
+
+    # Longest text held back while waiting for a markdown link or a website mention to close
+    MAX_LINK_HOLD = 500
+    MAX_MENTION_HOLD = 64
+
+    def __init__(self):
+        self._pending = ""
+        self._space = ""
+        self._started = False
+
+    def _hold_once(self, text, end):
+        """
+        Move end back past anything in text[:end] that later text could still change.
+        """
+        # Trailing whitespace and header marks depend on what follows
+        while end > 0 and (text[end - 1] == '#' or text[end - 1].isspace()):
+            end -= 1
+
+        # Partial emoji sequences (e.g. the first half of a ZWJ emoji)
+        for size in range(1, 4):
+            tail = text[max(0, end - size):end]
+            if any(emoji.startswith(tail) and emoji != tail for emoji in RESPONSE_EMOJIS):
+                end -= len(tail)
+                break
+
+        # Possible website mention such as "(www.na"
+        paren = text.rfind('(', max(0, end - self.MAX_MENTION_HOLD), end)
+        if paren != -1:
+            # Headers and emoji inside the parentheses are removed before mentions are
+            tail = strip_markup(text[paren:end]).rstrip('#').lower()
+            if any(mention.startswith(tail) for mention in SITE_MENTIONS):
+                end = paren
+
+        # Unfinished markdown link
+        prefix = text[:end]
+        bracket = prefix.find('[', max(0, end - self.MAX_LINK_HOLD))
+        while bracket != -1:
+            if PARTIAL_LINK_PATTERN.match(prefix, bracket):
+                end = bracket
+                break
+            bracket = prefix.find('[', bracket + 1)
+
+        # Never cut through a link that is already complete, or right after one whose
+        # text ends in a header mark that the following whitespace belongs to
+        for match in LINK_PATTERN.finditer(text):
+            if match.start() < end < match.end() or (match.end() == end and (match.group(1)[-1] == '#' or match.group(1)[-1].isspace())):
+                end = match.start()
+                break
+        return end
+
+    def _hold_index(self, text):
+        """
+        Index where the undecided tail of text begins.
+        """
+        end = len(text)
+        while True:
+            held = self._hold_once(text, end)
+            if held == end:
+                return end
+            end = held
+
+    def _emit(self, text, final=False):
+        # Whitespace held from the previous chunk joins this one before collapsing
+        cleaned_text = self._space + strip_markup(text)
+        cleaned_text = re.sub(r' +', ' ', cleaned_text)
+        cleaned_text = re.sub(r'\n +', '\n', cleaned_text)
+        if not self._started:
+            cleaned_text = cleaned_text.lstrip()
+
+        # Trailing whitespace waits for more text; the end of the answer drops it
+        body = cleaned_text.rstrip()
+        self._space = "" if final else cleaned_text[len(body):]
+        if body:
+            self._started = True
+        return body
+
+    def feed(self, chunk):
+        """
+        Add a chunk of raw model output and return the cleaned text that is safe to send.
+        """
+        # Asterisks are removed wherever they appear, so drop them before holding
+        self._pending += chunk.replace('*', '')
+        cut = self._hold_index(self._pending)
+        ready, self._pending = self._pending[:cut], self._pending[cut:]
+        return self._emit(ready) if ready else ""
+
+    def flush(self):
+        """
+        Return whatever is still held back once the stream has ended.
+        """
+        ready, self._pending = self._pending, ""
+        return self._emit(ready, final=True)
+
+def tokenize_query(query):
+    # Lowercase, drop punctuation and split into words
+    return re.sub(r'[^\w\s]', '', query.lower()).split()
+
+class IntentMatcher:
+    """
+    Token-level Aho-Corasick automaton over the predefined phrasings.
+    Built once at startup; a single pass over the query's words finds every phrase
+    that occurs on word boundaries, so lookup cost does not grow with the number of patterns.
+    """
+
+    def __init__(self, phrases):
+        """
+        phrases: iterable of (pattern, key, priority); lower priority wins.
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self.size = 0
+
+        for pattern, key, priority in phrases:
+            node = 0
+            for word in tokenize_query(pattern):
+                next_node = self._goto[node].get(word)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][word] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                node = next_node
+            if node:
+                self._output[node].append((priority, key, pattern))
+                self.size += 1
+
+        # Breadth-first pass to set failure links and inherit their outputs
+        queue = list(self._goto[0].values())
+        for node in queue:
+            for word, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(word, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find_all(self, query):
+        """
+        Every (priority, key, pattern) found in the query, best priority first.
+        """
+        goto = self._goto
+        fail = self._fail
+        node = 0
+        matches = []
+        for word in tokenize_query(query):
+            while node and word not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(word, 0)
+            if self._output[node]:
+                matches.extend(self._output[node])
+        matches.sort()
+        return matches
+
+def build_intent_matcher(exact_matches, password_keywords=(), password_answer=None):
+    phrases = []
+    for priority, (key, patterns) in enumerate(exact_matches.items()):
         for pattern in patterns:
-            # Check for exact match or if the query contains the pattern exactly as a phrase
-            if clean_query == pattern or pattern in clean_query:
-                logger.info(f"Found predefined answer for '{pattern}'")
-                return predefined_answers[key]
-    
-    # Check for password reset related queries with special priority
-    if any(word in clean_query for word in ["password", "reset", "forgot", "change password", "cant login"]):
-        logger.info("Found password reset related query")
-        return predefined_answers["how to reset my password"]
-    
-    # No exact match found
-    return None
+            phrases.append((pattern, key, priority))
+
+    # Password keywords rank after every exact phrase
+    for keyword in password_keywords:
+        phrases.append((keyword, password_answer, len(exact_matches)))
+    return IntentMatcher(phrases)
+
+# Fuzzy intent scoring for queries no exact phrase matches: lowest cosine similarity to a
+# predefined phrasing that still counts as that intent, and the number of hashed features
+FUZZY_INTENT_THRESHOLD = float(os.getenv("FUZZY_INTENT_THRESHOLD", "0.65"))
+FUZZY_INTENT_DIMENSIONS = int(os.getenv("FUZZY_INTENT_DIMENSIONS", "2048"))
+
+# A fuzzy match also needs this many of the query's content words (fewer when the query
+# has fewer) to be close to a word of the phrasing, so one shared word like "admission"
+# or "major" isn't enough; words are close at this trigram similarity, which covers
+# one dropped or swapped letter
+FUZZY_INTENT_MIN_WORDS = int(os.getenv("FUZZY_INTENT_MIN_WORDS", "2"))
+FUZZY_WORD_SIMILARITY = 0.4
+
+class FuzzyIntentScorer:
+    """
+    Every predefined phrasing as a row of one NumPy matrix of hashed character trigrams
+    of its content words, so misspelled or reworded questions still find their predefined
+    answer. Only trigrams are used: whole-word features would let a typo cost a full word.
+    The matrix is stored transposed: scoring a query gathers the rows of its few features
+    and takes one vector-matrix product, giving its cosine similarity to every phrasing.
+    Phrasings above the threshold then have to share FUZZY_INTENT_MIN_WORDS words with
+    the query, since trigrams of a single long word can carry the whole score.
+    """
+
+    def __init__(self, phrases, dimensions=FUZZY_INTENT_DIMENSIONS):
+        """
+        phrases: iterable of (pattern, key, priority), as for IntentMatcher.
+        """
+        import numpy as np
+
+        self.dimensions = dimensions
+        self.keys = []
+        self.patterns = []
+        self.pattern_trigrams = []
+        rows = []
+        for pattern, key, _ in phrases:
+            features = self._features(pattern)
+            if features:
+                self.keys.append(key)
+                self.patterns.append(pattern)
+                self.pattern_trigrams.append([word_trigrams(term) for term in content_terms(pattern)])
+                rows.append(features)
+
+        self.matrix = np.zeros((dimensions, len(rows)), dtype=np.float32)
+        for row, features in enumerate(rows):
+            for column, weight in features.items():
+                self.matrix[column, row] = weight
+        self.size = len(rows)
+
+    def _features(self, text):
+        """
+        Unit-length {hashed feature: weight} for a text; empty when it has no content words.
+        """
+        features = {}
+        for term in content_terms(text):
+            padded = f" {term} "
+            for i in range(len(padded) - 2):
+                # crc32 rather than hash() so collisions are the same in every process
+                column = zlib.crc32(padded[i:i + 3].encode("utf-8")) % self.dimensions
+                features[column] = features.get(column, 0.0) + 1.0
+
+        norm = sum(weight * weight for weight in features.values()) ** 0.5
+        return {column: weight / norm for column, weight in features.items()} if norm else {}
+
+    def scores(self, query):
+        """
+        Cosine similarity of the query to every phrasing, or None when it has no content words.
+        """
+        import numpy as np
+
+        features = self._features(query)
+        if not features or not self.size:
+            return None
+        columns = np.fromiter(features.keys(), dtype=np.intp, count=len(features))
+        weights = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+        return weights @ self.matrix[columns]
+
+    def best(self, query, threshold=FUZZY_INTENT_THRESHOLD):
+        """
+        (score, key, pattern) of the closest phrasing at or above the threshold, else None.
+        """
+        import numpy as np
+
+        scores = self.scores(query)
+        if scores is None:
+            return None
+        candidates = np.flatnonzero(scores >= threshold)
+        if not len(candidates):
+            return None
+
+        terms = [word_trigrams(term) for term in content_terms(query)]
+        required = min(FUZZY_INTENT_MIN_WORDS, len(terms))
+        for row in candidates[np.argsort(-scores[candidates], kind="stable")]:
+            if self.shared_words(terms, self.pattern_trigrams[row]) >= required:
+                return float(scores[row]), self.keys[row], self.patterns[row]
+        return None
+
+    @staticmethod
+    def shared_words(terms, pattern_terms):
+        """
+        How many query words (as trigram sets) are close to some word of the phrasing.
+        """
+        return sum(1 for term in terms
+                   if any(len(term & other) >= FUZZY_WORD_SIMILARITY * (len(term) * len(other)) ** 0.5
+                          for other in pattern_terms))
+
+def word_trigrams(term):
+    padded = f" {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def build_fuzzy_intent_scorer(exact_matches, dimensions=FUZZY_INTENT_DIMENSIONS):
+    phrases = []
+    for priority, (key, patterns) in enumerate(exact_matches.items()):
+        for pattern in patterns:
+            phrases.append((pattern, key, priority))
+    return FuzzyIntentScorer(phrases, dimensions)
+
+class PrecomputedResponse:
+    """
+    A chat response whose JSON body and gzip variant are built once.
+    Serving it is a lookup plus a write, with no cleaning or serialization per request.
+    Answers are POST responses, which browsers and proxies never revalidate, so they
+    carry no ETag.
+    """
+    __slots__ = ("payload", "body", "gzip_body")
+
+    def __init__(self, payload, body=None, compress=True):
+        self.payload = payload
+        self.body = body if body is not None else json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0) if compress else None
+
+    def with_fields(self, fields):
+        """
+        Copy with per-request fields appended to the prebuilt JSON body.
+        The result varies per request, so it has no prebuilt gzip variant.
+        """
+        extra = json.dumps(fields, separators=(",", ":")).encode("utf-8")
+        body = self.body[:-1] + b"," + extra[1:]
+        return PrecomputedResponse(dict(self.payload, **fields), body, compress=False)
+
+# Cleaned, serialized responses for static answer texts outside the FAQ bundle, keyed by (raw text, sources)
+precomputed_responses = {}
+
+def precompute_answer(text, sources, follow_up_question=None):
+    key = (text, tuple(sources))
+    if key not in precomputed_responses:
+        payload = {
+            "answer": clean_response_format(text),
+            "sources": list(sources)
+        }
+        if follow_up_question:
+            payload["follow_up"] = follow_up_question
+        precomputed_responses[key] = PrecomputedResponse(payload)
+    return precomputed_responses[key]
+
+def get_precomputed_answer(text, sources):
+    """
+    Prebuilt response for a static answer text from the FAQ bundle or precompute_answer,
+    built on the fly if it isn't registered.
+    """
+    key = (text, tuple(sources))
+    response = faq_bundle.responses.get(key) or precomputed_responses.get(key)
+    if response is None:
+        response = PrecomputedResponse({"answer": clean_response_format(text), "sources": list(sources)})
+    return response
+
+# Predefined answers, their phrasings and the follow-up texts, as a versioned JSON bundle.
+# It is compiled when loaded and polled for changes every FAQ_BUNDLE_POLL_INTERVAL seconds
+# (0 turns the watcher off); a changed bundle that passes validation replaces the running one
+FAQ_BUNDLE_PATH = os.getenv("FAQ_BUNDLE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "faq_bundle.json"))
+FAQ_BUNDLE_POLL_INTERVAL = float(os.getenv("FAQ_BUNDLE_POLL_INTERVAL", "5"))
+
+# Bundle layout this code understands; bump it with incompatible layout changes
+FAQ_BUNDLE_FORMAT = 1
+
+# Pairs of texts a follow-up must have for process_follow_up_response to choose between,
+# unless it is a custom_response follow-up
+FOLLOW_UP_RESPONSE_PAIRS = (("yes_response", "no_response"), ("undergraduate_response", "graduate_response"))
+
+class FaqBundleError(ValueError):
+    pass
+
+def validate_faq_bundle(data):
+    """
+    Raise FaqBundleError describing the first problem that would break the predefined path.
+    """
+    def require(condition, message):
+        if not condition:
+            raise FaqBundleError(message)
+
+    def is_text(value):
+        return isinstance(value, str) and value.strip() != ""
+
+    require(isinstance(data, dict), "bundle must be a JSON object")
+    require(data.get("format") == FAQ_BUNDLE_FORMAT, f"format is {data.get('format')!r}, expected {FAQ_BUNDLE_FORMAT}")
+    require(is_text(data.get("version")), "version must be a non-empty string")
+
+    answers = data.get("answers")
+    require(isinstance(answers, dict) and answers, "answers must be a non-empty object")
+    for key, entry in answers.items():
+        require(isinstance(entry, dict), f"answers[{key!r}] must be an object")
+        require(is_text(entry.get("answer")), f"answers[{key!r}].answer must be a non-empty string")
+        sources = entry.get("sources")
+        require(isinstance(sources, list) and sources and all(is_text(source) for source in sources),
+                f"answers[{key!r}].sources must be a non-empty list of URLs")
+        follow_up = entry.get("follow_up")
+        if follow_up is None:
+            continue
+        require(isinstance(follow_up, dict) and is_text(follow_up.get("question")),
+                f"answers[{key!r}].follow_up must be an object with a question")
+        require(follow_up.get("custom_response") is True
+                or any(all(is_text(follow_up.get(name)) for name in pair) for pair in FOLLOW_UP_RESPONSE_PAIRS),
+                f"answers[{key!r}].follow_up needs yes/no or undergraduate/graduate responses, or custom_response")
+
+    exact_matches = data.get("exact_matches")
+    require(isinstance(exact_matches, dict), "exact_matches must be an object")
+    for key, patterns in exact_matches.items():
+        require(key in answers, f"exact_matches[{key!r}] has no entry in answers")
+        require(isinstance(patterns, list) and patterns and all(isinstance(pattern, str) and tokenize_query(pattern) for pattern in patterns),
+                f"exact_matches[{key!r}] must be a non-empty list of phrasings")
+    unreachable = [key for key in answers if key not in exact_matches]
+    require(not unreachable, f"answers without phrasings in exact_matches: {unreachable}")
+
+    keywords = data.get("password_keywords")
+    require(isinstance(keywords, list) and all(isinstance(keyword, str) and tokenize_query(keyword) for keyword in keywords),
+            "password_keywords must be a list of phrasings")
+    require(data.get("password_answer") in answers, "password_answer must be a key of answers")
+
+    descriptions = data.get("program_descriptions")
+    require(isinstance(descriptions, dict) and all(is_text(name) and is_text(text) for name, text in descriptions.items()),
+            "program_descriptions must map program names to descriptions")
+    for name in ("general_program_response", "default_follow_up_response"):
+        require(is_text(data.get(name)), f"{name} must be a non-empty string")
+
+class FaqBundle:
+    """
+    A validated bundle compiled for the hot path: the intent matcher and every text the
+    predefined path can answer with, already cleaned and serialized. It is never changed
+    once built. A reload compiles a new bundle and swaps the faq_bundle reference, so a
+    request that already looked up an answer finishes with the bundle it started with.
+    """
+
+    def __init__(self, data, digest):
+        self.version = data["version"]
+        self.digest = digest
+        self.answers = data["answers"]
+        self.exact_matches = data["exact_matches"]
+        self.password_keywords = data["password_keywords"]
+        self.password_answer = data["password_answer"]
+        self.program_descriptions = data["program_descriptions"]
+        self.general_program_response = data["general_program_response"]
+        self.default_follow_up_response = data["default_follow_up_response"]
+        self.matcher = build_intent_matcher(self.exact_matches, self.password_keywords, self.password_answer)
+        self.responses = {}
+        self._fuzzy_scorer = None
+        self._fuzzy_scorer_lock = threading.Lock()
+
+        for entry in self.answers.values():
+            sources = entry["sources"]
+            follow_up = entry.get("follow_up")
+            self._precompute(entry["answer"], sources, follow_up["question"] if follow_up else None)
+            if not follow_up:
+                continue
+
+            # Every text process_follow_up_response can return for this entry
+            follow_up_texts = [value for name, value in follow_up.items() if name.endswith("_response") and isinstance(value, str)]
+            if follow_up.get("custom_response"):
+                follow_up_texts += list(self.program_descriptions.values()) + [self.general_program_response]
+            follow_up_texts.append(self.default_follow_up_response)
+            for text in follow_up_texts:
+                self._precompute(text, sources)
+
+    def _precompute(self, text, sources, follow_up_question=None):
+        key = (text, tuple(sources))
+        if key not in self.responses:
+            payload = {
+                "answer": clean_response_format(text),
+                "sources": list(sources)
+            }
+            if follow_up_question:
+                payload["follow_up"] = follow_up_question
+            self.responses[key] = PrecomputedResponse(payload)
+
+    def fuzzy_scorer(self):
+        """
+        Built on the first exact-match miss, so answering FAQs never imports NumPy.
+        """
+        if self._fuzzy_scorer is None:
+            with self._fuzzy_scorer_lock:
+                if self._fuzzy_scorer is None:
+                    self._fuzzy_scorer = build_fuzzy_intent_scorer(self.exact_matches)
+        return self._fuzzy_scorer
+
+def load_faq_bundle(path=FAQ_BUNDLE_PATH):
+    """
+    Read, validate and compile a bundle; raises FaqBundleError if it is malformed.
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        raise FaqBundleError(f"not valid JSON: {e}")
+    validate_faq_bundle(data)
+    return FaqBundle(data, hashlib.sha256(raw).hexdigest()[:16])
+
+# Without a valid bundle there is nothing to answer FAQs with, so a bad one fails startup
+faq_bundle = load_faq_bundle()
+
+class FaqBundleWatcher:
+    """
+    Polls the bundle file and swaps in a freshly compiled bundle when it changes.
+    Loading and compiling run on the watcher thread, off the request path. A bundle
+    that fails validation is logged and counted, and the running one stays in place.
+    Replace the file by renaming a complete copy over it, so a poll never reads half a file.
+    """
+
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+        self.applied = 0
+        self.rejected = 0
+        self._signature = self._stat()
+        self._stop = threading.Event()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def check(self):
+        """
+        Reload if the file changed since the last check; True when a new bundle was swapped in.
+        """
+        global faq_bundle
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+
+        try:
+            bundle = load_faq_bundle(self.path)
+        except (OSError, FaqBundleError) as e:
+            self.rejected += 1
+            logger.error(f"Rejected FAQ bundle {self.path}: {e}; still serving version {faq_bundle.version}")
+            return False
+        if bundle.digest == faq_bundle.digest:
+            return False
+        # Build the new scorer here if the running one is in use, so the first miss after
+        # the swap doesn't build it on the request path
+        if faq_bundle._fuzzy_scorer is not None:
+            bundle.fuzzy_scorer()
+
+        previous, faq_bundle = faq_bundle, bundle
+        self.applied += 1
+        logger.info(f"FAQ bundle version {bundle.version} replaced version {previous.version}")
+        return True
+
+    def _run(self, stop):
+        while not stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"FAQ bundle check failed: {e}")
+
+    def start(self):
+        """
+        Start the polling thread. Forked workers call this again, since the parent's
+        thread doesn't survive the fork.
+        """
+        if self.interval <= 0:
+            return
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, args=(self._stop,), name="faq-bundle-watcher", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+faq_bundle_watcher = FaqBundleWatcher(FAQ_BUNDLE_PATH, FAQ_BUNDLE_POLL_INTERVAL)
+faq_bundle_watcher.start()
+os.register_at_fork(after_in_child=faq_bundle_watcher.start)
+
+def find_intents(query):
+    """
+    Keys of every predefined answer the query matches, in priority order.
+    """
+    return list(dict.fromkeys(key for _, key, _ in faq_bundle.matcher.find_all(query)))
+
+# Function to find a predefined answer for a query - exact phrasings first, then the closest one
+def get_predefined_answer(query):
+    bundle = faq_bundle
+    matches = bundle.matcher.find_all(query)
+    if not matches:
+        # No exact match: try the closest phrasing
+        if FUZZY_INTENT_THRESHOLD > 1:
+            return None
+        match = bundle.fuzzy_scorer().best(query)
+        if match is None:
+            return None
+        score, key, pattern = match
+        logger.debug(f"Found predefined answer for '{pattern}' by fuzzy match ({score:.2f})")
+        return bundle.answers[key]
+
+    priority, key, pattern = matches[0]
+    if priority == len(bundle.exact_matches):
+        logger.debug("Found password reset related query")
+    else:
+        logger.debug(f"Found predefined answer for '{pattern}'")
+    return bundle.answers[key]
 
 # Process a response based on a follow-up answer
 def process_follow_up_response(follow_up, user_response):
+    bundle = faq_bundle
     user_response = user_response.lower().strip()
     
     # Check if this is a yes/no question
     if "yes_response" in follow_up and "no_response" in follow_up:
         if any(word in user_response for word in ["yes", "yeah", "yep", "sure", "definitely", "absolutely"]):
-            logger.info("Responding with 'yes' response to follow-up")
+            logger.debug("Responding with 'yes' response to follow-up")
             return follow_up["yes_response"]
         elif any(word in user_response for word in ["no", "nope", "not", "don't", "dont"]):
-            logger.info("Responding with 'no' response to follow-up")
+            logger.debug("Responding with 'no' response to follow-up")
             return follow_up["no_response"]
     
     # Check if this is an undergraduate/graduate question
     elif "undergraduate_response" in follow_up and "graduate_response" in follow_up:
         if any(word in user_response for word in ["undergraduate", "bachelor", "bachelors", "bs", "ba"]):
-            logger.info("Responding with undergraduate information")
+            logger.debug("Responding with undergraduate information")
             return follow_up["undergraduate_response"]
         elif any(word in user_response for word in ["graduate", "master", "masters", "mba", "ms", "phd"]):
-            logger.info("Responding with graduate information")
+            logger.debug("Responding with graduate information")
             return follow_up["graduate_response"]
     
     # For custom responses that require more specific handling
     elif "custom_response" in follow_up and follow_up["custom_response"]:
-        logger.info("Processing custom response for program information")
+        logger.debug("Processing custom response for program information")
         # For the "Which program are you most interested in?" question
-        programs = {
-            "business": "The Bachelor of Business Administration (BBA) program at NAU offers concentrations in Accounting, Finance, International Business, and Management. Students learn key business principles and develop leadership skills. The BBA requires 120 credit hours including general education courses, business core courses, and concentration courses.",
-            "computer science": "The Computer Science program at NAU offers a comprehensive curriculum covering programming, algorithms, database management, and software engineering. Students can specialize in areas like AI, cybersecurity, or data science. The program prepares graduates for careers as software developers, systems analysts, and IT consultants.",
-            "education": "The Education program at NAU prepares students for careers in teaching and educational administration. The program offers specializations in Early Childhood Education, Bilingual Education, and Educational Leadership. Students complete coursework and supervised teaching experiences to prepare for teacher certification.",
-            "criminal justice": "The Criminal Justice program at NAU covers law enforcement, corrections, and legal systems. Students learn about criminal behavior, constitutional law, and public policy. The program prepares graduates for careers in law enforcement, corrections, homeland security, and legal services."
-        }
-        
-        for prog_key, prog_desc in programs.items():
+        for prog_key, prog_desc in bundle.program_descriptions.items():
             if prog_key in user_response:
-                logger.info(f"Providing information about the {prog_key} program")
+                logger.debug(f"Providing information about the {prog_key} program")
                 return prog_desc
         
         # If no specific program matched, give a general response
-        logger.info("No specific program matched, giving general response")
-        return "Each program at NAU is designed to provide a strong educational foundation and practical skills. I'd be happy to provide more specific information about any program that interests you. Just let me know which one you'd like to learn more about."
+        logger.debug("No specific program matched, giving general response")
+        return bundle.general_program_response
     
     # Default general response if we can't determine what the user meant
-    logger.info("Using default follow-up response")
-    return "I'm sorry, I'm not sure how to help with that specific request. Is there something else about North American University that I can assist you with?"
+    logger.debug("Using default follow-up response")
+    return bundle.default_follow_up_response
 
-# Function to use OpenAI's web search API
-async def search_web_with_openai(query):
-    try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        # Use the appropriate web search model
-        logger.info("Using OpenAI web search...")
-        
-        # Location info for a U.S. based query - adjust if needed
-        user_location = {
-            "type": "approximate",
-            "approximate": {
-                "country": "US",
-                "city": "Stafford",
-                "region": "Texas"
+# How long (seconds) a follow-up question stays answerable, and how many open follow-ups are kept
+FOLLOW_UP_TTL = float(os.getenv("FOLLOW_UP_TTL", "1800"))
+FOLLOW_UP_MAX_SESSIONS = int(os.getenv("FOLLOW_UP_MAX_SESSIONS", "100000"))
+
+class FollowUpState:
+    """
+    Context needed to answer one follow-up: the predefined follow-up definition
+    (shared, not copied) and the sources of the answer that asked it.
+    """
+    __slots__ = ("follow_up", "sources", "expires_at")
+
+    def __init__(self, follow_up, sources, expires_at):
+        self.follow_up = follow_up
+        self.sources = sources
+        self.expires_at = expires_at
+
+class FollowUpStore:
+    """
+    Open follow-up questions keyed by a random follow_up_id.
+    The TTL is the same for every record, so insertion order is expiry order:
+    expired records and, past max_sessions, the oldest ones are dropped from the
+    front of the OrderedDict, which keeps both lookups and eviction O(1).
+    """
+
+    def __init__(self, ttl=FOLLOW_UP_TTL, max_sessions=FOLLOW_UP_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self.resolved = 0
+        self.missed = 0
+
+    def create(self, predefined):
+        follow_up_id = f"followup_{secrets.token_urlsafe(12)}"
+        now = time.time()
+        state = FollowUpState(predefined["follow_up"], predefined.get("sources", ["https://www.na.edu"]), now + self.ttl)
+        with self._lock:
+            while self._states:
+                oldest = next(iter(self._states.values()))
+                if oldest.expires_at > now and len(self._states) < self.max_sessions:
+                    break
+                self._states.popitem(last=False)
+            self._states[follow_up_id] = state
+        return follow_up_id
+
+    def resolve(self, follow_up_id):
+        with self._lock:
+            state = self._states.get(follow_up_id)
+            if state is None or state.expires_at <= time.time():
+                self.missed += 1
+                return None
+            self.resolved += 1
+            return state
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._states), "resolved": self.resolved, "missed": self.missed}
+
+follow_up_store = FollowUpStore()
+
+# Answer cache settings for web search results
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.8"))
+# How long past expiry a popular question's answer may still be served while it is refreshed
+ANSWER_STALE_TTL = float(os.getenv("ANSWER_STALE_TTL", "86400"))
+
+# Words that carry no meaning for matching similar questions
+QUERY_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did", "i", "me", "my", "we", "our",
+    "you", "your", "it", "its", "of", "to", "for", "in", "on", "at", "by", "and", "or", "can", "could",
+    "would", "should", "will", "please", "tell", "about", "there", "this", "that", "nau", "north",
+    "american", "university"
+}
+
+# Interrogatives stay in cache keys, since "where is the library" and "when is the library
+# open" are different questions; contractions fold into the plain word
+QUESTION_WORDS = {
+    "what": "what", "whats": "what", "when": "when", "whens": "when", "where": "where", "wheres": "where",
+    "how": "how", "hows": "how", "which": "which", "who": "who", "whos": "who", "whom": "who", "why": "why"
+}
+
+def normalize_query(query):
+    """
+    Reduce a query to its meaningful words so different phrasings share a cache key.
+    """
+    words = re.sub(r'[^\w\s]', '', query.lower()).split()
+    terms = []
+    for word in words:
+        if word in QUERY_STOPWORDS:
+            continue
+        if word in QUESTION_WORDS:
+            terms.append(QUESTION_WORDS[word])
+            continue
+        # Light stemming so "deadlines" and "deadline" compare equal
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word)
+    return " ".join(terms)
+
+def content_terms(query):
+    """
+    The normalized words of a query without its interrogatives, for retrieval and scoring.
+    """
+    return [term for term in normalize_query(query).split() if term not in QUESTION_WORDS]
+
+def question_words(normalized_query):
+    return {term for term in normalized_query.split() if term in QUESTION_WORDS}
+
+def query_vector(normalized_query):
+    """
+    Build a unit-length sparse vector of word and character trigram features.
+    Trigrams let small typos and word variants still score as similar.
+    """
+    vector = {}
+    for term in normalized_query.split():
+        vector["w:" + term] = vector.get("w:" + term, 0.0) + 1.0
+        # Scale trigrams per word so long words don't outweigh short ones
+        padded = f" {term} "
+        gram_weight = 0.5 / (len(padded) - 2) ** 0.5
+        for i in range(len(padded) - 2):
+            gram = "c:" + padded[i:i + 3]
+            vector[gram] = vector.get(gram, 0.0) + gram_weight
+
+    norm = sum(weight * weight for weight in vector.values()) ** 0.5
+    if norm:
+        for feature in vector:
+            vector[feature] /= norm
+    return vector
+
+def similarity_vector(normalized_query):
+    """
+    query_vector of the content words only. Interrogatives are compared separately, so
+    "when is fall deadline" and "fall application deadline?" still score as near-duplicates.
+    """
+    return query_vector(" ".join(term for term in normalized_query.split() if term not in QUESTION_WORDS))
+
+def cosine_similarity(vector_a, vector_b):
+    if len(vector_a) > len(vector_b):
+        vector_a, vector_b = vector_b, vector_a
+    return sum(weight * vector_b.get(feature, 0.0) for feature, weight in vector_a.items())
+
+class AnswerCache:
+    """
+    In-memory LRU cache of cleaned answers with a TTL.
+    Lookups first try the normalized query exactly, then the most similar cached
+    question that shares at least one word and scores above the similarity threshold.
+    Callers may accept an expired exact match for up to ANSWER_STALE_TTL.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl=ANSWER_CACHE_TTL,
+                 similarity_threshold=ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()
+        self._word_index = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for word in entry["words"]:
+            keys = self._word_index.get(word)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._word_index[word]
+
+    def get(self, query):
+        entry = self.get_entry(query)
+        return entry["result"] if entry else None
+
+    def get_entry(self, query, allow_stale=False):
+        """
+        The matching entry (query, result, expires_at), or None.
+        With allow_stale an expired exact match within the stale window is returned too.
+        """
+        key = normalize_query(query)
+        if not key:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] <= now:
+                # Expired answers are kept through the stale window for callers that accept them
+                if entry["expires_at"] + ANSWER_STALE_TTL <= now:
+                    self._remove(key)
+                    entry = None
+                elif not allow_stale:
+                    entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            # Look for a near-duplicate question among entries sharing a word and not asking
+            # a different kind of question
+            vector = similarity_vector(key)
+            asks = question_words(key)
+            candidates = set()
+            for word in key.split():
+                candidates.update(self._word_index.get(word, ()))
+
+            best_key, best_score = None, self.similarity_threshold
+            for candidate in candidates:
+                candidate_entry = self._entries[candidate]
+                if candidate_entry["expires_at"] <= now:
+                    continue
+                # A question without interrogatives ("fall deadline") fits either kind
+                candidate_asks = question_words(candidate)
+                if asks and candidate_asks and candidate_asks != asks:
+                    continue
+                score = cosine_similarity(vector, candidate_entry["vector"])
+                if score >= best_score:
+                    best_key, best_score = candidate, score
+
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            self.semantic_hits += 1
+            logger.info(f"Answer cache matched '{key}' to '{best_key}' (similarity {best_score:.2f})")
+            return self._entries[best_key]
+
+    def set(self, query, result):
+        key = normalize_query(query)
+        if not key:
+            return
+
+        words = set(key.split())
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {
+                "query": query,
+                "result": result,
+                "vector": similarity_vector(key),
+                "words": words,
+                "expires_at": time.time() + self.ttl
             }
+            for word in words:
+                self._word_index.setdefault(word, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def peek(self, key):
+        """
+        The entry stored under a normalized key, expired or not, without counting a lookup.
+        """
+        with self._lock:
+            return self._entries.get(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+answer_cache = AnswerCache()
+
+# Persistent answer store shared by every worker process on the host ("" disables it).
+# The default lives in the temp directory, the one writable location on Vercel, inside a
+# directory private to the current user so other local users can't plant answers in it
+ANSWER_STORE_DEFAULT_PATH = os.path.join(
+    tempfile.gettempdir(), f"nau-assistant-{os.getuid() if hasattr(os, 'getuid') else 'user'}", "answers.sqlite3")
+ANSWER_STORE_PATH = os.getenv("ANSWER_STORE_PATH", ANSWER_STORE_DEFAULT_PATH)
+ANSWER_STORE_TTL = float(os.getenv("ANSWER_STORE_TTL", "86400"))
+ANSWER_STORE_MAX_ENTRIES = int(os.getenv("ANSWER_STORE_MAX_ENTRIES", "50000"))
+# Expired and excess rows are pruned once every this many writes
+ANSWER_STORE_PRUNE_EVERY = int(os.getenv("ANSWER_STORE_PRUNE_EVERY", "100"))
+# Writes waiting for the writer thread; further writes are dropped until it catches up
+ANSWER_STORE_QUEUE_SIZE = int(os.getenv("ANSWER_STORE_QUEUE_SIZE", "1000"))
+
+class AnswerStore:
+    """
+    SQLite-backed answer store, the second cache level behind AnswerCache.
+    WAL mode lets any number of processes read while one writes, so a fleet of
+    workers shares one warm cache that survives restarts. Keys are normalized
+    queries; reads are a single primary-key lookup and never write. Entries expire
+    after the TTL and the soonest-expiring rows are evicted beyond max_entries.
+    Writes and pruning happen on a writer thread per process, so a locked database
+    never holds up a request; writes still queued when the process exits are lost.
+    A store error is logged and treated as a miss, it never fails a chat request.
+    """
+
+    def __init__(self, path, ttl=ANSWER_STORE_TTL, max_entries=ANSWER_STORE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = None
+        self._writer_pid = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.dropped = 0
+
+    def _connection(self):
+        # One connection per thread and process; a connection never crosses a fork
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+
+        connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, answer TEXT NOT NULL, sources TEXT NOT NULL, "
+            "created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS answers_expires_at ON answers (expires_at)")
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    def get(self, query):
+        """
+        Blocking lookup; async callers run it off the event loop (see stored_answer).
+        """
+        key = normalize_query(query)
+        if not key:
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT answer, sources FROM answers WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Answer store read failed: {str(e)}")
+            return None
+
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {"answer": row[0], "sources": json.loads(row[1])}
+
+    def set(self, query, result):
+        """
+        Queue the answer for the writer thread and return straight away.
+        """
+        key = normalize_query(query)
+        if not key:
+            return
+        if self._writer_pid != os.getpid():
+            self._start_writer()
+        if self._pending.qsize() >= ANSWER_STORE_QUEUE_SIZE:
+            self.dropped += 1
+            return
+        self._pending.put_nowait((key, result["answer"], json.dumps(result["sources"])))
+
+    def _start_writer(self):
+        # Started on the first write in each process, since a parent's thread doesn't survive a fork
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._pending = queue.SimpleQueue()
+            self._writer_pid = os.getpid()
+            threading.Thread(target=self._write_loop, args=(self._pending,), name="answer-store-writer",
+                             daemon=True).start()
+
+    def _write_loop(self, pending):
+        while True:
+            self._write(*pending.get())
+
+    def _write(self, key, answer, sources):
+        now = time.time()
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, sources, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, answer, sources, now, now + self.ttl)
+            )
+            self._writes += 1
+            if self._writes % ANSWER_STORE_PRUNE_EVERY == 0:
+                self.prune(connection)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Answer store write failed: {str(e)}")
+
+    def prune(self, connection=None):
+        connection = connection or self._connection()
+        connection.execute("DELETE FROM answers WHERE expires_at <= ?", (time.time(),))
+        connection.execute(
+            "DELETE FROM answers WHERE key IN ("
+            "SELECT key FROM answers ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "errors": self.errors, "dropped": self.dropped}
+
+def open_answer_store(path):
+    """
+    AnswerStore at path, or None when the file can't be trusted: the default directory
+    must be private to this user, and the database must be a regular file this user
+    owns. A new database is created readable by this user only.
+    """
+    try:
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0), 0o600)
+        try:
+            stat = os.fstat(fd)
+        finally:
+            os.close(fd)
+        problems = []
+        if hasattr(os, "getuid"):
+            if stat.st_uid != os.getuid():
+                problems.append("is owned by another user")
+            if path == ANSWER_STORE_DEFAULT_PATH:
+                directory_stat = os.lstat(directory)
+                if directory_stat.st_uid != os.getuid() or directory_stat.st_mode & 0o077:
+                    problems.append(f"is in {directory}, which is not private to this user")
+        if problems:
+            logger.error(f"Not using answer store {path}: it {' and '.join(problems)}")
+            return None
+    except OSError as e:
+        logger.error(f"Not using answer store {path}: {e}")
+        return None
+    return AnswerStore(path)
+
+answer_store = open_answer_store(ANSWER_STORE_PATH) if ANSWER_STORE_PATH else None
+
+# Second level lookup for queries with no local answer: answers other workers or earlier
+# processes already paid for. It runs on a worker thread so SQLite never blocks the event loop.
+async def stored_answer(query):
+    if answer_store is None:
+        return None
+    started = time.perf_counter()
+    stored = await asyncio.to_thread(answer_store.get, query)
+    observe_stage(time.perf_counter() - started, "answer_store")
+    if stored:
+        logger.debug("Using stored answer")
+        answer_cache.set(query, stored)
+        count_answer("answer_store")
+    return stored
+
+# Keep a fresh LLM answer in both cache levels
+def remember_answer(query, result):
+    answer_cache.set(query, result)
+    if answer_store is not None:
+        answer_store.set(query, result)
+
+# Local retrieval index over the knowledge base
+KB_DATA_DIR = os.getenv("KB_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+KB_INDEX_DIR = os.path.join(KB_DATA_DIR, "kb_index")
+KB_CORPUS_DIR = os.path.join(KB_DATA_DIR, "corpus")
+
+# Confidence needed to answer straight from a passage, and to use passages as LLM context
+KB_DIRECT_CONFIDENCE = float(os.getenv("KB_DIRECT_CONFIDENCE", "0.85"))
+KB_CONTEXT_CONFIDENCE = float(os.getenv("KB_CONTEXT_CONFIDENCE", "0.3"))
+KB_PASSAGE_WORDS = 120
+
+def split_passages(text, size=KB_PASSAGE_WORDS):
+    """
+    Split page text into passages of roughly `size` words, keeping paragraphs together where possible.
+    """
+    passages = []
+    current = []
+    for paragraph in re.split(r'\n\s*\n', text):
+        words = paragraph.split()
+        if current and len(current) + len(words) > size:
+            passages.append(" ".join(current))
+            current = []
+        current.extend(words)
+        while len(current) > size * 2:
+            passages.append(" ".join(current[:size]))
+            current = current[size:]
+    if current:
+        passages.append(" ".join(current))
+    return passages
+
+def load_corpus(corpus_dir=KB_CORPUS_DIR):
+    """
+    Load scraped na.edu pages from *.jsonl files (one {"url", "title", "content"} object
+    per line) and split them into passages. The built-in knowledge base is always included.
+    """
+    documents = [dict(entry) for entry in create_minimal_knowledge_base()]
+    if not os.path.isdir(corpus_dir):
+        return documents
+
+    for filename in sorted(os.listdir(corpus_dir)):
+        if not filename.endswith(".jsonl"):
+            continue
+        with open(os.path.join(corpus_dir, filename), encoding="utf-8") as corpus_file:
+            for line in corpus_file:
+                if not line.strip():
+                    continue
+                page = json.loads(line)
+                for passage in split_passages(page.get("content", "")):
+                    documents.append({
+                        "content": passage,
+                        "source": page.get("url", "https://www.na.edu"),
+                        "title": page.get("title", "")
+                    })
+    return documents
+
+class KnowledgeIndex:
+    """
+    BM25 index stored as flat NumPy arrays: per-term offsets into posting lists of
+    document ids and precomputed BM25 weights. Scoring a query is one bincount over
+    the postings of its terms. Saved as .npy files that load memory-mapped, so worker
+    processes share the same pages instead of each holding a copy.
+    NumPy is imported by the methods, so processes that never search don't load it.
+    """
+
+    def __init__(self, vocabulary, idf, offsets, postings, weights, documents):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.offsets = offsets
+        self.postings = postings
+        self.weights = weights
+        self.documents = documents
+        self.max_idf = float(idf.max()) if len(idf) else 0.0
+
+    @classmethod
+    def build(cls, documents, k1=1.5, b=0.75):
+        import numpy as np
+
+        term_frequencies = []
+        vocabulary = {}
+        for document in documents:
+            counts = {}
+            for term in content_terms(f"{document.get('title', '')} {document['content']}"):
+                counts[term] = counts.get(term, 0) + 1
+                vocabulary.setdefault(term, len(vocabulary))
+            term_frequencies.append(counts)
+
+        lengths = np.array([sum(counts.values()) for counts in term_frequencies], dtype=np.float32)
+        average_length = float(lengths.mean()) if len(lengths) else 0.0
+
+        postings_by_term = [[] for _ in vocabulary]
+        for doc_id, counts in enumerate(term_frequencies):
+            for term, count in counts.items():
+                postings_by_term[vocabulary[term]].append((doc_id, count))
+
+        document_count = len(documents)
+        document_frequency = np.array([len(postings) for postings in postings_by_term], dtype=np.float32)
+        idf = np.log(1 + (document_count - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(document_frequency.astype(np.int64))
+        postings = np.empty(int(offsets[-1]), dtype=np.int32)
+        weights = np.empty(int(offsets[-1]), dtype=np.float32)
+        for term_id, term_postings in enumerate(postings_by_term):
+            start = offsets[term_id]
+            for i, (doc_id, count) in enumerate(term_postings):
+                norm = k1 * (1 - b + b * lengths[doc_id] / average_length)
+                postings[start + i] = doc_id
+                weights[start + i] = idf[term_id] * count * (k1 + 1) / (count + norm)
+
+        return cls(vocabulary, idf, offsets, postings, weights, documents)
+
+    def save(self, index_dir):
+        import numpy as np
+
+        os.makedirs(index_dir, exist_ok=True)
+        for name in ("idf", "offsets", "postings", "weights"):
+            np.save(os.path.join(index_dir, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as meta_file:
+            json.dump({"vocabulary": self.vocabulary, "documents": self.documents}, meta_file)
+
+    @classmethod
+    def load(cls, index_dir):
+        import numpy as np
+
+        arrays = [np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r")
+                  for name in ("idf", "offsets", "postings", "weights")]
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        return cls(meta["vocabulary"], *arrays, meta["documents"])
+
+    def search(self, query, top_k=3):
+        """
+        Best passages for a query as (document, score, confidence) tuples.
+        Confidence is the share of the query's IDF mass that the passage covers;
+        query words missing from the index count at the highest IDF.
+        """
+        import numpy as np
+
+        terms = list(dict.fromkeys(content_terms(query)))
+        term_ids = [self.vocabulary[term] for term in terms if term in self.vocabulary]
+        if not term_ids or not self.documents:
+            return []
+
+        slices = [slice(self.offsets[term_id], self.offsets[term_id + 1]) for term_id in term_ids]
+        postings = np.concatenate([self.postings[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        scores = np.bincount(postings, weights=weights, minlength=len(self.documents))
+
+        # Which query terms each document contains, weighted by IDF
+        term_idf = np.concatenate([np.full(s.stop - s.start, self.idf[term_id], dtype=np.float32)
+                                   for s, term_id in zip(slices, term_ids)])
+        covered = np.bincount(postings, weights=term_idf, minlength=len(self.documents))
+        total_idf = float(self.idf[term_ids].sum()) + self.max_idf * (len(terms) - len(term_ids))
+
+        top = np.argsort(-scores)[:top_k]
+        return [
+            (self.documents[doc_id], float(scores[doc_id]), float(covered[doc_id]) / total_idf)
+            for doc_id in top if scores[doc_id] > 0
+        ]
+
+_knowledge_index = None
+_knowledge_index_lock = threading.Lock()
+
+def get_knowledge_index():
+    """
+    Load the prebuilt index from data/kb_index (see scripts/build_kb_index.py),
+    or build one in memory from the corpus when no prebuilt index exists.
+    """
+    global _knowledge_index
+    if _knowledge_index is None:
+        with _knowledge_index_lock:
+            if _knowledge_index is None:
+                if os.path.exists(os.path.join(KB_INDEX_DIR, "meta.json")):
+                    _knowledge_index = KnowledgeIndex.load(KB_INDEX_DIR)
+                else:
+                    _knowledge_index = KnowledgeIndex.build(load_corpus())
+                logger.info(f"Knowledge index ready with {len(_knowledge_index.documents)} passages")
+    return _knowledge_index
+
+def knowledge_base_context(query, top_k=3):
+    """
+    Passages relevant to the query for the LLM prompt; the whole built-in
+    knowledge base when nothing relevant is found.
+    """
+    results = get_knowledge_index().search(query, top_k=top_k)
+    passages = [document for document, score, confidence in results if confidence >= KB_CONTEXT_CONFIDENCE]
+    return passages or create_minimal_knowledge_base()
+
+# Local query router: KB match confidence at which a question is answered by the cheaper
+# knowledge-base tier instead of web search, and most content words for a search to use
+# the small search context
+KB_ROUTE_CONFIDENCE = float(os.getenv("KB_ROUTE_CONFIDENCE", "0.6"))
+ROUTER_LOW_CONTEXT_WORDS = int(os.getenv("ROUTER_LOW_CONTEXT_WORDS", "4"))
+
+# Whole-message chit-chat, by the reply it gets
+SMALL_TALK_PATTERNS = {
+    "greeting": r"hi|hii+|hello|hey|hey there|hi there|hello there|yo|howdy|greetings|good (?:morning|afternoon|evening)",
+    "thanks": r"thanks?(?: you)?(?: so much| a lot| very much)?|thx|ty|appreciate it|much appreciated",
+    "goodbye": r"bye|goodbye|bye bye|see you|see ya|good night|have a (?:good|nice) day",
+    "acknowledgement": r"ok|okay|k|cool|great|nice|got it|alright|awesome|perfect|sounds good",
+    "identity": r"who are you|what are you|are you (?:a )?(?:bot|robot|human|real|ai)|what is your name|whats your name",
+    "capabilities": r"help|what can you do|what can you help (?:me )?with|how can you help(?: me)?|how are you(?: doing)?"
+}
+# A message is small talk when it is nothing but such phrases ("ok thanks", "hi who are you");
+# the reply goes by the last one
+SMALL_TALK_MESSAGE = re.compile(r"(?:{0})(?: (?:{0}))*".format("|".join(SMALL_TALK_PATTERNS.values())))
+SMALL_TALK_ENDINGS = [(kind, re.compile(rf"(?:^| )(?:{pattern})$")) for kind, pattern in SMALL_TALK_PATTERNS.items()]
+
+SMALL_TALK_ANSWERS = {
+    "greeting": "Hello! I'm the North American University assistant. I can help with admissions, tuition, programs, housing, courses and other campus services. What would you like to know?",
+    "thanks": "You're welcome! Let me know if there is anything else I can help you with.",
+    "goodbye": "Goodbye! Feel free to come back any time you have questions about North American University.",
+    "acknowledgement": "Great! Is there anything else you'd like to know about North American University?",
+    "identity": "I'm the North American University AI assistant. I answer questions about NAU admissions, tuition, programs, campus life and student services.",
+    "capabilities": "I can help with questions about North American University, for example:\n- Admissions and how to apply\n- Tuition, fees and financial aid\n- Programs and course selection\n- Housing and dining\n- The student portal and password resets\nWhat would you like to know?"
+}
+
+# Requests the assistant refuses anyway; only used when no university term appears and
+# the question isn't time-sensitive. Each needs a signal no campus question gives: sports
+# and politics need a league or national context, and arithmetic needs an operator a
+# range or date can't be mistaken for, or a "what is" question ending in it
+OFF_TOPIC_PATTERN = re.compile(
+    r"\b(?:recipes?|lyrics|celebrit(?:y|ies)|jokes?|poems?|tell me a story|stock (?:market|prices?)|bitcoin|"
+    r"crypto(?:currency)?|nba|nfl|mlb|nhl|fifa|world cup|super bowl|premier league|election|politics|"
+    r"(?:us|american) president|"
+    r"president of (?:the )?(?:us|usa|united states|country)|horoscope|zodiac|video games?|netflix|"
+    r"(?:recommend|suggest) (?:me )?(?:a |some )?(?:good )?(?:movies?|films?|tv shows?)|translate|"
+    r"write (?:me )?(?:some |a )?(?:python |javascript |java )?(?:code|program|script)|capital of|"
+    r"meaning of life|chatgpt)\b|\d+\s*[+*]\s*\d+|"
+    r"\b(?:what s|whats|what is|calculate|solve)\s+\d+\s*[-/x]\s*\d+$"
+)
+# Words that are usually off-topic but also come up in campus questions ("weather closure",
+# "movie night", "write an essay"); without a university term these get a low-context
+# search instead of a refusal
+AMBIGUOUS_TOPIC_PATTERN = re.compile(
+    r"\b(?:weather|forecast|movies?|films?|songs?|music|stor(?:y|ies)|essays?|cook(?:ing)?|stocks?|"
+    r"president|javascript|python|programming|coding|write|sports?|football|soccer|"
+    r"basketball|baseball)\b"
+)
+UNIVERSITY_TERMS = set("""
+nau university college campus student students class classes course courses tuition fee fees admission admissions
+apply applying application enroll enrollment register registration semester term degree degrees program programs
+major minor faculty professor professors advisor advising dorm dorms housing parking library scholarship scholarships
+financial aid transcript transcripts grade grades gpa exam exams schedule graduate graduation undergraduate
+international visa i20 portal canvas email password wifi orientation career internship internships club clubs
+tutoring counseling gym cafeteria dining meal meals bookstore refund deadline deadlines credit credits catalog
+calendar commencement alumni stafford dean registrar bursar office department sevis opt cpt f1 textbook textbooks
+""".split())
+
+# Questions about things that change, which the local knowledge base may have out of date
+FRESHNESS_PATTERN = re.compile(
+    r"\b(?:today|tomorrow|tonight|this (?:week|month|semester|term|year)|next (?:week|month|semester|term|year)|"
+    r"current(?:ly)?|latest|recent(?:ly)?|news|upcoming|right now|20\d\d)\b"
+)
+
+class Route:
+    """
+    The router's decision for one query: kind is "small_talk", "off_topic",
+    "knowledge_base" or "web_search"; context_size is the web search context to request.
+    """
+    __slots__ = ("kind", "reason", "context_size", "confidence", "document")
+
+    def __init__(self, kind, reason, context_size="medium", confidence=0.0, document=None):
+        self.kind = kind
+        self.reason = reason
+        self.context_size = context_size
+        self.confidence = confidence
+        self.document = document
+
+def route_query(query):
+    """
+    Classify a query that has no predefined answer, cheapest check first: chit-chat and
+    clearly unrelated questions are answered with a canned reply, questions the knowledge
+    base covers skip web search, and the rest get the smallest search context likely to do.
+    """
+    text = re.sub(r"[^\w\s+*/-]", " ", query.lower())
+    text = re.sub(r"\s+", " ", text).strip()
+    words = re.sub(r"[^\w\s]", " ", text).split()
+    if not words:
+        return Route("small_talk", "capabilities")
+
+    if SMALL_TALK_MESSAGE.fullmatch(text):
+        kind = next(kind for kind, ending in SMALL_TALK_ENDINGS if ending.search(text))
+        return Route("small_talk", kind)
+
+    # Time-sensitive questions ("is there a weather closure today") are searched, never refused
+    on_topic = any(word in UNIVERSITY_TERMS for word in words)
+    fresh = FRESHNESS_PATTERN.search(text) is not None
+    if not on_topic and not fresh and OFF_TOPIC_PATTERN.search(text):
+        return Route("off_topic", "off_topic")
+
+    if not fresh:
+        results = get_knowledge_index().search(query, top_k=1)
+        if results and results[0][2] >= KB_ROUTE_CONFIDENCE:
+            document, score, confidence = results[0]
+            return Route("knowledge_base", "kb_match", confidence=confidence, document=document)
+        if not on_topic and AMBIGUOUS_TOPIC_PATTERN.search(text):
+            return Route("web_search", "ambiguous", "low")
+
+    content_words = content_terms(query)
+    if fresh or len(content_words) > ROUTER_LOW_CONTEXT_WORDS:
+        return Route("web_search", "time_sensitive" if fresh else "detailed", "medium")
+    return Route("web_search", "short_lookup", "low")
+
+OFF_TOPIC_ANSWER = "I can only assist with topics related to North American University. Feel free to ask me about admissions, tuition, programs, housing or other campus services."
+
+def routed_answer(route):
+    """
+    Canned response for small-talk and off-topic routes.
+    """
+    text = OFF_TOPIC_ANSWER if route.kind == "off_topic" else SMALL_TALK_ANSWERS[route.reason]
+    return get_precomputed_answer(text, ["https://www.na.edu"])
+
+for text in list(SMALL_TALK_ANSWERS.values()) + [OFF_TOPIC_ANSWER]:
+    precompute_answer(text, ["https://www.na.edu"])
+
+# How long a coalesced caller waits on a shared upstream call before giving up
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "60"))
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one in-flight task.
+    Every waiter gets the same result or the same exception; a waiter that times
+    out stops waiting without affecting the others, and the shared task is
+    cancelled once nobody is waiting on it any more.
+    """
+
+    def __init__(self, timeout=SINGLE_FLIGHT_TIMEOUT):
+        self.timeout = timeout
+        self._calls = {}
+        self.started = 0
+        self.coalesced = 0
+        self.timeouts = 0
+
+    def waiters(self, key):
+        call = self._calls.get(key)
+        return call["waiters"] if call else 0
+
+    def _forget(self, key, call, task):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # Mark the exception as retrieved even if every waiter already left
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key, func, timeout=None):
+        call = self._calls.get(key)
+        if call is None:
+            task = asyncio.ensure_future(func())
+            call = {"task": task, "waiters": 0}
+            self._calls[key] = call
+            task.add_done_callback(functools.partial(self._forget, key, call))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        call["waiters"] += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(call["task"]), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            call["waiters"] -= 1
+            if call["waiters"] == 0 and not call["task"].done():
+                call["task"].cancel()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls),
+            "waiters": sum(call["waiters"] for call in self._calls.values()),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts
         }
-        
-        # Make request with proper web_search_options
-        response = client.chat.completions.create(
-            model="gpt-4o-search-preview",  # Must use a -search- model variant
-            web_search_options={
-                "search_context_size": "medium",  # Balance between quality and speed
-                "user_location": user_location    # Location to improve relevance
-            },
-            messages=[
-                {
-                    "role": "system", 
-                    "content": """You are the official AI chatbot for North American University (NAU). Your primary purpose is to provide students with accurate, helpful information about NAU programs, services, and policies.
+
+# Identical upstream LLM requests in flight at the same time share one call
+upstream_calls = SingleFlight()
+
+# Circuit breaker settings: calls kept in the rolling window, calls needed before it can
+# trip, error rate and p90 latency (seconds) that open it, and how long it stays open
+# before half-open trial calls are let through
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_SECONDS = float(os.getenv("BREAKER_SLOW_SECONDS", "12"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "1"))
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a model whose circuit breaker is open.
+    """
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+class CircuitBreaker:
+    """
+    Rolling window of call outcomes for one upstream model. Opens when the error rate
+    or the p90 latency crosses its threshold and rejects calls while open. After
+    BREAKER_OPEN_SECONDS it turns half-open and lets a few trial calls through: a
+    successful trial closes it, a failed one opens it again.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.state = "closed"
+        self.calls = deque(maxlen=BREAKER_WINDOW)
+        # Latencies of calls that ran to completion, for estimating what a cancellation saved
+        self.completed = deque(maxlen=BREAKER_WINDOW)
+        self.opened_at = None
+        self.trials = 0
+        self.times_opened = 0
+        self.rejected = 0
+        self.last_reason = None
+
+    def _ready_for_trial(self):
+        return time.monotonic() - self.opened_at >= BREAKER_OPEN_SECONDS
+
+    def available(self):
+        """
+        Whether a call would be let through right now, without reserving a trial slot.
+        """
+        if self.state == "open":
+            return self._ready_for_trial()
+        if self.state == "half_open":
+            return self.trials < BREAKER_HALF_OPEN_CALLS
+        return True
+
+    def allow(self):
+        if self.state == "open" and self._ready_for_trial():
+            logger.info(f"Circuit for {self.name} half-open, sending trial calls")
+            self.state = "half_open"
+            self.trials = 0
+        if self.state == "open" or (self.state == "half_open" and self.trials >= BREAKER_HALF_OPEN_CALLS):
+            self.rejected += 1
+            return False
+        if self.state == "half_open":
+            self.trials += 1
+        return True
+
+    def _trip_reason(self):
+        if len(self.calls) < BREAKER_MIN_CALLS:
+            return None
+        error_rate = sum(1 for ok, latency in self.calls if not ok) / len(self.calls)
+        if error_rate >= BREAKER_ERROR_RATE:
+            return f"error rate {error_rate:.0%}"
+        p90 = percentile([latency for ok, latency in self.calls], 90)
+        if p90 >= BREAKER_SLOW_SECONDS:
+            return f"p90 latency {p90:.1f}s"
+        return None
+
+    def _open(self, reason):
+        logger.warning(f"Circuit for {self.name} opened: {reason}")
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        self.last_reason = reason
+
+    def record(self, ok, latency, trial=False):
+        if trial:
+            self.trials -= 1
+        if trial and self.state == "half_open":
+            if ok:
+                # Start the closed window fresh so old failures don't reopen it
+                logger.info(f"Circuit for {self.name} closed after a successful trial call")
+                self.state = "closed"
+                self.calls.clear()
+            else:
+                self._open("trial call failed")
+        self.calls.append((ok, latency))
+        if not trial and self.state == "closed":
+            reason = self._trip_reason()
+            if reason:
+                self._open(reason)
+
+    def cancelled(self, latency, trial=False):
+        # A cancelled call has no outcome, but its latency so far is still a lower bound
+        if trial:
+            self.trials -= 1
+        else:
+            self.record(True, latency)
+
+    # count_cancelled=False leaves cancelled calls out of the window, for callers whose
+    # cancellations say nothing about the upstream
+    @contextlib.asynccontextmanager
+    async def guard(self, count_cancelled=True):
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit for {self.name} is open")
+        trial = self.state == "half_open"
+        started = time.monotonic()
+        try:
+            yield
+        except Exception:
+            self.record(False, time.monotonic() - started, trial)
+            raise
+        except BaseException:
+            elapsed = time.monotonic() - started
+            UPSTREAM_CANCELLED_TOTAL.inc(self.name)
+            UPSTREAM_SECONDS_SAVED.inc(self.name, amount=max(0.0, percentile(self.completed, 50) - elapsed))
+            if count_cancelled:
+                self.cancelled(elapsed, trial)
+            elif trial:
+                self.trials -= 1
+            raise
+        latency = time.monotonic() - started
+        self.completed.append(latency)
+        self.record(True, latency, trial)
+
+    def snapshot(self):
+        latencies = [latency for ok, latency in self.calls]
+        return {
+            "state": self.state,
+            "available": self.available(),
+            "calls": len(self.calls),
+            "error_rate": round(sum(1 for ok, latency in self.calls if not ok) / len(self.calls), 3) if self.calls else 0.0,
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p90_ms": round(percentile(latencies, 90) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "last_reason": self.last_reason,
+            "retry_in_s": round(max(0.0, BREAKER_OPEN_SECONDS - (time.monotonic() - self.opened_at)), 1) if self.state == "open" else 0.0
+        }
+
+circuit_breakers = {}
+
+def get_circuit_breaker(model):
+    breaker = circuit_breakers.get(model)
+    if breaker is None:
+        breaker = circuit_breakers[model] = CircuitBreaker(model)
+    return breaker
+
+def completion_key(query, request_kwargs):
+    """
+    Requests coalesce when the model, options and system prompt match and the
+    queries normalize to the same words.
+    """
+    options = {name: value for name, value in request_kwargs.items() if name not in ("messages", "timeout")}
+    system_prompt = request_kwargs["messages"][0]["content"]
+    return "|".join([
+        json.dumps(options, sort_keys=True, default=str),
+        hashlib.sha1(system_prompt.encode("utf-8")).hexdigest(),
+        normalize_query(query)
+    ])
+
+async def create_completion(query, **request_kwargs):
+    """
+    Chat completion through the shared client, coalesced with identical in-flight requests
+    and guarded by the model's circuit breaker.
+    """
+    client = get_openai_client()
+    breaker = get_circuit_breaker(request_kwargs["model"])
+
+    async def call():
+        async with breaker.guard():
+            UPSTREAM_IN_FLIGHT.inc(breaker.name)
+            try:
+                response = await client.chat.completions.create(**request_kwargs)
+            finally:
+                UPSTREAM_IN_FLIGHT.dec(breaker.name)
+        record_usage(breaker.name, getattr(response, "usage", None))
+        return response
+
+    return await upstream_calls.do(completion_key(query, request_kwargs), call)
+
+# System prompt for the primary web search model
+SEARCH_SYSTEM_PROMPT = """You are the official AI chatbot for North American University (NAU). Your primary purpose is to provide students with accurate, helpful information about NAU programs, services, and policies.
 
 Use search results to provide detailed, accurate information about North American University. 
 Focus on the official NA.edu website content when available. If information isn't available from search, clearly state that and suggest contacting the appropriate department.
@@ -529,68 +2245,144 @@ FORMAT:
 
 Use a warm, conversational tone and format information with bullet points where appropriate.
 End responses with an offer to help with other questions."""
-                },
-                {
-                    "role": "user",
-                    "content": f"Question about North American University: {query}"
-                }
-            ]
-        )
-        
-        # Extract the assistant's response
-        answer = response.choices[0].message.content
-        
-        # Extract citations if available
-        sources = []
-        if hasattr(response.choices[0].message, 'annotations'):
-            for annotation in response.choices[0].message.annotations:
-                if hasattr(annotation, 'type') and annotation.type == 'url_citation':
-                    if hasattr(annotation.url_citation, 'url'):
-                        url = annotation.url_citation.url
-                        
-                        # Clean the URL if it is an OpenAI redirect
-                        if "openai.com/citation" in url and "url=" in url:
-                            parsed_url = urllib.parse.urlparse(url)
-                            query_params = urllib.parse.parse_qs(parsed_url.query)
-                            real_urls = query_params.get('url')
-                            if real_urls:
-                                decoded_url = urllib.parse.unquote(real_urls[0])
-                            else:
-                                decoded_url = url
-                        else:
-                            decoded_url = url
-
-                        # FINAL cleanup: remove "?utm_source=openai" or "&utm_source=openai"
-                        decoded_url = re.sub(r'(\?|&)utm_source=openai(&)?', '', decoded_url)
-                        # Also remove any leftover trailing ? or &
-                        decoded_url = decoded_url.rstrip('?').rstrip('&')
-                        
-                        sources.append(decoded_url)
-
-        if not sources:
-            sources = ["https://www.na.edu"]
-
-        logger.info(f"Successfully received web search response with {len(sources)} sources")
 
-        return {
-            "answer": answer,
-            "sources": sources
-        }
+# Location info for a U.S. based query - adjust if needed
+SEARCH_USER_LOCATION = {
+    "type": "approximate",
+    "approximate": {
+        "country": "US",
+        "city": "Stafford",
+        "region": "Texas"
+    }
+}
 
-    except Exception as e:
-        logger.error(f"Error with web search: {str(e)}")
-        return {
-            "answer": "I apologize, but I'm having trouble searching for information about that. Please try again later or contact NAU directly for assistance.",
-            "sources": ["https://www.na.edu"]
-        }
+def build_search_request(query, context_size="medium"):
+    """
+    Keyword arguments for the primary web search completion, shared by the
+    regular and streaming paths. The router picks context_size per query.
+    """
+    return {
+        "model": SEARCH_MODEL,  # Must use a -search- model variant
+        "web_search_options": {
+            "search_context_size": context_size,  # "low" is faster and cheaper for simple lookups
+            "user_location": SEARCH_USER_LOCATION    # Location to improve relevance
+        },
+        "messages": [
+            {
+                "role": "system",
+                "content": SEARCH_SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": f"Question about North American University: {query}"
+            }
+        ],
+        "timeout": SEARCH_TIMEOUT
+    }
 
-# Fallback function when web search fails
-async def fallback_response(query):
+def clean_citation_url(url):
+    # Clean the URL if it is an OpenAI redirect
+    if "openai.com/citation" in url and "url=" in url:
+        parsed_url = urllib.parse.urlparse(url)
+        query_params = urllib.parse.parse_qs(parsed_url.query)
+        real_urls = query_params.get('url')
+        if real_urls:
+            decoded_url = urllib.parse.unquote(real_urls[0])
+        else:
+            decoded_url = url
+    else:
+        decoded_url = url
+
+    # FINAL cleanup: remove "?utm_source=openai" or "&utm_source=openai"
+    decoded_url = re.sub(r'(\?|&)utm_source=openai(&)?', '', decoded_url)
+    # Also remove any leftover trailing ? or &
+    decoded_url = decoded_url.rstrip('?').rstrip('&')
+    return decoded_url
+
+def extract_citation_sources(annotations):
+    """
+    Collect cleaned url_citation URLs from message annotations.
+    Streaming deltas deliver annotations as plain dicts, full responses as objects.
+    """
+    sources = []
+    for annotation in annotations or []:
+        if isinstance(annotation, dict):
+            if annotation.get('type') == 'url_citation':
+                url = (annotation.get('url_citation') or {}).get('url')
+                if url:
+                    sources.append(clean_citation_url(url))
+        elif hasattr(annotation, 'type') and annotation.type == 'url_citation':
+            if hasattr(annotation.url_citation, 'url'):
+                sources.append(clean_citation_url(annotation.url_citation.url))
+    return sources
+
+# Function to use OpenAI's web search API
+async def search_web_with_openai(query, context_size="medium"):
+    """
+    Raises on any upstream error so the caller can move on to the fallback tiers.
+    """
+    # Use the appropriate web search model
+    logger.info(f"Using OpenAI web search ({context_size} context)...")
+
+    # Make request with proper web_search_options
+    response = await create_completion(query, **build_search_request(query, context_size))
+
+    # Extract the assistant's response
+    answer = response.choices[0].message.content
+
+    # Extract citations if available
+    sources = extract_citation_sources(getattr(response.choices[0].message, 'annotations', None))
+
+    if not sources:
+        sources = ["https://www.na.edu"]
+
+    logger.info(f"Successfully received web search response with {len(sources)} sources")
+
+    return {
+        "answer": answer,
+        "sources": sources
+    }
+
+# Stream the primary web search answer as it is generated
+async def stream_web_search(query, context_size="medium"):
+    """
+    Async generator yielding ("delta", text) for each content chunk and
+    finally ("sources", [urls]) once the stream completes.
+    Errors are raised to the caller so it can fall back.
+    """
+    client = get_openai_client()
+    logger.info(f"Using OpenAI web search (streaming, {context_size} context)...")
+
+    sources = []
+    UPSTREAM_IN_FLIGHT.inc(SEARCH_MODEL)
     try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        # Use system prompt from the original code
-        system_prompt = """You are the official AI chatbot for North American University (NAU). Your primary purpose is to provide students with accurate, helpful information about NAU programs, services, and policies.
+        # The breaker judges the model on the time to its first chunk. Generating the rest
+        # takes as long as the answer is, and the consumer sets the pace, so neither is
+        # upstream latency; a caller cancelling the wait (hedge or budget) isn't either
+        async with get_circuit_breaker(SEARCH_MODEL).guard(count_cancelled=False):
+            stream = await client.chat.completions.create(
+                stream=True,
+                stream_options={"include_usage": True},  # Token usage arrives in a final chunk
+                **build_search_request(query, context_size)
+            )
+            chunks = stream.__aiter__()
+            chunk = await anext(chunks, None)
+
+        while chunk is not None:
+            record_usage(SEARCH_MODEL, getattr(chunk, "usage", None))
+            if chunk.choices:
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    yield "delta", delta.content
+                sources.extend(extract_citation_sources(getattr(delta, 'annotations', None)))
+            chunk = await anext(chunks, None)
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(SEARCH_MODEL)
+
+    yield "sources", list(dict.fromkeys(sources)) or ["https://www.na.edu"]
+
+# System prompt shared by the fallback tiers
+FALLBACK_SYSTEM_PROMPT = """You are the official AI chatbot for North American University (NAU). Your primary purpose is to provide students with accurate, helpful information about NAU programs, services, and policies.
 
 RESPONSE PRIORITIES:
 1. PREDEFINED ANSWERS: For common questions about tuition, admissions, programs, password resets, course selection, and portal access, provide the complete predefined answer with all details.
@@ -625,186 +2417,1431 @@ CONTENT RESTRICTIONS:
 - Never mention training data or your training process
 - For non-NAU questions, politely redirect: "I can only assist with topics related to North American University."
 - Only provide answers from www.na.edu website, not from the other websites."""
-        
-        context = json.dumps(create_minimal_knowledge_base())
-        
-        # Try to use web search with a different approach
+
+# Answer returned when the latency budget ran out before any tier answered
+ERROR_ANSWER = "I apologize, but I'm having trouble processing your request at the moment. Please try again later or contact NAU directly for assistance."
+
+# Appended to a streamed answer whose upstream failed after part of it was sent
+TRUNCATED_ANSWER_NOTE = "This answer was cut off by a temporary problem. Please ask again for the complete answer."
+
+# Backup tier: web search with minimal options
+async def backup_web_search(query):
+    response = await create_completion(
+        query,
+        model=SEARCH_MODEL,  # Using the search-capable model
+        web_search_options={},  # Minimal web search options
+        messages=[
+            {"role": "system", "content": FALLBACK_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Please find information about North American University regarding this question: {query}"}
+        ],
+        temperature=0,
+        timeout=BACKUP_SEARCH_TIMEOUT
+    )
+
+    answer = response.choices[0].message.content
+    logger.info("Successfully received response from backup web search")
+
+    # Extract any available sources, using the default source if none found
+    sources = extract_citation_sources(getattr(response.choices[0].message, 'annotations', None))
+    if not sources:
+        sources = ["https://www.na.edu"]
+
+    return {
+        "answer": answer,
+        "sources": sources
+    }
+
+# Cheapest tier: standard model answering from the local knowledge base
+async def fallback_response(query):
+    context = json.dumps(knowledge_base_context(query))
+
+    response = await create_completion(
+        query,
+        model=FALLBACK_MODEL,
+        messages=[
+            {"role": "system", "content": FALLBACK_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Context about North American University: {context}\n\nUser Question: {query}"}
+        ],
+        temperature=0,
+        timeout=FALLBACK_TIMEOUT
+    )
+
+    answer = response.choices[0].message.content
+    logger.info("Successfully received response from standard OpenAI API")
+    return {
+        "answer": answer,
+        "sources": ["https://www.na.edu"]
+    }
+
+# Await one tier, recording how long it took unless it was cancelled as a loser
+async def timed_stage(stage, coro):
+    started = time.perf_counter()
+    try:
+        result = await coro
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        observe_stage(time.perf_counter() - started, stage)
+        raise
+    observe_stage(time.perf_counter() - started, stage)
+    return result
+
+# Race the answer tiers within the request's latency budget
+async def answer_with_fallbacks(query, budget=None, skip_primary=False, route=None, search_call=None):
+    """
+    Starts the primary web search and, once HEDGE_DELAY passes without an answer, the
+    knowledge-base fallback alongside it. A failed primary search starts the backup search
+    and the knowledge-base fallback straight away. Queries the router sent to the
+    knowledge base run those two the other way round: the knowledge-base tier first and
+    the web search as the hedge. The first tier to succeed wins and the rest are cancelled.
+    Tiers whose model circuit is open are skipped, so a degraded primary model sends
+    requests straight to the other tiers. search_call, when given, is started in place
+    of the web search tier (the streaming path passes its wait for the first chunk).
+    Returns a (result, tier) tuple. When every tier failed or had its circuit open, the
+    result is the knowledge-base-only answer with tier "degraded"; when the budget ran
+    out it is None.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + (CHAT_LATENCY_BUDGET if budget is None else budget)
+    hedge_at = loop.time() + HEDGE_DELAY
+    context_size = route.context_size if route is not None else "medium"
+    tier_calls = {
+        "web_search": (SEARCH_MODEL, search_call or (lambda: search_web_with_openai(query, context_size))),
+        "backup_search": (SEARCH_MODEL, lambda: backup_web_search(query)),
+        "fallback": (FALLBACK_MODEL, lambda: fallback_response(query))
+    }
+    primary, hedge = ("fallback", "web_search") if route is not None and route.kind == "knowledge_base" else ("web_search", "fallback")
+    tiers = {}
+
+    def start(tier):
+        tiers[asyncio.ensure_future(timed_stage(tier, tier_calls[tier][1]()))] = tier
+
+    def start_fallbacks(include_backup):
+        running = set(tiers.values())
+        for tier in (hedge, "backup_search") if include_backup else (hedge,):
+            if tier not in running and get_circuit_breaker(tier_calls[tier][0]).available():
+                start(tier)
+
+    if not skip_primary and not get_circuit_breaker(tier_calls[primary][0]).available():
+        logger.info(f"Circuit for {tier_calls[primary][0]} is open, routing straight to the other tiers")
+        skip_primary = True
+
+    if skip_primary:
+        start_fallbacks(include_backup=True)
+    else:
+        start(primary)
+    hedged = skip_primary
+
+    try:
+        while tiers:
+            now = loop.time()
+            if now >= deadline:
+                logger.error(f"Latency budget exhausted with {sorted(tiers.values())} still running")
+                CANCELLED_REQUESTS_TOTAL.inc("timeout")
+                return None, None
+
+            wait_until = deadline if hedged else min(hedge_at, deadline)
+            done, _ = await asyncio.wait(tiers, timeout=wait_until - now, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                tier = tiers.pop(task)
+                if task.cancelled():
+                    continue
+                error = task.exception()
+                if error is None:
+                    logger.info(f"Answer served by the {tier} tier")
+                    return task.result(), tier
+                logger.error(f"{tier} tier failed: {str(error)}")
+                if tier == primary:
+                    start_fallbacks(include_backup=True)
+                    hedged = True
+
+            if not hedged and loop.time() >= hedge_at:
+                logger.info(f"{primary} tier slower than {HEDGE_DELAY}s, hedging with the {hedge} tier")
+                start_fallbacks(include_backup=False)
+                hedged = True
+
+        # Every tier failed or is behind an open circuit: answer from the knowledge base
+        # without a model rather than send an error
+        logger.error("No LLM tier available, answering from the knowledge base")
+        return degraded_answer(query, UNAVAILABLE_NOTICE), "degraded"
+    finally:
+        # Cancel the losers; their single-flight calls stop once nobody else waits on them
+        for task in tiers:
+            task.cancel()
+
+# Optimized bundle written by scripts/build_static.py; files it doesn't contain come from static/
+STATIC_DIST_DIR = os.path.join('static', 'dist')
+# Build outputs carry a content hash in the name, so they never change and can be cached for good
+HASHED_ASSET = re.compile(r'\.[0-9a-f]{10}\.[a-z0-9]+$')
+# Precompressed copies next to a built file, in order of preference
+PRECOMPRESSED_SUFFIXES = (("br", ".br"), ("gzip", ".gz"))
+
+def serve_static(path):
+    """
+    Serves a static file, preferring the built bundle and its precompressed copies.
+    Hashed names are cached for a year; everything else is revalidated on each load.
+    """
+    directory = 'static'
+    if os.path.isfile(os.path.join(app.root_path, STATIC_DIST_DIR, path)):
+        directory = STATIC_DIST_DIR
+
+    response = None
+    compressed = [(coding, suffix) for coding, suffix in PRECOMPRESSED_SUFFIXES
+                  if directory == STATIC_DIST_DIR and os.path.isfile(os.path.join(app.root_path, directory, path + suffix))]
+    accept_encoding = request.headers.get("Accept-Encoding", "")
+    for coding, suffix in compressed:
+        if accepts_encoding(accept_encoding, coding):
+            response = send_from_directory(directory, path + suffix, mimetype=mimetypes.guess_type(path)[0])
+            response.headers["Content-Encoding"] = coding
+            break
+    if response is None:
+        response = send_from_directory(directory, path)
+    if compressed:
+        response.headers["Vary"] = "Accept-Encoding"
+
+    if HASHED_ASSET.search(path):
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+@app.route('/')
+def index():
+    return serve_static('index.html')
+
+@app.route('/<path:path>')
+def static_files(path):
+    return serve_static(path)
+
+# Answer a query without calling an LLM: follow-ups, predefined answers and the answer cache
+def answer_locally(query, follow_up_to=None, original_question=''):
+    """
+    Returns a response dict or PrecomputedResponse, or the Route to take when the query
+    needs an LLM call, so the LLM path doesn't route it again.
+    """
+    # If this is a follow-up response
+    if follow_up_to:
+        logger.debug(f"Processing follow-up response to: {follow_up_to}")
+
+        started = time.perf_counter()
+        state = follow_up_store.resolve(follow_up_to)
+        if state is not None:
+            follow_up, sources = state.follow_up, state.sources
+        else:
+            # Unknown or expired id (e.g. issued by another worker): rebuild the context
+            # from the original question when the client sent it
+            predefined = get_predefined_answer(original_question) if original_question else None
+            follow_up = predefined.get("follow_up") if predefined else None
+            sources = predefined.get("sources", ["https://www.na.edu"]) if predefined else None
+
+        if follow_up:
+            answer = process_follow_up_response(follow_up, query)
+
+            # Cleaned and serialized at startup
+            response = get_precomputed_answer(answer, sources)
+            observe_stage(time.perf_counter() - started, "follow_up")
+            count_answer("follow_up")
+            return response
+    
+    # Check for predefined answers first
+    started = time.perf_counter()
+    predefined = get_predefined_answer(query)
+    observe_stage(time.perf_counter() - started, "predefined")
+    if predefined:
+        response = get_precomputed_answer(predefined["answer"], predefined["sources"])
+
+        logger.debug("Using predefined answer")
+        if "follow_up" in predefined:
+            follow_up_id = follow_up_store.create(predefined)
+            response = response.with_fields({
+                "follow_up_id": follow_up_id,
+                "original_question": query
+            })
+
+        count_answer("predefined")
+        return response
+
+    # Reuse a recent answer to the same or a near-duplicate question
+    started = time.perf_counter()
+    cached = answer_refresher.lookup(query)
+    observe_stage(time.perf_counter() - started, "cache_lookup")
+    if cached:
+        logger.debug("Using cached answer")
+        count_answer("cache")
+        return {
+            "answer": cached["answer"],
+            "sources": cached["sources"]
+        }
+
+    # Route what is left: canned replies, a confident knowledge base passage, or the LLM
+    started = time.perf_counter()
+    route = route_query(query)
+    observe_stage(time.perf_counter() - started, "route")
+    ROUTES_TOTAL.inc(route.kind)
+    annotate_request(route=route.kind, route_reason=route.reason)
+    if route.kind in ("small_talk", "off_topic"):
+        count_answer(route.kind)
+        return routed_answer(route)
+
+    if route.kind == "knowledge_base" and route.confidence >= KB_DIRECT_CONFIDENCE:
+        logger.info(f"Answering from knowledge base '{route.document.get('title', '')}' (confidence {route.confidence:.2f})")
+        count_answer("knowledge_base")
+        return {
+            "answer": clean_response_format(route.document["content"]),
+            "sources": [route.document["source"]]
+        }
+    return route
+
+# Answer a query with OpenAI web search, falling back to the backup tiers
+async def answer_with_llm(query, skip_primary=False, route=None):
+    # No local answer: web search, or the knowledge-base tier when the router allows it
+    route = route or route_query(query)
+    logger.info(f"No local answer found, using the {route.kind} route ({route.reason})...")
+
+    result, tier = await answer_with_fallbacks(query, skip_primary=skip_primary, route=route)
+    return finish_llm_answer(query, result, tier)
+
+def finish_llm_answer(query, result, tier):
+    """
+    Count, clean and remember the answer a tier produced; ERROR_ANSWER when none did.
+    """
+    count_answer(tier or "error")
+    if result is None:
+        return {
+            "answer": ERROR_ANSWER,
+            "sources": ["https://www.na.edu"]
+        }
+    if tier == "degraded":
+        # Already cleaned, and not worth caching in place of a real answer
+        return result
+
+    # Clean answer
+    started = time.perf_counter()
+    answer = clean_response_format(result["answer"])
+    observe_stage(time.perf_counter() - started, "clean_response")
+    sources = result["sources"]
+    remember_answer(query, {"answer": answer, "sources": sources})
+
+    return {
+        "answer": answer,
+        "sources": sources
+    }
+
+# Stale-while-revalidate settings: how many of the most asked questions are kept warm
+# and how often one must be asked to count, refreshes running at once, random delay
+# (seconds) before each refresh, how long before expiry a hot answer is refreshed, and
+# how often the sweeper checks the hot set
+REFRESH_TOP_N = int(os.getenv("REFRESH_TOP_N", "100"))
+REFRESH_MIN_HITS = int(os.getenv("REFRESH_MIN_HITS", "3"))
+REFRESH_CONCURRENCY = int(os.getenv("REFRESH_CONCURRENCY", "4"))
+REFRESH_JITTER = float(os.getenv("REFRESH_JITTER", "5"))
+REFRESH_AHEAD = float(os.getenv("REFRESH_AHEAD", "300"))
+REFRESH_INTERVAL = float(os.getenv("REFRESH_INTERVAL", "60"))
+# Popularity counts are halved this often (seconds) so yesterday's hot questions cool off
+POPULARITY_HALF_LIFE = float(os.getenv("POPULARITY_HALF_LIFE", "3600"))
+POPULARITY_MAX_KEYS = int(os.getenv("POPULARITY_MAX_KEYS", "10000"))
+
+class AnswerRefresher:
+    """
+    Keeps the answers to the most popular questions warm.
+    Every cache lookup counts towards its question's popularity. For the top
+    REFRESH_TOP_N questions an expired answer is served straight away and the web
+    search is re-run in the background; answers within REFRESH_AHEAD of expiry are
+    refreshed too, both on access and by a periodic sweep. Refreshes are jittered and
+    capped at REFRESH_CONCURRENCY; extra ones are skipped and the sweep retries them.
+    A failed refresh keeps the old answer.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self._hot = frozenset()
+        self._hot_computed_at = 0.0
+        self._decayed_at = time.monotonic()
+        self._refreshing = set()
+        self._sweeper_pid = None
+        self._lock = threading.Lock()
+        self.stale_served = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def _decay(self, now):
+        self.counts = {key: count // 2 for key, count in self.counts.items() if count > 1}
+        self._decayed_at = now
+
+    def record(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+            if now - self._decayed_at >= POPULARITY_HALF_LIFE or len(self.counts) > POPULARITY_MAX_KEYS:
+                self._decay(now)
+
+    def hot_keys(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._hot_computed_at >= 1.0:
+                popular = [key for key, count in self.counts.items() if count >= REFRESH_MIN_HITS]
+                self._hot = frozenset(heapq.nlargest(REFRESH_TOP_N, popular, key=self.counts.get))
+                self._hot_computed_at = now
+            return self._hot
+
+    def lookup(self, query):
+        """
+        Cached answer for the query, possibly stale when the question is popular.
+        """
+        key = normalize_query(query)
+        if not key:
+            return None
+        self.record(key)
+        hot = key in self.hot_keys()
+
+        entry = answer_cache.get_entry(query, allow_stale=hot)
+        if entry is None or not hot:
+            return entry["result"] if entry else None
+
+        remaining = entry["expires_at"] - time.time()
+        if remaining <= 0:
+            self.stale_served += 1
+        if remaining <= REFRESH_AHEAD:
+            self.schedule(normalize_query(entry["query"]), entry["query"])
+        self.ensure_sweeper()
+        return entry["result"]
+
+    def schedule(self, key, query):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            if len(self._refreshing) >= REFRESH_CONCURRENCY:
+                self.skipped += 1
+                return
+            self._refreshing.add(key)
+        spawn_background(self._refresh(key, query))
+
+    async def _refresh(self, key, query):
         try:
-            # Use web search with minimal options
-            response = client.chat.completions.create(
-                model="gpt-4o-search-preview",  # Using the search-capable model
-                web_search_options={},  # Minimal web search options
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Please find information about North American University regarding this question: {query}"}
-                ],
-                temperature=0
-            )
-            
-            answer = response.choices[0].message.content
-            logger.info("Successfully received response from backup web search")
-            
-            # Extract any available sources
-            sources = []
-            if hasattr(response.choices[0].message, 'annotations'):
-                for annotation in response.choices[0].message.annotations:
-                    if hasattr(annotation, 'type') and annotation.type == 'url_citation':
-                        if hasattr(annotation, 'url_citation') and hasattr(annotation.url_citation, 'url'):
-                            sources.append(annotation.url_citation.url)
-            
-            # Use default source if none found
-            if not sources:
-                sources = ["https://www.na.edu"]
-                
+            await asyncio.sleep(random.uniform(0, REFRESH_JITTER))
+            result = await search_web_with_openai(query)
+            remember_answer(query, {"answer": clean_response_format(result["answer"]), "sources": result["sources"]})
+            self.refreshed += 1
+            logger.info(f"Refreshed popular answer for '{key}'")
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Refreshing '{key}' failed, keeping the old answer: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def ensure_sweeper(self):
+        if self._sweeper_pid == os.getpid():
+            return
+        self._sweeper_pid = os.getpid()
+        spawn_background(self._sweep())
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL)
+            deadline = time.time() + REFRESH_AHEAD
+            for key in self.hot_keys():
+                entry = answer_cache.peek(key)
+                if entry is not None and entry["expires_at"] <= deadline:
+                    self.schedule(key, entry["query"])
+
+    def stats(self):
+        with self._lock:
             return {
-                "answer": answer,
-                "sources": sources
+                "tracked": len(self.counts),
+                "hot": len(self._hot),
+                "refreshing": len(self._refreshing),
+                "stale_served": self.stale_served,
+                "refreshed": self.refreshed,
+                "failed": self.failed,
+                "skipped": self.skipped
             }
-            
-        except Exception as web_search_error:
-            logger.error(f"Backup web search failed: {str(web_search_error)}")
-            
-            # Final fallback to standard model with our knowledge base
-            response = client.chat.completions.create(
-                model="gpt-4o",  # Standard model as last resort
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Context about North American University: {context}\n\nUser Question: {query}"}
-                ],
-                temperature=0
-            )
-            
-            answer = response.choices[0].message.content
-            logger.info("Successfully received response from standard OpenAI API")
-            return {
-                "answer": answer,
-                "sources": ["https://www.na.edu"]
-            }
-            
-    except Exception as fallback_error:
-        logger.error(f"Fallback API error: {str(fallback_error)}")
+
+answer_refresher = AnswerRefresher()
+
+# Admission control for the LLM paths: requests running at once, requests allowed to
+# wait for a slot, and how long (seconds) one may wait before it is shed
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "100"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "5"))
+
+# Per-client token bucket for /api/chat (0 disables rate limiting)
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+
+# Visitors' worth of that budget one client address may use in total, across the
+# session ids it sends (students behind one campus NAT share an address)
+RATE_LIMIT_SESSIONS_PER_ADDRESS = int(os.getenv("RATE_LIMIT_SESSIONS_PER_ADDRESS", "10"))
+
+# Reverse proxies in front of the app that append to X-Forwarded-For; 0 ignores the header
+# and uses the peer address. Vercel sets VERCEL and puts the client address in the header,
+# so the default there is 1. Behind any other proxy or load balancer set this to the number
+# of proxies: left at 0, every client has the proxy's address and all of them share one
+# address bucket (RATE_LIMIT_SESSIONS_PER_ADDRESS visitors' worth of requests)
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1" if os.getenv("VERCEL") else "0"))
+
+class Overloaded(Exception):
+    """
+    Raised when a request cannot get an LLM slot: the queue is full or the wait timed out.
+    """
+
+class AdmissionGate:
+    """
+    Bounded concurrency with a bounded FIFO queue. A released slot is handed straight
+    to the oldest waiter; requests beyond the queue or waiting longer than the queue
+    timeout raise Overloaded so the caller can degrade instead of piling up.
+    """
+
+    def __init__(self, limit, max_queue, queue_timeout):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.max_queue_depth = 0
+        self.wait_times = deque(maxlen=1000)
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            self.wait_times.append(0.0)
+            observe_stage(0.0, "admission_wait")
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.shed += 1
+            raise Overloaded("queue full")
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self.queued += 1
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as this waiter gave up, pass it on
+                self.release()
+            else:
+                self._waiters.remove(future)
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed += 1
+                raise Overloaded(f"no slot within {self.queue_timeout}s") from None
+            raise
+        self.admitted += 1
+        self.wait_times.append(time.monotonic() - started)
+        observe_stage(self.wait_times[-1], "admission_wait")
+
+    def release(self):
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        waits = list(self.wait_times)
         return {
-            "answer": "I apologize, but I'm having trouble processing your request at the moment. Please try again later or contact NAU directly for assistance.",
-            "sources": ["https://www.na.edu"]
+            "limit": self.limit,
+            "active": self.active,
+            "queue_depth": len(self._waiters),
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "wait_p50_ms": round(percentile(waits, 50) * 1000, 1),
+            "wait_p99_ms": round(percentile(waits, 99) * 1000, 1)
         }
 
-@app.route('/')
-def index():
-    return send_from_directory('static', 'index.html')
+# Gate in front of every LLM-answered chat request
+chat_gate = AdmissionGate(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT)
 
-@app.route('/<path:path>')
-def static_files(path):
-    return send_from_directory('static', path)
+class RateLimiter:
+    """
+    Token bucket per client key, refilled continuously. Buckets of the least
+    recently seen clients are dropped once max_clients is reached.
+    """
 
-@app.route('/api/chat', methods=['POST'])
-async def chat():
+    def __init__(self, per_minute, burst, max_clients=10000):
+        self.rate = per_minute / 60.0
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.limited = 0
+
+    def check(self, key):
+        """
+        Returns 0 when the request may proceed, otherwise the seconds until it may retry.
+        """
+        return RateLimiter.check_all([(self, key)])
+
+    @staticmethod
+    def check_all(buckets):
+        """
+        Takes a token from every (limiter, key) bucket, or from none of them when any is
+        empty, so a request one bucket rejects costs the others nothing. Returns 0 when
+        the request may proceed, otherwise the seconds until it may retry. Callers list
+        the limiters in one fixed order, which is the order their locks are taken in.
+        """
+        buckets = [(limiter, key) for limiter, key in buckets if limiter.rate > 0]
+        if not buckets:
+            return 0
+        now = time.monotonic()
+        with contextlib.ExitStack() as stack:
+            for limiter, key in buckets:
+                stack.enter_context(limiter._lock)
+            levels = [limiter._refill(key, now) for limiter, key in buckets]
+            allowed = all(tokens >= 1 for tokens in levels)
+            retry_after = 0
+            for (limiter, key), tokens in zip(buckets, levels):
+                limiter._store(key, tokens - 1 if allowed else tokens, now)
+                if tokens < 1:
+                    limiter.limited += 1
+                    retry_after = max(retry_after, (1 - tokens) / limiter.rate)
+            return retry_after
+
+    def _refill(self, key, now):
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def _store(self, key, tokens, now):
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+
+    def stats(self):
+        return {"clients": len(self._buckets), "limited": self.limited}
+
+chat_rate_limiter = RateLimiter(RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST)
+address_rate_limiter = RateLimiter(RATE_LIMIT_PER_MINUTE * RATE_LIMIT_SESSIONS_PER_ADDRESS,
+                                   RATE_LIMIT_BURST * RATE_LIMIT_SESSIONS_PER_ADDRESS)
+
+def client_address(forwarded_for, remote_addr):
+    """
+    The peer address, or behind TRUSTED_PROXY_HOPS proxies the hop the outermost of them
+    recorded. Hops to the left of it are whatever the client sent and are ignored.
+    """
+    hops = [hop.strip() for hop in (forwarded_for or "").split(",") if hop.strip()]
+    if TRUSTED_PROXY_HOPS > 0 and len(hops) >= TRUSTED_PROXY_HOPS:
+        return hops[-TRUSTED_PROXY_HOPS]
+    return remote_addr or "unknown"
+
+def check_rate_limit(data, forwarded_for, remote_addr):
+    """
+    Returns 0 when the request may proceed, otherwise the seconds until it may retry.
+    Clients are keyed on their address. The session id the web client sends only splits
+    that address's allowance into per-visitor sub-buckets, so rotating it never gets
+    more than the address's own bucket.
+    """
+    address = client_address(forwarded_for, remote_addr)
+    session_id = data.get("session_id")
+    if not (isinstance(session_id, str) and session_id):
+        return chat_rate_limiter.check(f"ip:{address}")
+    return RateLimiter.check_all([(address_rate_limiter, f"ip:{address}"),
+                                  (chat_rate_limiter, f"session:{address}:{session_id[:64]}")])
+
+def rate_limited_payload(retry_after):
+    return {
+        "error": "Too many requests. Please wait a moment and try again.",
+        "retry_after": int(retry_after) + 1
+    }
+
+# Notices prepended to knowledge-base-only answers: while the LLM queue is saturated,
+# and when every LLM tier failed or is behind an open circuit
+OVERLOAD_NOTICE = "We're handling a lot of questions right now, so here is the closest information from our knowledge base:"
+UNAVAILABLE_NOTICE = "I can't reach our full answer service right now, so here is the closest information from our knowledge base:"
+
+# Degraded answer when the knowledge base has nothing relevant to fall back on
+DEGRADED_NO_MATCH_ANSWER = "Our assistant is temporarily unavailable. Please try again in a few minutes, or contact NAU directly for help with your question."
+
+def degraded_answer(query, notice=OVERLOAD_NOTICE):
+    """
+    Knowledge-base-only answer for requests shed by the admission gate or that no LLM tier could answer.
+    A canned message stands in when no passage is relevant, rather than an unrelated one.
+    """
+    results = get_knowledge_index().search(query, top_k=1)
+    if not results or results[0][2] < KB_CONTEXT_CONFIDENCE:
+        return {"answer": DEGRADED_NO_MATCH_ANSWER, "sources": ["https://www.na.edu"], "degraded": True}
+    document = results[0][0]
+    return {
+        "answer": f"{notice}\n\n{clean_response_format(document['content'])}",
+        "sources": [document["source"]],
+        "degraded": True
+    }
+
+# Validate a chat payload and answer it locally when possible
+def handle_chat_locally(data):
+    """
+    Returns a (response, status_code) tuple; response is the Route from answer_locally
+    when the query needs an LLM call.
+    """
     try:
-        data = request.json
         query = data.get('query', '')
         follow_up_to = data.get('follow_up_to', None)
         original_question = data.get('original_question', '')
         
-        logger.info(f"Received chat request - query: {query}, follow_up_to: {follow_up_to}")
+        logger.debug(f"Received chat request - query: {query}, follow_up_to: {follow_up_to}")
         
         if not query:
-            return jsonify({"error": "Query is required"}), 400
-            
-        # If this is a follow-up response
-        if follow_up_to and original_question:
-            logger.info(f"Processing follow-up response to: {follow_up_to}")
-            
-            predefined = get_predefined_answer(original_question)
-            if predefined and "follow_up" in predefined:
-                answer = process_follow_up_response(predefined["follow_up"], query)
-                sources = predefined.get("sources", ["https://www.na.edu"])
-
-                # Clean answer
-                answer = clean_response_format(answer)
-
-                return jsonify({
-                    "answer": answer,
-                    "sources": sources
-                })
-        
-        # Check for predefined answers first
-        predefined = get_predefined_answer(query)
-        if predefined:
-            answer = predefined["answer"]
-            sources = predefined["sources"]
-
-            # Clean answer
-            answer = clean_response_format(answer)
-
-            logger.info("Using predefined answer")
-            response_data = {
-                "answer": answer,
-                "sources": sources
-            }
+            return {"error": "Query is required"}, 400
 
-            if "follow_up" in predefined:
-                follow_up = predefined["follow_up"]["question"]
-                follow_up_id = f"followup_{int(time.time())}"
-                response_data["follow_up"] = follow_up
-                response_data["follow_up_id"] = follow_up_id
-                response_data["original_question"] = query
+        return answer_locally(query, follow_up_to, original_question), 200
+    
+    except Exception as e:
+        import traceback
+        logger.error(f"Error processing query: {str(e)}")
+        logger.error(traceback.format_exc())
+        count_answer("error")
+        return {"error": f"Server error: {str(e)}"}, 500
 
-            return jsonify(response_data)
-        
+async def handle_chat_with_llm(data, route=None):
+    stored = await stored_answer(data['query'])
+    if stored:
+        return stored, 200
+
+    started = time.perf_counter()
+    CHAT_IN_FLIGHT.inc("llm")
+    try:
+        async with chat_gate.slot():
+            return await answer_with_llm(data['query'], route=route), 200
+    except Overloaded as e:
+        logger.warning(f"Shedding LLM request ({str(e)}), answering from the knowledge base")
+        count_answer("degraded")
+        return degraded_answer(data['query']), 200
+    except Exception as e:
+        import traceback
+        logger.error(f"Error processing query: {str(e)}")
+        logger.error(traceback.format_exc())
+        count_answer("error")
+        return {"error": f"Server error: {str(e)}"}, 500
+    finally:
+        CHAT_IN_FLIGHT.dec("llm")
+        observe_stage(time.perf_counter() - started, "llm")
+
+def response_payload(response):
+    return response.payload if isinstance(response, PrecomputedResponse) else response
+
+def accepts_encoding(accept_encoding, coding):
+    for offered in accept_encoding.split(","):
+        name, _, params = offered.strip().partition(";")
+        if name.strip().lower() == coding:
+            return params.replace(" ", "").lower() not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def format_sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode("utf-8")
+
+# Streaming variant of handle_chat for requests that opt in with "stream": true
+async def stream_chat(data):
+    """
+    Async generator of Server-Sent Events.
+    Emits "chunk" events with cleaned text as the model produces it, then one
+    "done" event carrying the full cleaned answer, sources and follow-up metadata.
+    If the upstream fails after text was sent, a "truncated" event carrying the
+    partial answer and a note takes the place of "done". The caller validates the query before the stream starts.
+    """
+    query = data.get('query', '')
+    follow_up_to = data.get('follow_up_to', None)
+    original_question = data.get('original_question', '')
+
+    logger.debug(f"Received streaming chat request - query: {query}, follow_up_to: {follow_up_to}")
+
+    try:
+        response_data = response_payload(answer_locally(query, follow_up_to, original_question))
+    except Exception as e:
+        logger.error(f"Error processing query: {str(e)}")
+        count_answer("error")
+        response_data = {"error": f"Server error: {str(e)}"}
+    if not isinstance(response_data, Route):
+        if "answer" in response_data:
+            yield format_sse("chunk", {"text": response_data["answer"]})
+        yield format_sse("done", response_data)
+        return
+
+    route = response_data
+    stored = await stored_answer(query)
+    if stored:
+        yield format_sse("chunk", {"text": stored["answer"]})
+        yield format_sse("done", stored)
+        return
+
+    started = time.perf_counter()
+    CHAT_IN_FLIGHT.inc("stream")
+    try:
+        async with chat_gate.slot():
+            async for event in stream_llm_answer(query, route):
+                yield event
+    except Overloaded as e:
+        logger.warning(f"Shedding streaming LLM request ({str(e)}), answering from the knowledge base")
+        count_answer("degraded")
+        response_data = degraded_answer(query)
+        yield format_sse("chunk", {"text": response_data["answer"]})
+        yield format_sse("done", response_data)
+    finally:
+        CHAT_IN_FLIGHT.dec("stream")
+        observe_stage(time.perf_counter() - started, "stream")
+
+# Stream an LLM answer as Server-Sent Events, falling back to the other tiers on failure
+async def stream_llm_answer(query, route=None):
+    route = route or route_query(query)
+    if route.kind == "knowledge_base":
+        # The knowledge-base tier isn't streamed; its answer is short and arrives quickly
+        response_data = await answer_with_llm(query, route=route)
+        yield format_sse("chunk", {"text": response_data["answer"]})
+        yield format_sse("done", response_data)
+        return
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + CHAT_LATENCY_BUDGET
+    cleaner = StreamingCleaner()
+    raw_parts = []
+    sources = ["https://www.na.edu"]
+    # Closed explicitly so an abandoned stream stops the upstream call right away
+    events = stream_web_search(query, route.context_size)
+    first = None
+
+    def first_event():
+        # Waiting for the first chunk races the other tiers the way a whole search does,
+        # so a slow start is hedged after HEDGE_DELAY and bounded by the latency budget
+        nonlocal first
+        first = asyncio.ensure_future(events.__anext__())
+        return first
+
+    try:
+        logger.info(f"No local answer found, using the {route.kind} route ({route.reason})...")
+        result, tier = await answer_with_fallbacks(query, route=route, search_call=first_event)
+        if tier != "web_search":
+            # Another tier won, or none did: send its whole answer at once
+            response_data = finish_llm_answer(query, result, tier)
+            yield format_sse("chunk", {"text": response_data["answer"]})
+            yield format_sse("done", response_data)
+            return
+
+        event = result
+        while True:
+            kind, value = event
+            if kind == "delta":
+                raw_parts.append(value)
+                text = cleaner.feed(value)
+                if text:
+                    yield format_sse("chunk", {"text": text})
+            else:
+                sources = value
+            # The rest of the stream has to fit in what is left of the budget
+            try:
+                event = await asyncio.wait_for(events.__anext__(), max(0.0, deadline - loop.time()))
+            except StopAsyncIteration:
+                break
+    except Exception as api_error:
+        if isinstance(api_error, asyncio.TimeoutError):
+            logger.error("Latency budget exhausted while streaming the web search answer")
+            CANCELLED_REQUESTS_TOTAL.inc("timeout")
         else:
-            # No predefined answer, use OpenAI web search
-            logger.info("No predefined answer found, using web search...")
-            
+            logger.error(f"Streaming web search error: {str(api_error)}")
+
+        # Part of the answer is already on screen: finish it with a note, but don't cache
+        # it or count it as a web search answer
+        text = cleaner.flush()
+        if text:
+            yield format_sse("chunk", {"text": text})
+        count_answer("truncated")
+        answer = clean_response_format("".join(raw_parts))
+        yield format_sse("truncated", {"answer": f"{answer}\n\n{TRUNCATED_ANSWER_NOTE}".strip(), "sources": sources, "truncated": True})
+        return
+    finally:
+        if first is not None and not first.done():
+            first.cancel()
+            await asyncio.wait([first])
+        await events.aclose()
+
+    text = cleaner.flush()
+    if text:
+        yield format_sse("chunk", {"text": text})
+    count_answer("web_search")
+
+    started = time.perf_counter()
+    answer = clean_response_format("".join(raw_parts))
+    observe_stage(time.perf_counter() - started, "clean_response")
+    if answer:
+        remember_answer(query, {"answer": answer, "sources": sources})
+    yield format_sse("done", {"answer": answer, "sources": sources})
+
+# Batch requests: most queries accepted in one request, and how many of them may wait
+# on the LLM at once so a single batch can't take every admission slot
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "100"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Content type of the newline-delimited JSON stream returned by the batch endpoint
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+def batch_items(data):
+    """
+    Returns the list of chat payloads in a batch request, or an error message.
+    Each item is a query string or an object shaped like an /api/chat body.
+    """
+    queries = data.get("queries")
+    if not isinstance(queries, list) or not queries:
+        return None, "queries must be a non-empty list"
+    if len(queries) > BATCH_MAX_QUERIES:
+        return None, f"At most {BATCH_MAX_QUERIES} queries per batch"
+    items = []
+    for item in queries:
+        if isinstance(item, str):
+            item = {"query": item}
+        items.append(item if isinstance(item, dict) else {})
+    return items, None
+
+def format_ndjson(index, payload, status):
+    return (json.dumps(dict(payload, index=index, status=status)) + "\n").encode("utf-8")
+
+# Answer many queries in one request, streaming each result as soon as it is ready
+async def stream_batch(items, charge=None):
+    """
+    Async generator of NDJSON lines, one per item, tagged with the item's index and
+    status. Local answers are sent first; the rest are deduplicated by cache key and
+    sent to the LLM path with at most BATCH_CONCURRENCY in flight, in completion order.
+    The request itself was charged like one chat request, which covers the local answers
+    and the first LLM-bound query. Each further one costs charge() another request of the
+    client's rate-limit budget; once that runs out the rest are answered with status 429.
+    """
+    logger.debug(f"Received batch chat request with {len(items)} queries")
+    pending = {}
+    for index, item in enumerate(items):
+        query = item.get("query")
+        if not isinstance(query, str) or not query:
+            yield format_ndjson(index, {"error": "Query is required"}, 400)
+            continue
+        response, status = handle_chat_locally(item)
+        if not isinstance(response, Route):
+            yield format_ndjson(index, response_payload(response), status)
+            continue
+        key = normalize_query(query) or query.lower().strip()
+        pending.setdefault(key, (query, response, []))[2].append(index)
+
+    if charge is not None:
+        retry_after = 0
+        for key in list(pending)[1:]:
+            retry_after = retry_after or charge()
+            if retry_after:
+                for index in pending.pop(key)[2]:
+                    yield format_ndjson(index, rate_limited_payload(retry_after), 429)
+
+    if not pending:
+        return
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def answer(query, route, indexes):
+        async with semaphore:
+            response, status = await handle_chat_with_llm({"query": query}, route)
+        return indexes, response, status
+
+    tasks = [asyncio.ensure_future(answer(query, route, indexes)) for query, route, indexes in pending.values()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            indexes, response, status = await next_done
+            for index in indexes:
+                yield format_ndjson(index, response, status)
+    finally:
+        # The client went away or the stream was closed early: stop the remaining work
+        for task in tasks:
+            task.cancel()
+
+# Characters of the user's query kept in the request summary record
+LOG_QUERY_CHARS = int(os.getenv("LOG_QUERY_CHARS", "100"))
+
+def annotate_chat_request(data):
+    annotate_request(query=str(data.get("query", ""))[:LOG_QUERY_CHARS], follow_up=bool(data.get("follow_up_to")),
+                     stream=bool(data.get("stream")))
+
+def flask_request_log(route):
+    """
+    Runs a Flask view as one logged request: sets the current request, echoes the
+    X-Request-ID header and writes the summary record once the body has been sent.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            request_log = RequestLog(route, incoming_request_id(request.headers.get("X-Request-ID")))
+            token = current_request.set(request_log)
+            try:
+                response = app.make_response(view(*args, **kwargs))
+            except Exception:
+                request_log.finish(500)
+                raise
+            finally:
+                current_request.reset(token)
+            response.headers["X-Request-ID"] = request_log.request_id
+            if response.is_streamed:
+                response.response = stream_in_request(response.response, request_log, response.status_code)
+            else:
+                request_log.finish(response.status_code)
+            return response
+        return wrapper
+    return decorator
+
+def stream_in_request(chunks, request_log, status):
+    # A streamed WSGI body is produced after the view returned, so set the request again
+    current_request.set(request_log)
+    try:
+        yield from chunks
+    except GeneratorExit:
+        # The server closed the body early because the client went away
+        status = 499
+        annotate_request(cancelled="disconnect")
+        raise
+    finally:
+        current_request.set(None)
+        request_log.finish(status)
+
+def asgi_request_log(route):
+    """
+    ASGI counterpart of flask_request_log; the status is read from the response start message.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(scope, receive, send):
+            if scope["method"] == "OPTIONS":
+                await handler(scope, receive, send)
+                return
+
+            request_id = dict(scope.get("headers", [])).get(b"x-request-id", b"").decode("latin-1")
+            request_log = RequestLog(route, incoming_request_id(request_id))
+            status = 500
+
+            async def send_with_request_id(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    headers = list(message.get("headers", [])) + [(b"x-request-id", request_log.request_id.encode("ascii"))]
+                    message = dict(message, headers=headers)
+                await send(message)
+
+            token = current_request.set(request_log)
             try:
-                search_result = await search_web_with_openai(query)
-                answer = search_result["answer"]
-                sources = search_result["sources"]
+                await handler(scope, receive, send_with_request_id)
+            except ClientDisconnected:
+                # Logged with nginx's "client closed request" status; there is no one to respond to
+                status = 499
+                annotate_request(cancelled="disconnect")
+            finally:
+                current_request.reset(token)
+                request_log.finish(status)
+        return wrapper
+    return decorator
+
+# Response headers for Server-Sent Events, shared by both server modes
+SSE_HEADERS = {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
 
-                # Clean answer
-                answer = clean_response_format(answer)
+@app.route('/api/chat', methods=['POST'])
+@flask_request_log('/api/chat')
+def chat():
+    # WSGI compatibility shim (Vercel): run the handler on the shared event loop
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON body"}), 400
+    annotate_chat_request(data)
+
+    retry_after = check_rate_limit(data, request.headers.get("X-Forwarded-For"), request.remote_addr)
+    if retry_after:
+        payload = rate_limited_payload(retry_after)
+        return jsonify(payload), 429, {"Retry-After": str(payload["retry_after"])}
+
+    if data.get('stream'):
+        if not data.get('query'):
+            return jsonify({"error": "Query is required"}), 400
+        return Response(iterate_async(stream_chat(data)), headers=SSE_HEADERS)
+
+    response_data, status = handle_chat_locally(data)
+    if isinstance(response_data, Route):
+        response_data, status = run_async(handle_chat_with_llm(data, response_data))
+
+    if isinstance(response_data, PrecomputedResponse):
+        return precomputed_flask_response(response_data)
+    return jsonify(response_data), status
+
+@app.route('/api/chat/batch', methods=['POST'])
+@flask_request_log('/api/chat/batch')
+def chat_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON body"}), 400
+
+    items, error = batch_items(data)
+    if error:
+        return jsonify({"error": error}), 400
+    annotate_request(batch_size=len(items))
+
+    # The batch is charged as one request here and per further LLM-bound query while it
+    # runs; BATCH_CONCURRENCY bounds its upstream use
+    forwarded_for, remote_addr = request.headers.get("X-Forwarded-For"), request.remote_addr
+    retry_after = check_rate_limit(data, forwarded_for, remote_addr)
+    if retry_after:
+        payload = rate_limited_payload(retry_after)
+        return jsonify(payload), 429, {"Retry-After": str(payload["retry_after"])}
+
+    return Response(iterate_async(stream_batch(items, lambda: check_rate_limit(data, forwarded_for, remote_addr))),
+                    content_type=NDJSON_CONTENT_TYPE)
+
+# Circuit breaker and coalescing state, for watching routing decisions during incidents
+def upstream_status():
+    return {
+        "circuit_breakers": {model: breaker.snapshot() for model, breaker in circuit_breakers.items()},
+        "single_flight": upstream_calls.stats(),
+        "admission": chat_gate.stats(),
+        "rate_limiter": chat_rate_limiter.stats(),
+        "address_rate_limiter": address_rate_limiter.stats(),
+        "refresher": answer_refresher.stats(),
+        "follow_ups": follow_up_store.stats()
+    }
 
-                return jsonify({
-                    "answer": answer,
-                    "sources": sources
-                })
-            except Exception as api_error:
-                logger.error(f"Web search API error: {str(api_error)}")
+@app.route('/api/upstream', methods=['GET'])
+def upstream():
+    return jsonify(upstream_status())
+
+# Numeric value of each circuit breaker state for the state gauge
+CIRCUIT_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+# Metrics read from existing state when /metrics is scraped, so they cost nothing per request
+CallbackMetric("nau_admission_active", "LLM requests holding an admission slot", "gauge",
+               lambda: [((), chat_gate.active)])
+CallbackMetric("nau_admission_queue_depth", "LLM requests waiting for an admission slot", "gauge",
+               lambda: [((), len(chat_gate._waiters))])
+CallbackMetric("nau_admission_shed_total", "LLM requests shed to the knowledge base", "counter",
+               lambda: [((), chat_gate.shed)])
+CallbackMetric("nau_rate_limited_total", "Chat requests rejected by the per-client rate limit", "counter",
+               lambda: [((), chat_rate_limiter.limited + address_rate_limiter.limited)])
+CallbackMetric("nau_single_flight_coalesced_total", "Upstream calls coalesced into an identical in-flight call", "counter",
+               lambda: [((), upstream_calls.coalesced)])
+CallbackMetric("nau_answer_cache_entries", "Entries in the in-memory answer cache", "gauge",
+               lambda: [((), answer_cache.stats()["entries"])])
+CallbackMetric("nau_follow_up_sessions", "Open follow-up questions held in memory", "gauge",
+               lambda: [((), len(follow_up_store._states))])
+CallbackMetric("nau_stale_answers_total", "Expired answers to popular questions served while refreshing", "counter",
+               lambda: [((), answer_refresher.stale_served)])
+CallbackMetric("nau_refreshes_total", "Background refreshes of popular answers by outcome", "counter",
+               lambda: [(("refreshed",), answer_refresher.refreshed), (("failed",), answer_refresher.failed),
+                        (("skipped",), answer_refresher.skipped)],
+               ("outcome",))
+CallbackMetric("nau_answer_store_errors_total", "Failed reads and writes of the persistent answer store", "counter",
+               lambda: [((), answer_store.errors if answer_store is not None else 0)])
+CallbackMetric("nau_log_records_dropped_total", "Log records dropped because the writer thread fell behind", "counter",
+               lambda: [((), log_handler.dropped)])
+CallbackMetric("nau_faq_bundle_info", "Version of the FAQ bundle being served", "gauge",
+               lambda: [((faq_bundle.version, faq_bundle.digest), 1)],
+               ("version", "digest"))
+CallbackMetric("nau_faq_bundle_reloads_total", "Changed FAQ bundles swapped in or rejected by validation", "counter",
+               lambda: [(("applied",), faq_bundle_watcher.applied), (("rejected",), faq_bundle_watcher.rejected)],
+               ("outcome",))
+CallbackMetric("nau_circuit_state", "Circuit breaker state per model (0 closed, 1 half-open, 2 open)", "gauge",
+               lambda: [((model,), CIRCUIT_STATE_VALUES[breaker.state]) for model, breaker in list(circuit_breakers.items())],
+               ("model",))
+
+# Content type of the Prometheus text exposition format
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
+def precomputed_flask_response(response):
+    headers = {}
+    body = response.body
+    if response.gzip_body is not None:
+        headers["Vary"] = "Accept-Encoding"
+        if accepts_encoding(request.headers.get("Accept-Encoding", ""), "gzip"):
+            body = response.gzip_body
+            headers["Content-Encoding"] = "gzip"
+    return Response(body, status=200, mimetype="application/json", headers=headers)
+
+# Headers added to every native ASGI response, matching what flask_cors sends
+CORS_HEADERS = [(b"access-control-allow-origin", b"*")]
+
+async def read_asgi_body(receive):
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+async def send_asgi_json(send, payload, status=200, headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii"))
+        ] + list(headers) + CORS_HEADERS
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def send_asgi_precomputed(scope, send, response):
+    body = response.body
+    headers = [(b"content-type", b"application/json")]
+    if response.gzip_body is not None:
+        headers.append((b"vary", b"Accept-Encoding"))
+        accept_encoding = dict(scope.get("headers", [])).get(b"accept-encoding", b"")
+        if accepts_encoding(accept_encoding.decode("latin-1"), "gzip"):
+            body = response.gzip_body
+            headers.append((b"content-encoding", b"gzip"))
+    headers.append((b"content-length", str(len(body)).encode("ascii")))
+
+    await send({"type": "http.response.start", "status": 200, "headers": headers + CORS_HEADERS})
+    await send({"type": "http.response.body", "body": body})
+
+async def send_asgi_preflight(scope, send):
+    # CORS preflight for the POST endpoints
+    request_headers = dict(scope.get("headers", []))
+    headers = CORS_HEADERS + [(b"access-control-allow-methods", b"POST, OPTIONS")]
+    if b"access-control-request-headers" in request_headers:
+        headers.append((b"access-control-allow-headers", request_headers[b"access-control-request-headers"]))
+    await send({"type": "http.response.start", "status": 200, "headers": headers})
+    await send({"type": "http.response.body", "body": b""})
+
+class ClientDisconnected(Exception):
+    """
+    Raised instead of a response when the client went away before the answer was sent.
+    """
 
-                try:
-                    fallback_result = await fallback_response(query)
-                    answer = fallback_result["answer"]
-                    sources = fallback_result["sources"]
+async def wait_for_disconnect(receive):
+    # Once the body has been read, the next message the server sends is the disconnect
+    message = await receive()
+    if message["type"] != "http.disconnect":
+        # Not a spec-following server (e.g. a test driver replaying the body): never fire
+        await asyncio.Event().wait()
 
-                    # Clean answer
-                    answer = clean_response_format(answer)
+async def cancel_on_disconnect(receive, coro):
+    """
+    Run the rest of a request, cancelling it the moment the client disconnects so
+    its admission slot is freed and its upstream calls are aborted (single-flight
+    calls other requests still wait on keep running). Raises ClientDisconnected then.
+    Call it only after the body has been read, since it takes over receive().
+    """
+    work = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(wait_for_disconnect(receive))
+    try:
+        await asyncio.wait((work, watcher), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not work.done():
+            work.cancel()
+            # Let it unwind so its upstream calls are closed before the handler returns
+            await asyncio.wait((work,))
+    if work.cancelled():
+        CANCELLED_REQUESTS_TOTAL.inc("disconnect")
+        raise ClientDisconnected()
+    return work.result()
+
+@asgi_request_log('/api/chat')
+async def asgi_chat(scope, receive, send):
+    """
+    Native ASGI handler for /api/chat.
+    The chat coroutine runs directly on the server's event loop, with no thread per request.
+    """
+    method = scope["method"]
 
-                    return jsonify({
-                        "answer": answer,
-                        "sources": sources
-                    })
-                except Exception as fallback_error:
-                    logger.error(f"Fallback API error: {str(fallback_error)}")
-                    error_answer = "I apologize, but I'm having trouble processing your request at the moment. Please try again later or contact NAU directly for assistance."
-                    
-                    return jsonify({
-                        "answer": error_answer,
-                        "sources": ["https://www.na.edu"]
-                    })
-    
-    except Exception as e:
-        import traceback
-        logger.error(f"Error processing query: {str(e)}")
-        logger.error(traceback.format_exc())
-        return jsonify({"error": f"Server error: {str(e)}"}), 500
+    if method == "OPTIONS":
+        await send_asgi_preflight(scope, send)
+        return
+
+    if method != "POST":
+        await send_asgi_json(send, {"error": "Method not allowed"}, 405)
+        return
+
+    try:
+        data = json.loads(await read_asgi_body(receive) or b"null")
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        await send_asgi_json(send, {"error": "Invalid JSON body"}, 400)
+        return
+    annotate_chat_request(data)
+
+    request_headers = dict(scope.get("headers", []))
+    forwarded_for = request_headers.get(b"x-forwarded-for", b"").decode("latin-1")
+    remote_addr = scope["client"][0] if scope.get("client") else None
+    retry_after = check_rate_limit(data, forwarded_for, remote_addr)
+    if retry_after:
+        payload = rate_limited_payload(retry_after)
+        await send_asgi_json(send, payload, 429, [(b"retry-after", str(payload["retry_after"]).encode("ascii"))])
+        return
+
+    if data.get("stream"):
+        if not data.get("query"):
+            await send_asgi_json(send, {"error": "Query is required"}, 400)
+            return
+        headers = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in SSE_HEADERS.items()]
+        await send({"type": "http.response.start", "status": 200, "headers": headers + CORS_HEADERS})
+
+        async def send_events():
+            async for event in stream_chat(data):
+                await send({"type": "http.response.body", "body": event, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+
+        await cancel_on_disconnect(receive, send_events())
+        return
+
+    # Local answers are sent straight away; only LLM work is worth watching for a disconnect
+    response_data, status = handle_chat_locally(data)
+    if isinstance(response_data, Route):
+        response_data, status = await cancel_on_disconnect(receive, handle_chat_with_llm(data, response_data))
+    if isinstance(response_data, PrecomputedResponse):
+        await send_asgi_precomputed(scope, send, response_data)
+    else:
+        await send_asgi_json(send, response_data, status)
+
+@asgi_request_log('/api/chat/batch')
+async def asgi_chat_batch(scope, receive, send):
+    if scope["method"] == "OPTIONS":
+        await send_asgi_preflight(scope, send)
+        return
+
+    if scope["method"] != "POST":
+        await send_asgi_json(send, {"error": "Method not allowed"}, 405)
+        return
+
+    try:
+        data = json.loads(await read_asgi_body(receive) or b"null")
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        await send_asgi_json(send, {"error": "Invalid JSON body"}, 400)
+        return
+
+    items, error = batch_items(data)
+    if error:
+        await send_asgi_json(send, {"error": error}, 400)
+        return
+    annotate_request(batch_size=len(items))
+
+    request_headers = dict(scope.get("headers", []))
+    forwarded_for = request_headers.get(b"x-forwarded-for", b"").decode("latin-1")
+    remote_addr = scope["client"][0] if scope.get("client") else None
+    retry_after = check_rate_limit(data, forwarded_for, remote_addr)
+    if retry_after:
+        payload = rate_limited_payload(retry_after)
+        await send_asgi_json(send, payload, 429, [(b"retry-after", str(payload["retry_after"]).encode("ascii"))])
+        return
+
+    headers = [(b"content-type", NDJSON_CONTENT_TYPE.encode("ascii")), (b"cache-control", b"no-cache")]
+    await send({"type": "http.response.start", "status": 200, "headers": headers + CORS_HEADERS})
+
+    async def send_lines():
+        async for line in stream_batch(items, lambda: check_rate_limit(data, forwarded_for, remote_addr)):
+            await send({"type": "http.response.body", "body": line, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    await cancel_on_disconnect(receive, send_lines())
+
+async def asgi_upstream(scope, receive, send):
+    if scope["method"] != "GET":
+        await send_asgi_json(send, {"error": "Method not allowed"}, 405)
+        return
+    await send_asgi_json(send, upstream_status())
+
+async def asgi_metrics(scope, receive, send):
+    if scope["method"] != "GET":
+        await send_asgi_json(send, {"error": "Method not allowed"}, 405)
+        return
+    body = render_metrics().encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", METRICS_CONTENT_TYPE.encode("ascii")),
+            (b"content-length", str(len(body)).encode("ascii"))
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+# ASGI routes served natively; everything else falls through to the Flask app
+ASGI_ROUTES = {
+    "/api/chat": asgi_chat,
+    "/api/chat/batch": asgi_chat_batch,
+    "/api/upstream": asgi_upstream,
+    "/metrics": asgi_metrics
+}
+
+_wsgi_fallback = None
+
+def warm_retrieval():
+    """
+    Build the fuzzy intent scorer and the knowledge index ahead of the first request that
+    needs them; built lazily on the event loop, they would stall every request in flight.
+    """
+    if FUZZY_INTENT_THRESHOLD <= 1:
+        faq_bundle.fuzzy_scorer()
+    get_knowledge_index()
+
+async def asgi_app(scope, receive, send):
+    """
+    ASGI entry point (Hypercorn). API routes run natively on the server loop,
+    the remaining Flask routes are served through asgiref's WSGI adapter.
+    """
+    global _wsgi_fallback
+
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # Already warm in workers forked by serve.py; a worker thread either way
+                try:
+                    await asyncio.to_thread(warm_retrieval)
+                except Exception as e:
+                    logger.error(f"Warming retrieval state failed, it will be built on first use: {e}")
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if _openai_client is not None and _openai_client_pid == os.getpid():
+                    await _openai_client.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    handler = ASGI_ROUTES.get(scope.get("path")) if scope["type"] == "http" else None
+    if handler is not None:
+        await handler(scope, receive, send)
+        return
+
+    if _wsgi_fallback is None:
+        from asgiref.wsgi import WsgiToAsgi
+        _wsgi_fallback = WsgiToAsgi(app)
+    await _wsgi_fallback(scope, receive, send)
 
 
 if __name__ == '__main__':
     logger.info("Starting North American University AI Assistant with Web Search (No Chat Storage)")
-    # Use Hypercorn ASGI server which supports async
-    import hypercorn.asyncio
+    # Single-worker development server with the reloader; production runs serve.py
     import hypercorn.config
+    import hypercorn.run
     
     config = hypercorn.config.Config()
     config.bind = ["127.0.0.1:5000"]
+    config.application_path = "index:asgi_app"
+    config.errorlog = logging.getLogger("hypercorn.error")
     config.use_reloader = True
-    
-    asyncio.run(hypercorn.asyncio.serve(app, config))
\ No newline at end of file
+    hypercorn.run.run(config)
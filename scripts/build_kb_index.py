@@ -0,0 +1,37 @@
+"""
+Build the memory-mappable knowledge index used for local retrieval.
+
+Reads data/corpus/*.jsonl (see scripts/scrape_corpus.py) plus the built-in knowledge
+base and writes NumPy arrays and metadata to data/kb_index/. Workers load the arrays
+with mmap, so rebuild and redeploy whenever the corpus changes.
+
+Usage:
+    python scripts/build_kb_index.py
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-index-build")
+
+import index  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the local knowledge index")
+    parser.add_argument("--corpus", default=index.KB_CORPUS_DIR)
+    parser.add_argument("--output", default=index.KB_INDEX_DIR)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    documents = index.load_corpus(args.corpus)
+    knowledge_index = index.KnowledgeIndex.build(documents)
+    knowledge_index.save(args.output)
+    print(f"Indexed {len(documents)} passages, {len(knowledge_index.vocabulary)} terms "
+          f"in {time.perf_counter() - started:.2f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Build the optimized static bundle served to browsers.
+
+Reads static/index.html and writes static/dist/:
+- every <img> in index.html resized to twice its CSS size and saved as AVIF, WebP
+  and PNG under content-hashed names, with the tag rewritten to a <picture>
+- script.js copied to a content-hashed name
+- gzip and brotli copies of index.html and the script
+- manifest.json mapping each source file to what was built from it
+
+Hashed files never change content, so they are served with immutable caching;
+index.html keeps its name and is revalidated on every load. Rebuild and commit
+static/dist/ whenever index.html, script.js or an image changes.
+
+Needs Pillow (with AVIF support, Pillow >= 11.3) and, for .br copies, Brotli:
+    pip install Pillow Brotli
+Usage:
+    python scripts/build_static.py
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+
+from PIL import Image, features
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT, "static")
+
+# Images are rendered at this multiple of their CSS size for high-density screens
+PIXEL_DENSITY = 2
+WEBP_QUALITY = 80
+AVIF_QUALITY = 60
+
+IMG_TAG = re.compile(r'<img\s[^>]*?src="([^"]+)"[^>]*?/?>', re.S)
+SCRIPT_TAG = re.compile(r'<script src="\./script\.js"></script>')
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def slugify(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def css_size(tag):
+    """
+    Width and height in CSS pixels from the tag's inline style; None when not set.
+    """
+    style = re.search(r'style="([^"]*)"', tag)
+    style = style.group(1) if style else ""
+    width = re.search(r"(?<![-\w])width:\s*(\d+)px", style)
+    height = re.search(r"(?<![-\w])height:\s*(\d+)px", style)
+    return (int(width.group(1)) if width else None, int(height.group(1)) if height else None)
+
+
+def resize(image, width, height):
+    """
+    Scale to PIXEL_DENSITY times the CSS size. With both sides set the image is
+    cropped to fill the box, like object-fit: cover; with one side the aspect ratio is kept.
+    """
+    if width and height:
+        target = (width * PIXEL_DENSITY, height * PIXEL_DENSITY)
+        scale = max(target[0] / image.width, target[1] / image.height)
+        scaled = image.resize((round(image.width * scale), round(image.height * scale)), Image.LANCZOS)
+        left = (scaled.width - target[0]) // 2
+        top = (scaled.height - target[1]) // 2
+        return scaled.crop((left, top, left + target[0], top + target[1]))
+    if height:
+        target_height = height * PIXEL_DENSITY
+        return image.resize((round(image.width * target_height / image.height), target_height), Image.LANCZOS)
+    if width:
+        target_width = width * PIXEL_DENSITY
+        return image.resize((target_width, round(image.height * target_width / image.width)), Image.LANCZOS)
+    return image
+
+
+def encode(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == "AVIF":
+        image.save(buffer, "AVIF", quality=AVIF_QUALITY)
+    elif image_format == "WEBP":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=6)
+    else:
+        image.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def write_hashed(output_dir, relative_stem, extension, data):
+    relative_path = f"{relative_stem}.{content_hash(data)}.{extension}"
+    path = os.path.join(output_dir, relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return relative_path
+
+
+def write_compressed(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    # mtime=0 keeps the .gz byte-identical between builds of the same input
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def build_image(tag, source, output_dir, manifest):
+    source_path = os.path.join(STATIC_DIR, source)
+    width, height = css_size(tag)
+    with Image.open(source_path) as original:
+        image = resize(original.convert("RGBA"), width, height)
+
+    stem = os.path.join(os.path.dirname(source), slugify(os.path.splitext(os.path.basename(source))[0]))
+    variants = {}
+    for image_format, extension in (("AVIF", "avif"), ("WEBP", "webp"), ("PNG", "png")):
+        if image_format == "AVIF" and not features.check("avif"):
+            continue
+        variants[extension] = write_hashed(output_dir, stem, extension, encode(image, image_format))
+
+    manifest[source] = {
+        "source_bytes": os.path.getsize(source_path),
+        "size": [image.width, image.height],
+        "variants": {extension: {"path": path, "bytes": os.path.getsize(os.path.join(output_dir, path))}
+                     for extension, path in variants.items()}
+    }
+
+    # Keep the original attributes on the <img> fallback, pointing it at the resized PNG
+    img = tag.replace(f'src="{tag_src(tag)}"', f'src="./{variants["png"]}" width="{image.width // PIXEL_DENSITY}" '
+                                               f'height="{image.height // PIXEL_DENSITY}"', 1)
+    sources = "".join(f'<source srcset="./{variants[extension]}" type="image/{extension}" />'
+                      for extension in ("avif", "webp") if extension in variants)
+    return f"<picture>{sources}{img}</picture>"
+
+
+def tag_src(tag):
+    return IMG_TAG.match(tag).group(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the optimized static bundle")
+    parser.add_argument("--output", default=os.path.join(STATIC_DIR, "dist"))
+    args = parser.parse_args()
+
+    # Start clean so files from earlier builds don't pile up under old hashes
+    shutil.rmtree(args.output, ignore_errors=True)
+    os.makedirs(args.output)
+    manifest = {}
+
+    with open(os.path.join(STATIC_DIR, "script.js"), "rb") as f:
+        script = f.read()
+    script_path = write_hashed(args.output, "script", "js", script)
+    write_compressed(os.path.join(args.output, script_path))
+    manifest["script.js"] = {"source_bytes": len(script), "path": script_path}
+
+    with open(os.path.join(STATIC_DIR, "index.html"), "r", encoding="utf-8") as f:
+        html = f.read()
+
+    def replace_image(match):
+        source = match.group(1).replace("\\", "/")
+        source = source[2:] if source.startswith("./") else source
+        return build_image(match.group(0), source, args.output, manifest)
+
+    html = IMG_TAG.sub(replace_image, html)
+    html, count = SCRIPT_TAG.subn(f'<script src="./{script_path}"></script>', html)
+    if count != 1:
+        raise SystemExit("index.html must load ./script.js exactly once")
+
+    index_path = os.path.join(args.output, "index.html")
+    with open(index_path, "w", encoding="utf-8") as f:
+        f.write(html)
+    write_compressed(index_path)
+
+    with open(os.path.join(args.output, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+
+    for source, entry in manifest.items():
+        built = sum(variant["bytes"] for variant in entry["variants"].values()) if "variants" in entry else None
+        print(f"{source}: {entry['source_bytes']} bytes" + (f" -> {built} bytes in all variants" if built else ""))
+
+
+if __name__ == "__main__":
+    main()
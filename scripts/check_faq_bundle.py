@@ -0,0 +1,58 @@
+"""
+Validate an FAQ bundle and optionally install it for running workers to pick up.
+
+Runs the same validation and compile step as a reload, so a bundle that passes here
+will be accepted by the watcher. With --install the bundle is copied next to the live
+one and renamed over it, so workers polling the file never read a partial write.
+
+Usage:
+    python scripts/check_faq_bundle.py
+    python scripts/check_faq_bundle.py new_bundle.json --install
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-bundle-check")
+os.environ.setdefault("FAQ_BUNDLE_POLL_INTERVAL", "0")
+
+import index  # noqa: E402
+
+
+def install(source, target):
+    with open(source, "rb") as f:
+        data = f.read()
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".faq_bundle.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, target)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate an FAQ bundle")
+    parser.add_argument("bundle", nargs="?", default=index.FAQ_BUNDLE_PATH)
+    parser.add_argument("--install", action="store_true", help=f"replace {index.FAQ_BUNDLE_PATH} with the bundle")
+    args = parser.parse_args()
+
+    try:
+        bundle = index.load_faq_bundle(args.bundle)
+    except (OSError, index.FaqBundleError) as e:
+        raise SystemExit(f"{args.bundle}: invalid bundle: {e}")
+
+    phrasings = sum(len(patterns) for patterns in bundle.exact_matches.values())
+    print(f"{args.bundle}: version {bundle.version} ({bundle.digest}), {len(bundle.answers)} answers, "
+          f"{phrasings} phrasings, {len(bundle.responses)} prebuilt responses")
+
+    if args.install and os.path.abspath(args.bundle) != os.path.abspath(index.FAQ_BUNDLE_PATH):
+        install(args.bundle, index.FAQ_BUNDLE_PATH)
+        print(f"Installed as {index.FAQ_BUNDLE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
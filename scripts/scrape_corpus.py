@@ -0,0 +1,95 @@
+"""
+Fetch na.edu pages and save their visible text as a retrieval corpus.
+
+Each page becomes one {"url", "title", "content"} line in data/corpus/na_edu.jsonl,
+which scripts/build_kb_index.py turns into the local knowledge index.
+
+Usage:
+    python scripts/scrape_corpus.py https://www.na.edu/admissions/ https://www.na.edu/campus-life/housing/
+    python scripts/scrape_corpus.py --urls-file urls.txt
+"""
+import argparse
+import json
+import os
+import re
+from html.parser import HTMLParser
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join(ROOT, "data", "corpus", "na_edu.jsonl")
+
+# Elements whose text is page chrome rather than content
+SKIPPED_TAGS = {"script", "style", "noscript", "nav", "header", "footer", "form", "svg"}
+BLOCK_TAGS = {"p", "div", "section", "article", "li", "h1", "h2", "h3", "h4", "h5", "h6", "tr", "br"}
+
+
+class TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.title = ""
+        self.parts = []
+        self._skip_depth = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag == "title":
+            self._in_title = False
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self.parts.append(data)
+
+    def text(self):
+        text = re.sub(r'[ \t\r\f\v]+', ' ', "".join(self.parts))
+        return re.sub(r'\n\s*\n+', '\n\n', text).strip()
+
+
+def scrape(url):
+    response = requests.get(url, timeout=30, headers={"User-Agent": "NAU-Assistant-corpus-builder"})
+    response.raise_for_status()
+    extractor = TextExtractor()
+    extractor.feed(response.text)
+    return {"url": url, "title": extractor.title.strip(), "content": extractor.text()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape na.edu pages into a retrieval corpus")
+    parser.add_argument("urls", nargs="*")
+    parser.add_argument("--urls-file", help="file with one URL per line")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    urls = list(args.urls)
+    if args.urls_file:
+        with open(args.urls_file, encoding="utf-8") as urls_file:
+            urls += [line.strip() for line in urls_file if line.strip() and not line.startswith("#")]
+    if not urls:
+        parser.error("no URLs given")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as output:
+        for url in urls:
+            try:
+                page = scrape(url)
+            except requests.RequestException as e:
+                print(f"Skipping {url}: {e}")
+                continue
+            output.write(json.dumps(page) + "\n")
+            print(f"Saved {url} ({len(page['content'])} characters)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Production server for the assistant: Hypercorn serving index:asgi_app from several
+worker processes that share one listening socket.
+
+The parent imports the app and warms its read-only state (FAQ bundle and fuzzy
+scorer, knowledge index, the OpenAI SDK modules) before forking, so workers start
+warm and share those pages copy-on-write instead of each building its own copy.
+Per-process state (event loops, the OpenAI client, the answer store connection,
+log and bundle watcher threads) is already recreated after a fork by index.py.
+
+SIGTERM or SIGINT stops accepting connections in every worker and lets in-flight
+requests finish for up to GRACEFUL_TIMEOUT seconds. Workers that exit unexpectedly
+(or after SERVER_MAX_REQUESTS requests) are replaced.
+
+`python index.py` remains the single-process development server with the reloader.
+
+Usage:
+    WEB_CONCURRENCY=4 PORT=8000 python serve.py
+"""
+import gc
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import sys
+import threading
+import time
+
+import hypercorn.config
+
+# Worker processes; defaults to one per CPU
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+
+# Address to listen on
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "5000"))
+
+# "uvloop" or "asyncio"; empty picks uvloop when it is installed
+SERVER_WORKER_CLASS = os.getenv("SERVER_WORKER_CLASS", "")
+
+# Idle keep-alive connections are held longer than the usual 60s load balancer idle
+# timeout, so the balancer closes them first and never reuses one we just closed
+KEEP_ALIVE_TIMEOUT = float(os.getenv("KEEP_ALIVE_TIMEOUT", "75"))
+KEEP_ALIVE_MAX_REQUESTS = int(os.getenv("KEEP_ALIVE_MAX_REQUESTS", "10000"))
+
+# HTTP/2 streams per connection; h2c works in cleartext, browsers need TLS (SSL_CERTFILE)
+H2_MAX_CONCURRENT_STREAMS = int(os.getenv("H2_MAX_CONCURRENT_STREAMS", "100"))
+SSL_CERTFILE = os.getenv("SSL_CERTFILE")
+SSL_KEYFILE = os.getenv("SSL_KEYFILE")
+
+# Seconds in-flight requests get to finish on shutdown; covers a full CHAT_LATENCY_BUDGET
+GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "30"))
+
+# Pending connections per listening socket
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+
+# Recycle a worker after this many requests (0 keeps workers for the life of the server)
+SERVER_MAX_REQUESTS = int(os.getenv("SERVER_MAX_REQUESTS", "0"))
+
+# A worker that dies this soon after starting is treated as a startup failure, not respawned
+WORKER_STARTUP_SECONDS = 5
+
+logger = logging.getLogger("serve")
+
+
+def preload():
+    """
+    Import the app and build its shared read-only state in the parent, before forking.
+    """
+    import index
+    import httpx  # noqa: F401
+    import openai  # noqa: F401
+
+    started = time.perf_counter()
+    index.warm_retrieval()
+    # Move everything loaded so far out of the collector's reach, so collections in the
+    # workers don't write to (and unshare) the pages they inherited
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded app state in {time.perf_counter() - started:.2f}s")
+    return index
+
+
+def worker_class():
+    if SERVER_WORKER_CLASS:
+        return SERVER_WORKER_CLASS
+    try:
+        import uvloop  # noqa: F401
+    except ImportError:
+        return "asyncio"
+    return "uvloop"
+
+
+def build_config():
+    config = hypercorn.config.Config()
+    config.application_path = "index:asgi_app"
+    config.bind = [f"{HOST}:{PORT}"]
+    config.workers = WEB_CONCURRENCY
+    config.worker_class = worker_class()
+    config.keep_alive_timeout = KEEP_ALIVE_TIMEOUT
+    config.keep_alive_max_requests = KEEP_ALIVE_MAX_REQUESTS
+    config.h2_max_concurrent_streams = H2_MAX_CONCURRENT_STREAMS
+    config.graceful_timeout = GRACEFUL_TIMEOUT
+    config.backlog = SERVER_BACKLOG
+    config.include_server_header = False
+    # Send Hypercorn's messages through the app's log pipeline; its own formatter expects
+    # process ids, which index.py doesn't collect
+    config.errorlog = logging.getLogger("hypercorn.error")
+    if SERVER_MAX_REQUESTS > 0:
+        config.max_requests = SERVER_MAX_REQUESTS
+        config.max_requests_jitter = max(1, SERVER_MAX_REQUESTS // 10)
+    if SSL_CERTFILE:
+        config.certfile = SSL_CERTFILE
+        config.keyfile = SSL_KEYFILE
+    return config
+
+
+def worker_func(config):
+    if config.worker_class == "uvloop":
+        from hypercorn.asyncio.run import uvloop_worker
+        return uvloop_worker
+    if config.worker_class == "asyncio":
+        from hypercorn.asyncio.run import asyncio_worker
+        return asyncio_worker
+    raise ValueError(f"Unsupported SERVER_WORKER_CLASS {config.worker_class}")
+
+
+def run_worker(func, config, sockets, shutdown_event, parent_pid):
+    """
+    Worker process entry point: shutdown is driven by the parent through shutdown_event.
+    """
+    # Ctrl+C reaches the whole process group; only the parent should react to it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    # Drain if the parent goes away without telling us (e.g. it was SIGKILLed)
+    def watch_parent():
+        while not shutdown_event.is_set():
+            if os.getppid() != parent_pid:
+                shutdown_event.set()
+            time.sleep(1)
+
+    threading.Thread(target=watch_parent, name="parent-watch", daemon=True).start()
+    func(config, sockets, shutdown_event)
+
+
+def serve(config):
+    """
+    Fork config.workers workers on shared sockets and keep them running until SIGTERM or
+    SIGINT, then drain. Returns the exit code.
+    """
+    func = worker_func(config)
+    sockets = config.create_sockets()
+    context = multiprocessing.get_context("fork")
+    shutdown_event = context.Event()
+    workers = {}
+    exitcode = 0
+
+    def shutdown(signum, frame):
+        if not shutdown_event.is_set():
+            logger.info(f"Received {signal.Signals(signum).name}, draining {len(workers)} workers")
+        shutdown_event.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    def spawn():
+        process = context.Process(target=run_worker, args=(func, config, sockets, shutdown_event, os.getpid()),
+                                  name="hypercorn-worker")
+        process.start()
+        workers[process.sentinel] = (process, time.monotonic())
+
+    logger.info(f"Starting {config.workers} {config.worker_class} workers on {', '.join(config.bind)}")
+    while not shutdown_event.is_set():
+        while len(workers) < config.workers and not shutdown_event.is_set():
+            spawn()
+        for sentinel in multiprocessing.connection.wait(list(workers), timeout=1):
+            process, started = workers.pop(sentinel)
+            process.join()
+            if shutdown_event.is_set():
+                break
+            if process.exitcode != 0 and time.monotonic() - started < WORKER_STARTUP_SECONDS:
+                logger.error(f"Worker {process.pid} failed on startup (exit code {process.exitcode}), shutting down")
+                exitcode = process.exitcode or 1
+                shutdown_event.set()
+            elif process.exitcode == 0:
+                logger.info(f"Worker {process.pid} recycled, replacing it")
+            else:
+                logger.warning(f"Worker {process.pid} exited with code {process.exitcode}, replacing it")
+
+    # Workers stop accepting within 0.1s and then wait up to graceful_timeout for open
+    # requests; allow a little more for the lifespan shutdown before forcing them
+    deadline = time.monotonic() + config.graceful_timeout + 5
+    for process, started in workers.values():
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.exitcode is None:
+            logger.warning(f"Worker {process.pid} did not drain in time, terminating it")
+            process.terminate()
+            process.join()
+
+    for sock in sockets.secure_sockets + sockets.insecure_sockets:
+        sock.close()
+    logger.info("Server stopped")
+    return exitcode
+
+
+def main():
+    preload()
+    sys.exit(serve(build_config()))
+
+
+if __name__ == "__main__":
+    main()
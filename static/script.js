@@ -2,9 +2,15 @@
 const isLocalhost = window.location.hostname === 'localhost' || window.location.hostname === '127.0.0.1';
 const API_URL = isLocalhost ? 'http://localhost:5000/api' : 'https://nau-assistant-v3.vercel.app/api';
 
+// Give up on an answer after this long without hearing from the server. Aborting closes
+// the connection, which tells the server to stop the upstream work for it too.
+const REQUEST_TIMEOUT_MS = 35000;
+
 // State variables
 let currentFollowUpId = null; // Track the current follow-up question
+let currentFollowUpQuestion = null; // Question that led to the follow-up, in case the server lost its context
 let userHasScrolled = false; // Track if user has manually scrolled up
+let pendingRequest = null; // AbortController of the request waiting for an answer
 
 // DOM Elements
 const messagesContainer = document.getElementById('messages');
@@ -37,6 +43,11 @@ window.addEventListener('orientationchange', () => {
     setTimeout(enhancedScrollToBottom, 500);
 });
 
+// Drop the pending request when the tab is closed or navigated away from
+window.addEventListener('pagehide', () => {
+    if (pendingRequest) pendingRequest.abort();
+});
+
 // Handle keyboard appearing on mobile
 userInput.addEventListener('focus', () => {
     // Wait for keyboard to appear
@@ -167,37 +178,79 @@ async function sendMessage() {
     // Scroll to see the loading indicator
     enhancedScrollToBottom();
 
+    let controller = null;
+    let timeoutId = null;
     try {
         // Prepare the request payload
         const payload = {
             chat_id: 'default', // Use a default chat ID since we don't track chats
-            query: message
+            query: message,
+            session_id: getSessionId(), // Lets the server rate limit each visitor separately
+            stream: true // Ask the server to stream the answer as it is generated
         };
 
         // If this is a response to a follow-up question, include that info
         if (currentFollowUpId) {
             payload.follow_up_to = currentFollowUpId;
-            payload.original_question = message;
+            payload.original_question = currentFollowUpQuestion;
             // Reset follow up ID after using it
             currentFollowUpId = null;
+            currentFollowUpQuestion = null;
         }
 
         console.log(`Sending request to: ${API_URL}/chat`);
 
+        // Abort when the server goes quiet for too long; the timer restarts with every chunk
+        controller = new AbortController();
+        pendingRequest = controller;
+        const restartTimeout = () => {
+            clearTimeout(timeoutId);
+            timeoutId = setTimeout(() => controller.abort(), REQUEST_TIMEOUT_MS);
+        };
+        restartTimeout();
+
         // Send message to API
         const response = await fetch(`${API_URL}/chat`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify(payload)
+            body: JSON.stringify(payload),
+            signal: controller.signal
         });
 
+        let data;
+        if ((response.headers.get('Content-Type') || '').includes('text/event-stream')) {
+            // Show the answer as it streams in, then replace it with the final message
+            let streamingElement = null;
+            let streamedText = '';
+
+            data = await readEventStream(response, (text) => {
+                restartTimeout();
+                if (!streamingElement) {
+                    const loadingElement = document.getElementById(loadingId);
+                    if (loadingElement) loadingElement.remove();
+                    streamingElement = createStreamingMessage();
+                }
+                streamedText += text;
+                streamingElement.querySelector('p').textContent = streamedText;
+                enhancedScrollToBottom();
+            });
+
+            if (streamingElement) streamingElement.remove();
+            if (!data) throw new Error('Stream ended before the answer was complete');
+        } else {
+            data = await response.json();
+            // Rate limited: show the server's message in place of an answer
+            if (response.status === 429) {
+                data = { answer: data.error, sources: [] };
+            }
+        }
+
         // Remove loading message
         const loadingElement = document.getElementById(loadingId);
         if (loadingElement) loadingElement.remove();
 
-        const data = await response.json();
         console.log('Response data:', data);
 
         // Add assistant message to UI
@@ -225,6 +278,7 @@ async function sendMessage() {
 
                 // Set the current follow-up ID
                 currentFollowUpId = data.follow_up_id;
+                currentFollowUpQuestion = data.original_question || null;
 
                 // Store the original question for context if needed
                 if (data.original_question) {
@@ -242,10 +296,13 @@ async function sendMessage() {
         if (loadingElement) loadingElement.remove();
 
         // Add error message
+        const errorText = error.name === 'AbortError'
+            ? 'Error: The answer took too long. Please try again.'
+            : 'Error: Could not get a response. Please try again.';
         const errorHTML = `
             <div class="message assistant-message">
                 <div class="message-content">
-                    <p class="text-danger">Error: Could not get a response. Please try again.</p>
+                    <p class="text-danger">${errorText}</p>
                 </div>
             </div>
         `;
@@ -253,7 +310,83 @@ async function sendMessage() {
 
         // Scroll to error message
         enhancedScrollToBottom();
+    } finally {
+        clearTimeout(timeoutId);
+        if (pendingRequest === controller) pendingRequest = null;
+    }
+}
+
+// Per-tab session id, created on first use
+function getSessionId() {
+    let sessionId = sessionStorage.getItem('nau_session_id');
+    if (!sessionId) {
+        sessionId = window.crypto && crypto.randomUUID
+            ? crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+        sessionStorage.setItem('nau_session_id', sessionId);
+    }
+    return sessionId;
+}
+
+// Read a Server-Sent Events response, calling onChunk with each piece of answer text.
+// Resolves with the payload of the final "done" or "truncated" event (answer, sources, follow-up info).
+async function readEventStream(response, onChunk) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = 'message';
+            let eventData = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    eventData += line.slice(5).trim();
+                }
+            });
+            if (!eventData) continue;
+
+            const payload = JSON.parse(eventData);
+            if (eventName === 'chunk') {
+                onChunk(payload.text);
+            } else if (eventName === 'done' || eventName === 'truncated') {
+                // A truncated answer ends with a note asking to retry
+                result = payload;
+            }
+        }
     }
+
+    return result;
+}
+
+// Create an empty assistant message that streamed text is written into
+function createStreamingMessage() {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'message assistant-message';
+
+    const contentDiv = document.createElement('div');
+    contentDiv.className = 'message-content';
+
+    const paragraph = document.createElement('p');
+    paragraph.style.whiteSpace = 'pre-line';
+    contentDiv.appendChild(paragraph);
+
+    messageDiv.appendChild(contentDiv);
+    messagesContainer.appendChild(messageDiv);
+    return messageDiv;
 }
 
 function renderMessage(message) {